@@ -25,35 +25,68 @@ app = Sanic("LiberSonora", dumps=partial(JSON.dumps, cls=CustomJSONEncoder))
 app.config.REQUEST_TIMEOUT = 1000
 app.config.REQUEST_MAX_SIZE = 1000_000_000
 
+@app.before_server_start
+async def start_executor(app, _):
+    from utils.executor import InferenceExecutor
+    app.ctx.executor = InferenceExecutor(
+        max_workers=int(os.getenv('INFERENCE_THREADS', '1')),
+        max_pending=int(os.getenv('MAX_PENDING', '8'))
+    )
+
+@app.after_server_stop
+async def stop_executor(app, _):
+    app.ctx.executor.shutdown()
+
 @app.get("/")
 async def welcome(_):
+    from utils.audio import model_cache, INPUT_FORMATS
     return json({
         "success": True,
         "message": "欢迎使用 LiberSonora AI 服务",
+        "input_format": INPUT_FORMATS,
+        "models": model_cache.status(),
+        "inference": app.ctx.executor.metrics(),
     })
 
 
 @app.post("/handle")
 async def enhance_audio(request):
-    if not request.files or 'file' not in request.files:
-        return json({"error": "需要上传音频文件"}, status=400)
+    # 支持直接传入共享数据卷上的文件路径，避免通过 HTTP 传输音频
+    audio_path = (request.form.get('path') if request.form else None) or request.args.get('path')
+    if not audio_path and (not request.files or 'file' not in request.files):
+        return json({"error": "需要上传音频文件或指定音频路径"}, status=400)
     
     # 获取并验证model参数
-    model = request.args.get('model', 'MossFormer2_SE_48K')
-    if model not in ['MossFormer2_SE_48K', 'FRCRN_SE_16K', 'MossFormerGAN_SE_16K']:
+    model = (request.form.get('model') if request.form else None) or request.args.get('model', 'MossFormer2_SE_48K')
+    from utils.audio import SUPPORTED_MODELS
+    if model not in SUPPORTED_MODELS:
         return json({"error": "无效的模型名称"}, status=400)
         
-    audio_file = request.files['file'][0]
+    if audio_path:
+        from utils.data_path import resolve_data_path
+        try:
+            audio_path = resolve_data_path(audio_path)
+        except ValueError as e:
+            return json({"error": str(e)}, status=400)
+    
+    # 在途请求已满时直接拒绝，由客户端按 Retry-After 退避重试
+    executor = request.app.ctx.executor
+    if not executor.try_acquire():
+        return json(
+            {"error": "服务繁忙，请稍后重试"},
+            status=429,
+            headers={"Retry-After": str(executor.retry_after())}
+        )
     
     try:
         from utils.audio import process_audio
         from io import BytesIO
         
-        # 将文件内容转换为BytesIO对象
-        audio_bytes = BytesIO(audio_file.body)
+        # 本地路径直接交给模型读取，否则将文件内容转换为BytesIO对象
+        audio_bytes = audio_path or BytesIO(request.files['file'][0].body)
         
-        # 使用process_audio处理音频
-        output_bytes = process_audio(audio_bytes, model)
+        # 在独立线程池中使用process_audio处理音频，不阻塞事件循环
+        output_bytes = await executor.run(process_audio, audio_bytes, model)
         
         # 返回处理后的音频
         return response.raw(
@@ -66,6 +99,8 @@ async def enhance_audio(request):
         return json({
             "error": f"处理音频时发生错误: {str(e)}"
         }, status=500)
+    finally:
+        executor.release()
 
 if __name__ == '__main__':
     cpu_count = int(os.getenv('WORKER_COUNT', '1'))
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 测试直接导入服务目录下的 server 和 utils
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
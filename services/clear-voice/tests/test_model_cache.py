@@ -0,0 +1,98 @@
+import importlib
+import os
+import sys
+import threading
+import time
+import types
+from io import BytesIO
+
+import pytest
+
+
+class FakeClearVoice:
+    """记录加载次数和同时推理数的假 ClearVoice，输出为输入内容加上模型名"""
+    loaded = []
+
+    def __init__(self, task, model_names):
+        self.model = model_names[0]
+        self.active = 0
+        self.max_active = 0
+        FakeClearVoice.loaded.append(self.model)
+
+    def __call__(self, input_path, online_write=False):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        time.sleep(0.05)
+        with open(input_path, "rb") as f:
+            data = f.read()
+        self.active -= 1
+        return data + self.model.encode()
+
+    def write(self, output_wav, output_path):
+        with open(output_path, "wb") as f:
+            f.write(output_wav)
+
+
+@pytest.fixture
+def audio(monkeypatch):
+    """用假的 clearvoice 和 torch 导入 utils.audio，没有 CUDA 时按估算值计算模型占用"""
+    FakeClearVoice.loaded = []
+    cuda = types.SimpleNamespace(is_available=lambda: False, empty_cache=lambda: None)
+    monkeypatch.setitem(sys.modules, "clearvoice", types.SimpleNamespace(ClearVoice=FakeClearVoice))
+    monkeypatch.setitem(sys.modules, "torch", types.SimpleNamespace(cuda=cuda))
+    monkeypatch.delitem(sys.modules, "utils.audio", raising=False)
+    module = importlib.import_module("utils.audio")
+    yield module
+    sys.modules.pop("utils.audio", None)
+
+
+def test_models_are_loaded_once_and_evicted_over_budget(audio):
+    # MossFormer2_SE_48K 估算 1200 MB，FRCRN_SE_16K 估算 300 MB
+    cache = audio.ModelCache(budget_mb=1500)
+    first = cache.get("MossFormer2_SE_48K")
+    assert cache.get("MossFormer2_SE_48K") is first
+    cache.get("FRCRN_SE_16K")
+    assert cache.status() == {"warm": ["MossFormer2_SE_48K", "FRCRN_SE_16K"], "used_mb": 1500, "budget_mb": 1500}
+
+    cache.get("MossFormerGAN_SE_16K")
+    assert cache.status()["warm"] == ["FRCRN_SE_16K", "MossFormerGAN_SE_16K"]
+    assert FakeClearVoice.loaded == ["MossFormer2_SE_48K", "FRCRN_SE_16K", "MossFormerGAN_SE_16K"]
+
+
+def test_model_larger_than_budget_is_still_kept(audio):
+    cache = audio.ModelCache(budget_mb=100)
+    cache.get("FRCRN_SE_16K")
+    cache.get("MossFormer2_SE_48K")
+    assert cache.status()["warm"] == ["MossFormer2_SE_48K"]
+
+
+def test_same_model_is_used_by_one_thread_at_a_time(audio, monkeypatch):
+    cache = audio.ModelCache(budget_mb=4096)
+    monkeypatch.setattr(audio, "model_cache", cache)
+    results = []
+
+    def run(model):
+        results.append(audio.process_audio(BytesIO(b"wav:"), model).getvalue())
+
+    threads = [threading.Thread(target=run, args=(model,)) for model in ["FRCRN_SE_16K"] * 3 + ["MossFormerGAN_SE_16K"] * 3]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    assert sorted(results) == [b"wav:FRCRN_SE_16K"] * 3 + [b"wav:MossFormerGAN_SE_16K"] * 3
+    assert cache.get("FRCRN_SE_16K").max_active == 1
+    assert cache.get("MossFormerGAN_SE_16K").max_active == 1
+    assert FakeClearVoice.loaded.count("FRCRN_SE_16K") == 1
+    # 不同模型之间仍然并行，串行需要 0.3 秒
+    assert elapsed < 0.28
+
+
+def test_process_audio_reads_shared_paths_in_place(audio, monkeypatch, tmp_path):
+    monkeypatch.setattr(audio, "model_cache", audio.ModelCache(budget_mb=4096))
+    path = tmp_path / "shared.wav"
+    path.write_bytes(b"from-path:")
+    assert audio.process_audio(str(path), "FRCRN_SE_16K").getvalue() == b"from-path:FRCRN_SE_16K"
+    assert path.exists()
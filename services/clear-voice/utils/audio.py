@@ -1,16 +1,128 @@
 import os
 import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from io import BytesIO
 import sys
 
+import torch
 from clearvoice import ClearVoice
 
-def process_audio(audio_bytes: BytesIO, model: str) -> BytesIO:
+# 支持的增强模型
+SUPPORTED_MODELS = ['MossFormer2_SE_48K', 'FRCRN_SE_16K', 'MossFormerGAN_SE_16K']
+
+# 各模型期望的输入格式，客户端据此选择转换采样率
+INPUT_FORMATS = {
+    'MossFormer2_SE_48K': {"sample_rate": 48000, "channels": 1, "codec": "pcm_s16le"},
+    'FRCRN_SE_16K': {"sample_rate": 16000, "channels": 1, "codec": "pcm_s16le"},
+    'MossFormerGAN_SE_16K': {"sample_rate": 16000, "channels": 1, "codec": "pcm_s16le"},
+}
+
+# 每个 worker 常驻模型的显存/内存预算（MB），超出后淘汰最久未使用的模型
+MODEL_MEMORY_BUDGET_MB = int(os.getenv('MODEL_MEMORY_BUDGET_MB', '4096'))
+
+# 无法通过 CUDA 统计时使用的模型占用估算值（MB）
+MODEL_SIZE_ESTIMATE_MB = {
+    'MossFormer2_SE_48K': 1200,
+    'FRCRN_SE_16K': 300,
+    'MossFormerGAN_SE_16K': 600,
+}
+
+
+class ModelCache:
+    """
+    按内存预算常驻 ClearVoice 模型，首次使用时才加载
+
+    ClearVoice 实例不是线程安全的，INFERENCE_THREADS > 1 时通过 use() 按模型串行使用，不同模型之间仍可并行
+    """
+    def __init__(self, budget_mb: int):
+        self.budget_mb = budget_mb
+        self._models = OrderedDict()  # model_name -> (ClearVoice, size_mb)
+        self._lock = threading.Lock()
+        self._model_locks = {}  # model_name -> threading.Lock，模型被淘汰后仍保留，保证同一模型只有一个线程在推理
+
+    def _used_mb(self) -> int:
+        return sum(size for _, size in self._models.values())
+
+    def _load(self, model: str):
+        """加载模型并计算其占用，CUDA 可用时以显存增量为准"""
+        if torch.cuda.is_available():
+            before = torch.cuda.memory_allocated()
+            clear_voice = ClearVoice(task='speech_enhancement', model_names=[model])
+            size_mb = (torch.cuda.memory_allocated() - before) // (1024 * 1024)
+        else:
+            clear_voice = ClearVoice(task='speech_enhancement', model_names=[model])
+            size_mb = 0
+        return clear_voice, size_mb or MODEL_SIZE_ESTIMATE_MB.get(model, 0)
+
+    def get(self, model: str) -> ClearVoice:
+        """
+        获取常驻模型，不存在时加载并按预算淘汰其他模型
+        
+        Args:
+            model: 模型名称
+            
+        Returns:
+            ClearVoice: 模型实例
+        """
+        with self._lock:
+            if model in self._models:
+                self._models.move_to_end(model)
+                return self._models[model][0]
+
+            clear_voice, size_mb = self._load(model)
+            self._models[model] = (clear_voice, size_mb)
+
+            # 至少保留当前模型，其余按最近最少使用淘汰
+            while self._used_mb() > self.budget_mb and len(self._models) > 1:
+                evicted, _ = self._models.popitem(last=False)
+                print(f"模型 {evicted} 超出内存预算，已被淘汰")
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+
+            return clear_voice
+
+    @contextmanager
+    def use(self, model: str):
+        """
+        独占使用常驻模型，同一模型的并发请求排队执行
+
+        Args:
+            model: 模型名称
+
+        Returns:
+            ClearVoice: 模型实例，仅在 with 块内使用
+        """
+        with self._lock:
+            model_lock = self._model_locks.setdefault(model, threading.Lock())
+        with model_lock:
+            yield self.get(model)
+
+    def status(self) -> dict:
+        """
+        获取常驻模型状态
+        
+        Returns:
+            dict: 包含已加载模型、占用和预算的字典
+        """
+        with self._lock:
+            return {
+                "warm": list(self._models.keys()),
+                "used_mb": self._used_mb(),
+                "budget_mb": self.budget_mb,
+            }
+
+
+model_cache = ModelCache(MODEL_MEMORY_BUDGET_MB)
+
+
+def process_audio(audio_bytes, model: str) -> BytesIO:
     """
     处理音频文件并返回处理后的结果
     
     Args:
-        audio_bytes: 输入的音频字节流
+        audio_bytes: 输入的音频字节流，或已校验的服务器本地路径
         model: 使用的模型名称
         
     Returns:
@@ -22,26 +134,27 @@ def process_audio(audio_bytes: BytesIO, model: str) -> BytesIO:
     output_path = None
     
     try:
-        # 创建临时输入文件
-        input_path = os.path.join(temp_dir, "input.wav")
-        with open(input_path, 'wb') as f:
-            f.write(audio_bytes.getvalue())
+        if isinstance(audio_bytes, str):
+            # 本地路径直接交给模型读取，无需复制
+            source_path = audio_bytes
+        else:
+            # 创建临时输入文件
+            input_path = os.path.join(temp_dir, "input.wav")
+            with open(input_path, 'wb') as f:
+                f.write(audio_bytes.getvalue())
+            source_path = input_path
             
-        # 初始化 ClearVoice
-        clear_voice = ClearVoice(
-            task='speech_enhancement',
-            model_names=[model]
-        )
-        
-        # 处理音频
-        output_wav = clear_voice(
-            input_path=input_path,
-            online_write=False
-        )
-        
-        # 保存到临时输出文件
         output_path = os.path.join(temp_dir, "output.wav")
-        clear_voice.write(output_wav, output_path=output_path)
+        # 获取常驻的 ClearVoice 模型，同一模型同一时间只处理一个请求
+        with model_cache.use(model) as clear_voice:
+            # 处理音频
+            output_wav = clear_voice(
+                input_path=source_path,
+                online_write=False
+            )
+            
+            # 保存到临时输出文件
+            clear_voice.write(output_wav, output_path=output_path)
         
         # 读取处理后的文件到BytesIO
         output_bytes = BytesIO()
@@ -0,0 +1,74 @@
+# 本文件在 services/funasr/utils/ 和 services/clear-voice/utils/ 下各有一份，内容必须完全相同：
+# 两个服务各自以本服务目录为 Docker 构建上下文，无法引用同一个模块。修改时同步修改两份，
+# services/funasr/tests/test_shared_modules.py 会检查两份是否一致
+import asyncio
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class InferenceExecutor:
+    """
+    在独立线程池中执行阻塞的模型推理，避免阻塞 Sanic 事件循环
+
+    同时限制进程内的在途请求数量，超出 max_pending 的请求应直接返回 429
+    """
+    def __init__(self, max_workers: int = 1, max_pending: int = 8):
+        self.max_workers = max(max_workers, 1)
+        self.max_pending = max(max_pending, 1)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        self.pending = 0
+        self.rejected = 0
+        self._avg_duration = 0.0
+
+    def try_acquire(self) -> bool:
+        """
+        尝试占用一个请求名额
+
+        Returns:
+            bool: 名额已满时返回 False
+        """
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            return False
+        self.pending += 1
+        return True
+
+    def release(self):
+        """释放请求名额"""
+        self.pending = max(self.pending - 1, 0)
+
+    def retry_after(self) -> int:
+        """根据平均推理耗时估算客户端重试前应等待的秒数"""
+        return max(1, math.ceil(self._avg_duration * self.pending / self.max_workers))
+
+    async def run(self, func, *args):
+        """
+        在线程池中执行函数并等待结果
+
+        Args:
+            func: 阻塞函数
+            *args: 函数参数
+
+        Returns:
+            函数返回值
+        """
+        start = time.monotonic()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            duration = time.monotonic() - start
+            # 指数滑动平均，用于估算 Retry-After
+            self._avg_duration = duration if self._avg_duration == 0 else self._avg_duration * 0.8 + duration * 0.2
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def metrics(self) -> dict:
+        return {
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "workers": self.max_workers,
+            "rejected": self.rejected,
+            "avg_duration": self._avg_duration,
+        }
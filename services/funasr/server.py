@@ -25,38 +25,75 @@ app = Sanic("LiberSonora", dumps=partial(JSON.dumps, cls=CustomJSONEncoder))
 app.config.REQUEST_TIMEOUT = 10000
 app.config.REQUEST_MAX_SIZE = 1000_000_000
 
+@app.before_server_start
+async def start_executor(app, _):
+    from utils.executor import InferenceExecutor
+    app.ctx.executor = InferenceExecutor(
+        max_workers=int(os.getenv('INFERENCE_THREADS', '1')),
+        max_pending=int(os.getenv('MAX_PENDING', '8'))
+    )
+
+@app.after_server_stop
+async def stop_executor(app, _):
+    app.ctx.executor.shutdown()
+
 @app.get("/")
 async def welcome(_):
+    from utils.audio import loaded_models, INPUT_FORMAT
     return json({
         "success": True,
         "message": "欢迎使用 LiberSonora AI服务",
+        "input_format": INPUT_FORMAT,
+        "models": loaded_models(),
+        "inference": app.ctx.executor.metrics(),
     })
 
 
 @app.post("/handle")
 async def speech_recognition(request):
-    if not request.files or 'file' not in request.files:
+    # 支持直接传入共享数据卷上的文件路径，避免通过 HTTP 传输音频
+    audio_path = (request.form.get('path') if request.form else None) or request.args.get('path')
+    if not audio_path and (not request.files or 'file' not in request.files):
         return json({
             "code": 400,
-            "message": "需要上传音频文件",
+            "message": "需要上传音频文件或指定音频路径",
             "data": None
         }, status=400)
     
-    audio_file = request.files['file'][0]
+    if audio_path:
+        from utils.data_path import resolve_data_path
+        try:
+            audio_path = resolve_data_path(audio_path)
+        except ValueError as e:
+            return json({
+                "code": 400,
+                "message": str(e),
+                "data": None
+            }, status=400)
+    
     hotwords = request.args.get('hotwords', None)
     merge_thr = float(request.args.get('merge_thr', 0.5))
     # 获取是否启用说话人识别参数，默认为False
     spk_conf = request.args.get('spk_conf', 'False').lower() == 'true'
     
+    # 在途请求已满时直接拒绝，由客户端按 Retry-After 退避重试
+    executor = request.app.ctx.executor
+    if not executor.try_acquire():
+        return json({
+            "code": 429,
+            "message": "服务繁忙，请稍后重试",
+            "data": None
+        }, status=429, headers={"Retry-After": str(executor.retry_after())})
+    
     try:
-        from io import BytesIO
         from utils.audio import speech_to_text
+        from io import BytesIO
         
-        # 将文件内容转换为BytesIO对象
-        audio_data = BytesIO(audio_file.body)
+        # 本地路径直接交给模型读取，否则将文件内容转换为BytesIO对象
+        audio_data = audio_path or BytesIO(request.files['file'][0].body)
         
-        # 调用语音识别函数，传入spk_conf参数
-        result = speech_to_text(audio_data, hotwords, merge_thr, spk_conf)
+        # 每个请求独立推理，某个文件出错不影响其他请求；并发数由 INFERENCE_THREADS 控制
+        result = await executor.run(speech_to_text, audio_data, hotwords, merge_thr, spk_conf)
         
         return json({
             "code": 0,
@@ -70,6 +107,8 @@ async def speech_recognition(request):
             "message": f"处理音频时发生错误: {str(e)}",
             "data": None
         }, status=500)
+    finally:
+        executor.release()
 
 if __name__ == '__main__':
     cpu_count = int(os.getenv('WORKER_COUNT', '1'))
@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+from utils.data_path import resolve_data_path
+
+
+@pytest.fixture
+def data_root(tmp_path):
+    root = tmp_path / "data"
+    root.mkdir()
+    (root / "audio.wav").write_bytes(b"RIFF")
+    (tmp_path / "secret.wav").write_bytes(b"RIFF")
+    return root
+
+
+def test_accepts_file_under_root(data_root):
+    path = str(data_root / "audio.wav")
+    assert resolve_data_path(path, str(data_root)) == os.path.realpath(path)
+
+
+def test_rejects_traversal_outside_root(data_root):
+    with pytest.raises(ValueError, match="不在允许的目录"):
+        resolve_data_path(str(data_root / ".." / "secret.wav"), str(data_root))
+
+
+def test_rejects_symlink_escaping_root(data_root):
+    link = data_root / "link.wav"
+    link.symlink_to(data_root.parent / "secret.wav")
+    with pytest.raises(ValueError, match="不在允许的目录"):
+        resolve_data_path(str(link), str(data_root))
+
+
+def test_rejects_missing_file_and_directory(data_root):
+    with pytest.raises(ValueError, match="文件不存在"):
+        resolve_data_path(str(data_root / "missing.wav"), str(data_root))
+    with pytest.raises(ValueError, match="文件不存在"):
+        resolve_data_path(str(data_root), str(data_root))
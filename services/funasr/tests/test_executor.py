@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.executor import InferenceExecutor
+
+
+def test_try_acquire_rejects_beyond_max_pending():
+    executor = InferenceExecutor(max_workers=1, max_pending=2)
+    try:
+        assert executor.try_acquire()
+        assert executor.try_acquire()
+        assert not executor.try_acquire()
+        assert executor.metrics()["rejected"] == 1
+        executor.release()
+        assert executor.try_acquire()
+    finally:
+        executor.shutdown()
+
+
+def test_retry_after_scales_with_pending_and_workers():
+    executor = InferenceExecutor(max_workers=2, max_pending=8)
+    try:
+        # 还没有耗时统计时至少等待 1 秒
+        assert executor.retry_after() == 1
+        asyncio.run(executor.run(time.sleep, 0.1))
+        assert executor.metrics()["avg_duration"] >= 0.1
+        executor._avg_duration = 1.5
+        for _ in range(8):
+            executor.try_acquire()
+        # 1.5 秒 × 8 个在途请求 / 2 个线程
+        assert executor.retry_after() == 6
+    finally:
+        executor.shutdown()
+
+
+def test_run_propagates_exceptions():
+    executor = InferenceExecutor(max_workers=1, max_pending=1)
+
+    def fail():
+        raise ValueError("推理失败")
+
+    try:
+        with pytest.raises(ValueError):
+            asyncio.run(executor.run(fail))
+    finally:
+        executor.shutdown()
@@ -0,0 +1,75 @@
+import importlib
+import os
+import sys
+import threading
+import time
+import types
+from io import BytesIO
+
+import pytest
+
+
+class FakeAutoModel:
+    """记录构建次数的假 AutoModel，generate 返回固定的句子"""
+    built = []
+
+    def __init__(self, **kwargs):
+        time.sleep(0.01)
+        self.kwargs = kwargs
+        self.inputs = []
+        FakeAutoModel.built.append(kwargs)
+
+    def generate(self, input, **kwargs):
+        with open(input, "rb") as f:
+            self.inputs.append((input, f.read()))
+        return [{"sentence_info": [{"text": "你好", "start": 0, "end": 500, "spk": 1}]}]
+
+
+@pytest.fixture
+def audio(monkeypatch):
+    """用假的 funasr 和 torch 导入 utils.audio，cuda 可用性可在测试中修改"""
+    FakeAutoModel.built = []
+    cuda = types.SimpleNamespace(is_available=lambda: False, empty_cache=lambda: None)
+    monkeypatch.setitem(sys.modules, "funasr", types.SimpleNamespace(AutoModel=FakeAutoModel))
+    monkeypatch.setitem(sys.modules, "torch", types.SimpleNamespace(cuda=cuda))
+    monkeypatch.delitem(sys.modules, "utils.audio", raising=False)
+    module = importlib.import_module("utils.audio")
+    yield module
+    sys.modules.pop("utils.audio", None)
+
+
+def test_model_is_built_once_per_combination(audio):
+    threads = [threading.Thread(target=audio.get_model) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(FakeAutoModel.built) == 1
+    # 没有 CUDA 时不加载说话人模型，与不需要说话人识别共用同一个模型
+    assert audio.get_model(spk_conf=True) is audio.get_model()
+    assert audio.loaded_models() == ["asr+vad+punc"]
+
+
+def test_least_recently_used_model_is_evicted(audio, monkeypatch):
+    monkeypatch.setattr(audio.torch.cuda, "is_available", lambda: True)
+    monkeypatch.setattr(audio, "MODEL_CACHE_SIZE", 1)
+    audio.get_model()
+    spk_model = audio.get_model(spk_conf=True)
+    assert "spk_model" in spk_model.kwargs
+    assert audio.loaded_models() == ["asr+vad+punc+spk"]
+    audio.get_model()
+    assert len(FakeAutoModel.built) == 3
+
+
+def test_speech_to_text_accepts_bytes_and_paths(audio, tmp_path):
+    assert audio.speech_to_text(BytesIO(b"wav-bytes")) == [{"text": "你好", "start": 0, "end": 500, "spk": 0}]
+    model = audio.get_model()
+    temp_path, data = model.inputs[-1]
+    assert data == b"wav-bytes"
+    assert not os.path.exists(temp_path)
+
+    path = tmp_path / "shared.wav"
+    path.write_bytes(b"from-path")
+    audio.speech_to_text(str(path))
+    assert model.inputs[-1] == (str(path), b"from-path")
+    assert path.exists()
@@ -0,0 +1,18 @@
+import filecmp
+import os
+
+import pytest
+
+SERVICES_DIR = os.path.join(os.path.dirname(__file__), "..", "..")
+
+# FunASR 和 ClearVoice 各自以服务目录为构建上下文，以下模块在两个服务中各有一份
+SHARED_MODULES = ["utils/executor.py", "utils/data_path.py"]
+
+
+@pytest.mark.parametrize("module", SHARED_MODULES)
+def test_shared_module_copies_are_identical(module):
+    other = os.path.join(SERVICES_DIR, "clear-voice", module)
+    if not os.path.exists(other):
+        pytest.skip("clear-voice 服务目录不存在")
+    assert filecmp.cmp(os.path.join(SERVICES_DIR, "funasr", module), other, shallow=False), \
+        f"{module} 在 funasr 和 clear-voice 中的内容不一致，需要同步修改"
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import sys
+import threading
+import time
+import types
+from types import SimpleNamespace
+
+import pytest
+
+import server
+from utils.executor import InferenceExecutor
+
+
+@pytest.fixture
+def fake_audio(monkeypatch):
+    """用假的 utils.audio 替换 FunASR 模型，损坏的音频抛出异常，并记录同时推理的请求数"""
+    state = {"active": 0, "max_active": 0}
+    lock = threading.Lock()
+
+    def speech_to_text(audio_file, hotwords=None, merge_thr=0.5, spk_conf=False):
+        with lock:
+            state["active"] += 1
+            state["max_active"] = max(state["max_active"], state["active"])
+        try:
+            time.sleep(0.05)
+            data = audio_file.getvalue()
+            if data == b"corrupt":
+                raise ValueError("无法解码音频")
+            return [{"text": data.decode(), "start": 0, "end": 1, "spk": 0}]
+        finally:
+            with lock:
+                state["active"] -= 1
+
+    module = types.ModuleType("utils.audio")
+    module.speech_to_text = speech_to_text
+    monkeypatch.setitem(sys.modules, "utils.audio", module)
+    return state
+
+
+def make_request(executor, body: bytes):
+    return SimpleNamespace(
+        form=None,
+        files={"file": [SimpleNamespace(body=body)]},
+        args={},
+        app=SimpleNamespace(ctx=SimpleNamespace(executor=executor)),
+    )
+
+
+def test_corrupt_upload_does_not_fail_concurrent_requests(fake_audio):
+    executor = InferenceExecutor(max_workers=2, max_pending=8)
+
+    async def run():
+        return await asyncio.gather(*[
+            server.speech_recognition(make_request(executor, body))
+            for body in (b"first", b"corrupt", b"second")
+        ])
+
+    try:
+        responses = asyncio.run(run())
+    finally:
+        executor.shutdown()
+
+    assert [response.status for response in responses] == [200, 500, 200]
+    assert json.loads(responses[0].body)["data"][0]["text"] == "first"
+    assert json.loads(responses[2].body)["data"][0]["text"] == "second"
+    assert "无法解码音频" in json.loads(responses[1].body)["message"]
+    # 多个推理线程时请求并行执行
+    assert fake_audio["max_active"] == 2
+    assert executor.pending == 0
+
+
+def test_rejects_with_retry_after_when_pending_is_full(fake_audio):
+    executor = InferenceExecutor(max_workers=1, max_pending=1)
+    assert executor.try_acquire()
+    try:
+        response = asyncio.run(server.speech_recognition(make_request(executor, b"first")))
+    finally:
+        executor.release()
+        executor.shutdown()
+
+    assert response.status == 429
+    assert int(response.headers["Retry-After"]) >= 1
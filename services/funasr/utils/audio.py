@@ -2,11 +2,23 @@ from funasr import AutoModel
 import torch
 import tempfile
 import os
+import threading
+from collections import OrderedDict
 from io import BytesIO
 
-def get_model(spk_conf: bool = False) -> AutoModel:
+# 模型期望的输入格式，paraformer 与 vad 模型均为 16k 单声道
+INPUT_FORMAT = {"sample_rate": 16000, "channels": 1, "codec": "pcm_s16le"}
+
+# 每个 worker 最多常驻的模型组合数量，超出后按最近最少使用淘汰
+MODEL_CACHE_SIZE = int(os.getenv('MODEL_CACHE_SIZE', '2'))
+
+# 模型注册表：key 为模型组件组合，value 为 AutoModel 实例
+_model_registry = OrderedDict()
+_model_registry_lock = threading.Lock()
+
+def build_model(spk_conf: bool = False) -> AutoModel:
     """
-    获取语音识别模型
+    构建语音识别模型
     
     Args:
         spk_conf: 是否启用说话人识别
@@ -33,12 +45,57 @@ def get_model(spk_conf: bool = False) -> AutoModel:
 
     return AutoModel(**model_config)
 
-def speech_to_text(audio_file: BytesIO, hotwords: str = None, merge_thr: float = 0.5, spk_conf: bool = False) -> list:
+def _model_key(spk_conf: bool) -> tuple:
+    """
+    计算模型组合的缓存 key，说话人模型只在 CUDA 可用时才会加载
+    """
+    return ("asr", "vad", "punc", "spk") if spk_conf and torch.cuda.is_available() else ("asr", "vad", "punc")
+
+def get_model(spk_conf: bool = False) -> AutoModel:
+    """
+    获取常驻的语音识别模型，同一 worker 内每种组合只构建一次
+    
+    Args:
+        spk_conf: 是否启用说话人识别
+        
+    Returns:
+        AutoModel: 语音识别模型实例
+    """
+    key = _model_key(spk_conf)
+    with _model_registry_lock:
+        if key in _model_registry:
+            _model_registry.move_to_end(key)
+            return _model_registry[key]
+
+        model = build_model(spk_conf)
+        _model_registry[key] = model
+
+        # 超出上限时淘汰最久未使用的模型，释放显存
+        while len(_model_registry) > max(MODEL_CACHE_SIZE, 1):
+            evicted_key, evicted_model = _model_registry.popitem(last=False)
+            del evicted_model
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+            print(f"模型 {evicted_key} 已被淘汰")
+
+        return model
+
+def loaded_models() -> list:
+    """
+    获取当前常驻的模型组合，按最近使用排序
+    
+    Returns:
+        list: 模型组合名称列表
+    """
+    with _model_registry_lock:
+        return ["+".join(key) for key in _model_registry.keys()]
+
+def speech_to_text(audio_file, hotwords: str = None, merge_thr: float = 0.5, spk_conf: bool = False) -> list:
     """
     将语音文件转换为文字，返回带时间戳的文本列表
     
     Args:
-        audio_file: 音频文件的二进制数据流
+        audio_file: 音频文件的二进制数据流或已校验的服务器本地路径
         hotwords: 热词，用空格分隔的字符串
         merge_thr: 说话人聚类的阈值，默认0.5
         spk_conf: 是否启用说话人识别，默认False
@@ -49,15 +106,19 @@ def speech_to_text(audio_file: BytesIO, hotwords: str = None, merge_thr: float =
     # 获取模型实例
     model = get_model(spk_conf)
     
-    # 创建临时文件保存音频数据
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_audio:
-        temp_audio.write(audio_file.getvalue())
-        temp_path = temp_audio.name
+    # 本地路径直接交给模型读取，二进制数据流则保存到临时文件
+    temp_path = None
+    if isinstance(audio_file, str):
+        input_path = audio_file
+    else:
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_audio:
+            temp_audio.write(audio_file.getvalue())
+            temp_path = input_path = temp_audio.name
     
     try:
-        # 生成识别结果
+        # 生成识别结果，VAD 切分出的语音段在 generate 内部按 batch_size_s 合批识别
         res = model.generate(
-            input=temp_path,
+            input=input_path,
             sentence_timestamp=True,
             hotword=hotwords,
             spk_kwargs={"cb_kwargs": {"merge_thr": merge_thr}} if spk_conf else None
@@ -69,8 +130,8 @@ def speech_to_text(audio_file: BytesIO, hotwords: str = None, merge_thr: float =
             "start": sentence["start"], 
             "end": sentence["end"],
             "spk": sentence.get("spk", 0) if spk_conf else 0
-        } for sentence in res[0]["sentence_info"]]
+        } for sentence in res[0].get("sentence_info", [])]
     finally:
         # 清理临时文件
-        if os.path.exists(temp_path):
-            os.unlink(temp_path)
\ No newline at end of file
+        if temp_path and os.path.exists(temp_path):
+            os.unlink(temp_path)
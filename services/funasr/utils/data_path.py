@@ -0,0 +1,31 @@
+# 本文件在 services/funasr/utils/ 和 services/clear-voice/utils/ 下各有一份，内容必须完全相同：
+# 两个服务各自以本服务目录为 Docker 构建上下文，无法引用同一个模块。修改时同步修改两份，
+# services/funasr/tests/test_shared_modules.py 会检查两份是否一致
+import os
+
+# 允许按路径读取音频的根目录，与其他容器共享的数据卷
+DATA_ROOT = os.getenv('DATA_ROOT', '/mnt/data')
+
+
+def resolve_data_path(path: str, root: str = None) -> str:
+    """
+    校验客户端传入的服务器本地路径，只允许访问 DATA_ROOT 下已存在的文件
+    
+    Args:
+        path: 音频文件路径
+        root: 允许访问的根目录，默认为 DATA_ROOT
+        
+    Returns:
+        str: 规范化后的绝对路径
+        
+    Raises:
+        ValueError: 当路径不在允许的根目录下或文件不存在时抛出
+    """
+    root = root or DATA_ROOT
+    real_root = os.path.realpath(root)
+    real_path = os.path.realpath(path)
+    if os.path.commonpath([real_root, real_path]) != real_root:
+        raise ValueError(f"路径不在允许的目录 {root} 下: {path}")
+    if not os.path.isfile(real_path):
+        raise ValueError(f"文件不存在: {path}")
+    return real_path
@@ -80,6 +80,25 @@ def config_dialog(key_prefix, config_key):
         # 立即更新模型配置
         st.session_state[config_key]['model'] = model
     
+    # 额外接口，与上面的接口组成接口池
+    endpoints_text = st.text_area(
+        "额外接口（可选）",
+        value="\n".join(
+            ",".join([e['openai_url'], e.get('openai_key', ''), e.get('model') or ''])
+            for e in st.session_state[config_key].get('endpoints', [])
+        ),
+        help="每行一个接口，格式为 API地址,API密钥,模型名称，密钥和模型名称可留空（模型名称留空时与上面相同）。请求按各接口的负载和延迟分配，接口故障时自动切换",
+        key=f'{key_prefix}_endpoints'
+    )
+    endpoints = []
+    for line in endpoints_text.splitlines():
+        parts = [part.strip() for part in line.split(",")]
+        if not parts[0]:
+            continue
+        parts += [""] * (3 - len(parts))
+        endpoints.append({'openai_url': parts[0], 'openai_key': parts[1], 'model': parts[2] or None})
+    st.session_state[config_key]['endpoints'] = endpoints
+    
     if st.button("保存并生效", key=f"{key_prefix}_save_config_button"):
         st.rerun()
     return st.session_state[config_key]
@@ -116,6 +135,8 @@ async def model_selection(key_prefix: str = "default"):
         st.write(f"是否使用ollama：{'是' if st.session_state[config_key]['use_ollama'] else '否'}")
         st.write(f"API基础地址：{st.session_state[config_key]['openai_url']}")
         st.write(f"API密钥：{'*' * len(st.session_state[config_key]['openai_key']) if st.session_state[config_key]['openai_key'] else '未设置'}")
+        if st.session_state[config_key].get('endpoints'):
+            st.write(f"额外接口：{', '.join(e['openai_url'] for e in st.session_state[config_key]['endpoints'])}")
         if st.button("配置大模型参数", key=f"{key_prefix}_config_button"):
             config_dialog(key_prefix, config_key)
 
@@ -134,7 +155,8 @@ async def model_selection(key_prefix: str = "default"):
         model=st.session_state[config_key]['model'],
         openai_url=st.session_state[config_key]['openai_url'],
         openai_key=st.session_state[config_key]['openai_key'],
-        use_ollama=st.session_state[config_key]['use_ollama']
+        use_ollama=st.session_state[config_key]['use_ollama'],
+        endpoints=st.session_state[config_key].get('endpoints')
     )
     return openai_handler
 
@@ -4,14 +4,17 @@ import asyncio
 import streamlit as st
 import streamlit_antd_components as sac
 import json
-from io import BytesIO
 import pandas as pd
 import re
 import time
+import shutil
+import tempfile
 import requests
+from functools import partial
 from components.form import model_selection, select_translate_languages, get_text_correct_common_errors, select_target_language
-from packages.process import process_single_audio, process_audio_batch_backround
+from packages.process import process_audio_batch_backround, create_audio_pipeline
 from packages.llm import QWEN2_5_MODEL, MINICPM3_MODEL
+from config import global_config
 
 async def step_upload_audio():
     st.subheader("上传音频文件")
@@ -118,6 +121,13 @@ async def step_remove_background():
     remove_background = st.checkbox("移除背景音乐", value=False,
                                   help="选择后会增加处理时间，但可以提高语音识别质量，如果你的音频不带背景音或背景音很轻微，请勿选择")
     st.session_state.config['remove_background'] = remove_background
+    if remove_background:
+        enhance_model = st.selectbox(
+            "背景音移除模型",
+            options=["MossFormer2_SE_48K", "FRCRN_SE_16K", "MossFormerGAN_SE_16K"],
+            help="48K 模型效果最好但更慢，16K 模型与字幕识别采样率一致，处理更快"
+        )
+        st.session_state.config['enhance_model'] = enhance_model
 
 async def step_subtitle_config():
     st.subheader("字幕识别配置")
@@ -242,31 +252,98 @@ async def step_preview_config():
             st.error("请先上传音频文件")
         else:
             try:
-                with st.spinner("音频处理中，请稍候..."):
-                    start_time = time.time()
+                with st.spinner("正在提交任务..."):
                     files = [("files", file) for file in st.session_state.uploaded_files]
                     response = requests.post(
-                        "http://127.0.0.1:8000/handle",
+                        "http://127.0.0.1:8000/jobs",
                         files=files,
                         data={"config": json.dumps(st.session_state.config)}
                     )
-                    
-                    if response.status_code == 200:
-                        end_time = time.time()
-                        processing_time = end_time - start_time
-                        st.balloons()
-                        st.success(f"音频处理成功！耗时 {processing_time:.2f} 秒")
-                        st.download_button(
-                            label="下载处理结果",
-                            data=BytesIO(response.content),
-                            file_name="results.zip",
-                            mime="application/zip"
-                        )
-                    else:
-                        st.error(f"处理失败：{response.json().get('error', '未知错误')}")
+                if response.status_code == 202:
+                    # 任务在后台处理，页面刷新或断开后可以继续查询
+                    st.session_state.api_job_id = response.json()["job_id"]
+                else:
+                    st.error(f"提交失败：{response.json().get('error', '未知错误')}")
             except Exception as e:
                 st.error(f"请求失败：{str(e)}")
 
+    if st.session_state.get("api_job_id"):
+        wait_api_job(st.session_state.api_job_id)
+
+def wait_api_job(job_id: str):
+    """轮询后台任务进度，完成后提供结果下载；任务结束或已不存在时清除会话中的任务 ID，之后的刷新不再查询"""
+    st.info(f"任务 ID：{job_id}，关闭页面不会中断处理，可在离线任务页面查看")
+    progress_bar = st.progress(0.0)
+    details = st.empty()
+    try:
+        while True:
+            job = requests.get(f"http://127.0.0.1:8000/jobs/{job_id}").json()
+            if "error" in job:
+                st.session_state.pop("api_job_id", None)
+                st.error(f"查询任务失败：{job['error']}")
+                return
+            finished = job["files"]["done"] + job["files"]["failed"]
+            eta = f"，预计剩余 {job['eta_seconds']:.0f} 秒" if job["eta_seconds"] else ""
+            progress_bar.progress(finished / max(job["total"], 1), text=f"已完成 {finished}/{job['total']} 个文件{eta}")
+            details.dataframe(pd.DataFrame([{
+                "文件": file["name"],
+                "状态": file["status"],
+                "阶段": file["stage"] or "",
+                "批次进度": ", ".join(f"{stage} {done}/{total}" for stage, (done, total) in file["progress"].items()),
+                "错误": file["error"] or "",
+            } for file in job["file_details"]]), use_container_width=True)
+            if job["status"] in ("done", "cancelled"):
+                break
+            time.sleep(2)
+    except Exception as e:
+        st.error(f"请求失败：{str(e)}")
+        return
+
+    st.session_state.pop("api_job_id", None)
+    if job["status"] == "cancelled":
+        st.warning("任务已取消")
+        return
+    if job["files"]["failed"]:
+        st.warning(f"{job['files']['failed']} 个文件处理失败")
+    else:
+        st.balloons()
+    st.success(f"音频处理完成！耗时 {job['updated_at'] - job['created_at']:.2f} 秒")
+    offer_job_result(job_id)
+
+def offer_job_result(job_id: str):
+    """
+    提供任务结果的下载
+
+    配置了 PUBLIC_API_URL 时浏览器直接从 API 服务下载，由服务端边打包边发送；
+    否则把结果逐块保存到临时文件后交给下载按钮，不在内存中缓存整个响应
+    """
+    if global_config.public_api_url:
+        st.link_button("下载处理结果", f"{global_config.public_api_url.rstrip('/')}/jobs/{job_id}/result")
+        return
+    try:
+        with requests.get(f"http://127.0.0.1:8000/jobs/{job_id}/result", stream=True) as response:
+            if response.status_code != 200:
+                st.error(f"下载失败：{response.json().get('error', '未知错误')}")
+                return
+            with tempfile.NamedTemporaryFile(suffix=".zip", delete=False) as tmp_file:
+                zip_path = tmp_file.name
+                shutil.copyfileobj(response.raw, tmp_file, 1024 * 1024)
+    except Exception as e:
+        st.error(f"下载失败：{str(e)}")
+        return
+    try:
+        with open(zip_path, "rb") as f:
+            st.download_button(
+                label="下载处理结果",
+                data=f,
+                file_name="results.zip",
+                mime="application/zip",
+                # 任务 ID 已清除，点击下载时不重新运行页面
+                on_click="ignore"
+            )
+    finally:
+        os.remove(zip_path)
+
 def check_output_dir(directory):
     """检查输出目录状态并提示用户"""
     if os.path.exists(directory):
@@ -319,43 +396,50 @@ async def step_local_fileoutput():
                     with st.spinner("音频处理中，请稍候..."):
                         start_time = time.time()
                         
-                        success_count = 0
-                        # 顺序处理每个文件
+                        # 流水线处理，不同文件的解码、识别和大模型阶段重叠执行
+                        def read_audio_file(file_path):
+                            with open(file_path, 'rb') as f:
+                                return type('StreamlitUploadedFile', (), {
+                                    'name': os.path.basename(file_path),
+                                    'path': file_path,
+                                    'body': f.read()
+                                })()
+                        
+                        items = []
                         for index, file_path in enumerate(checked_audio_files):
-                            try:
-                                with open(file_path, 'rb') as f:
-                                    file_obj = type('StreamlitUploadedFile', (), {
-                                        'name': os.path.basename(file_path),
-                                        'body': f.read()
-                                    })()
-                                    
-                                    # 获取文件相对于input_dir的相对路径
-                                    relative_path = os.path.relpath(file_path, st.session_state.input_audio_dir)
-                                    # 去掉文件名，只保留目录结构
-                                    relative_dir = os.path.dirname(relative_path)
-                                    # 在output_dir中创建对应的目录结构
-                                    output_subdir = os.path.join(output_dir, relative_dir)
-                                    os.makedirs(output_subdir, exist_ok=True)
-                                    
-                                    # 顺序处理单个音频文件
-                                    audio_path = await process_single_audio(
-                                        index=index,
-                                        audio_file=file_obj,
-                                        config=st.session_state.config,
-                                        temp_dir=output_subdir
-                                    )
-                                    
-                                    if audio_path:
-                                        success_count += 1
-                            except Exception as e:
-                                st.error(f"处理文件 {os.path.basename(file_path)} 时出错：{str(e)}")
-                                raise e
+                            # 获取文件相对于input_dir的相对路径
+                            relative_path = os.path.relpath(file_path, st.session_state.input_audio_dir)
+                            # 去掉文件名，只保留目录结构
+                            relative_dir = os.path.dirname(relative_path)
+                            # 在output_dir中创建对应的目录结构
+                            output_subdir = os.path.join(output_dir, relative_dir)
+                            os.makedirs(output_subdir, exist_ok=True)
+                            items.append({
+                                "index": index,
+                                "name": os.path.basename(file_path),
+                                "temp_dir": output_subdir,
+                                "load_audio_file": partial(read_audio_file, file_path),
+                            })
+                        
+                        progress = st.progress(0.0)
+                        finished = []
+                        def on_done(item):
+                            finished.append(item)
+                            progress.progress(len(finished) / len(items), text=f"已完成 {len(finished)}/{len(items)}")
+                            if "error" in item:
+                                st.error(f"处理文件 {item['name']} 时出错：{str(item['error'])}")
+                        
+                        pipeline = create_audio_pipeline(st.session_state.config)
+                        await pipeline.run(items, on_done=on_done)
+                        success_count = sum(1 for item in items if item.get("audio_path"))
                         
                         end_time = time.time()
                         processing_time = end_time - start_time
                         st.balloons()
                         st.success(f"音频处理完成！成功处理 {success_count}/{len(st.session_state.uploaded_file_paths)} 个文件，总耗时 {processing_time:.2f} 秒")
                         st.info(f"处理结果已保存到：{output_dir}")
+                        with st.expander("各阶段统计"):
+                            st.json(pipeline.stats())
                         
                 except Exception as e:
                     st.error(f"处理过程中发生错误：{str(e)}")
@@ -370,20 +454,20 @@ async def step_local_fileoutput():
                     os.makedirs(output_dir, exist_ok=True)
                     
                     # 启动异步处理
-                    await process_audio_batch_backround(
+                    job_id = await process_audio_batch_backround(
                         input_dir=st.session_state.input_audio_dir,
                         output_dir=output_dir,
                         config=st.session_state.config,
                         audio_files=checked_audio_files
                     )
                     
-                    st.success("已启动异步处理！")
+                    st.success(f"已启动异步处理！任务 ID：{job_id}")
                     st.info(f"""
                     请注意：
                     1. 处理结果将保存到：{output_dir}
                     2. 您可以关闭页面，处理会在后台继续进行
-                    3. 处理完成后，输出目录中的音频文件数量应该与输入文件数量一致
-                    4. 如需完全停止处理，请停止容器
+                    3. 处理进度可在「检查离线输出目录」页面查看，也可以在那里停止任务
+                    4. 容器重启后任务会从未完成的文件继续处理
                     5. 执行时间请根据设备在同样配置下的单个音频处理时间相乘推断
                     """)
                     
@@ -4,6 +4,65 @@ class Config:
     def __init__(self):
         self.clear_voice_url = os.getenv('CLEAR_VOICE_URL', 'http://clear-voice:8000')
         self.funasr_url = os.getenv('FUNASR_URL', 'http://funasr:8000')
+        # 长音频切分识别：分片时长（分钟，0 表示不切分）和并发分片数
+        self.asr_shard_minutes = float(os.getenv('ASR_SHARD_MINUTES', '10'))
+        self.asr_shard_concurrency = int(os.getenv('ASR_SHARD_CONCURRENCY', '2'))
+        # 同时运行的 ffmpeg 进程数上限
+        self.ffmpeg_concurrency = int(os.getenv('FFMPEG_CONCURRENCY', '2'))
+        # 共享 HTTP 连接池：总连接数、单个主机连接数和空闲连接保活时间（秒）
+        self.http_pool_limit = int(os.getenv('HTTP_POOL_LIMIT', '100'))
+        self.http_pool_limit_per_host = int(os.getenv('HTTP_POOL_LIMIT_PER_HOST', '20'))
+        self.http_keepalive_timeout = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', '60'))
+        # 共享数据卷上的临时目录，离线任务经此按路径把音频交给 FunASR / ClearVoice
+        self.shared_tmp_dir = os.getenv('SHARED_TMP_DIR', '/mnt/data/.libersonora/tmp')
+        # 大模型回复持久化缓存：SQLite 文件路径（为空时禁用）、最大条目数和最长保留天数
+        self.llm_cache_path = os.getenv('LLM_CACHE_PATH', '/mnt/data/.libersonora/llm_cache.db')
+        self.llm_cache_max_entries = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '200000'))
+        self.llm_cache_max_age_days = float(os.getenv('LLM_CACHE_MAX_AGE_DAYS', '30'))
+        # 翻译记忆 SQLite 文件路径（为空时禁用），跨文件、跨任务复用已翻译的句子
+        self.translation_memory_path = os.getenv('TRANSLATION_MEMORY_PATH', '/mnt/data/.libersonora/translation_memory.db')
+        # 跨进程共享的大模型限流状态 SQLite 文件路径（为空时不限流）
+        self.rate_limit_path = os.getenv('RATE_LIMIT_PATH', '/mnt/data/.libersonora/rate_limit.db')
+        # 各供应商接口默认的每分钟请求数和 token 数上限（0 表示不限制），按账号的额度等级调整
+        self.ollama_rpm = int(os.getenv('OLLAMA_RPM', '0'))
+        self.ollama_tpm = int(os.getenv('OLLAMA_TPM', '0'))
+        self.deepseek_rpm = int(os.getenv('DEEPSEEK_RPM', '600'))
+        self.deepseek_tpm = int(os.getenv('DEEPSEEK_TPM', '0'))
+        self.openai_rpm = int(os.getenv('OPENAI_RPM', '500'))
+        self.openai_tpm = int(os.getenv('OPENAI_TPM', '0'))
+        # 每个大模型接口的自适应并发：初始并发数和并发上限
+        self.llm_initial_concurrency = int(os.getenv('LLM_INITIAL_CONCURRENCY', '2'))
+        self.llm_max_concurrency = int(os.getenv('LLM_MAX_CONCURRENCY', '64'))
+        # 按阶段批量处理时预加载的 Ollama 模型在显存中的保留时间
+        self.ollama_keep_alive = os.getenv('OLLAMA_KEEP_ALIVE', '30m')
+        # 多文件流水线各阶段的 worker 数和阶段间队列容量
+        self.pipeline_decode_workers = int(os.getenv('PIPELINE_DECODE_WORKERS', '2'))
+        self.pipeline_enhance_workers = int(os.getenv('PIPELINE_ENHANCE_WORKERS', '1'))
+        self.pipeline_asr_workers = int(os.getenv('PIPELINE_ASR_WORKERS', '1'))
+        self.pipeline_llm_workers = int(os.getenv('PIPELINE_LLM_WORKERS', '2'))
+        self.pipeline_write_workers = int(os.getenv('PIPELINE_WRITE_WORKERS', '1'))
+        self.pipeline_queue_size = int(os.getenv('PIPELINE_QUEUE_SIZE', '2'))
+        # 离线任务队列：SQLite 文件路径、每个文件的最大尝试次数和每个任务的 worker 进程数
+        self.job_store_path = os.getenv('JOB_STORE_PATH', '/mnt/data/.libersonora/jobs.db')
+        self.job_max_attempts = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+        self.job_workers = int(os.getenv('JOB_WORKERS', '1'))
+        # 通过 HTTP 接口提交的任务的上传文件和处理结果目录
+        self.api_job_dir = os.getenv('API_JOB_DIR', '/mnt/data/.libersonora/api_jobs')
+        # HTTP 接口任务完成或取消后保留上传文件和处理结果的时间（小时，0 表示一直保留）
+        self.api_job_retention_hours = float(os.getenv('API_JOB_RETENTION_HOURS', '72'))
+        # 上传文件的暂存目录、单个请求的大小上限（字节）和每个进程同时接收与处理的上传总量上限（字节，0 表示不限制）
+        self.upload_spool_dir = os.getenv('UPLOAD_SPOOL_DIR', '/mnt/data/.libersonora/uploads')
+        self.upload_max_bytes = int(os.getenv('UPLOAD_MAX_BYTES', '1000000000'))
+        self.upload_inflight_bytes = int(os.getenv('UPLOAD_INFLIGHT_BYTES', '4000000000'))
+        # 允许通过 API 服务打包下载的目录根路径，与其他容器共享的数据卷
+        self.data_root = os.getenv('DATA_ROOT', '/mnt/data')
+        # 浏览器可以访问的 API 服务地址，例如 http://host:8652，设置后离线任务页面提供由 API 服务流式打包的下载链接
+        self.public_api_url = os.getenv('PUBLIC_API_URL', '')
+        # 阶段产物缓存目录（为空时禁用）和总大小上限（GB），输入和配置不变的阶段直接复用上次的结果
+        self.artifact_dir = os.getenv('ARTIFACT_DIR', '/mnt/data/.libersonora/artifacts')
+        self.artifact_max_gb = float(os.getenv('ARTIFACT_MAX_GB', '20'))
+        # 矫正和翻译阶段的批次日志目录（为空时禁用），进程中断后重新处理同一文件时跳过已完成的批次，与阶段产物缓存相互独立
+        self.batch_journal_dir = os.getenv('BATCH_JOURNAL_DIR', '/mnt/data/.libersonora/journals')
 
 # 创建配置实例
 global_config = Config()
@@ -48,6 +48,15 @@ if __name__ == "__main__":
     if os.path.exists('/.dockerenv'):
         print("Running in Docker container")
     
+    # 恢复上次中断的离线任务
+    try:
+        from packages.jobs import resume_jobs
+        resumed = resume_jobs()
+        if resumed:
+            print(f"Resumed jobs: {resumed}")
+    except Exception as e:
+        print(f"Failed to resume jobs: {str(e)}")
+    
     try:
         asyncio.run(run_scripts())
     except KeyboardInterrupt:
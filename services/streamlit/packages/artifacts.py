@@ -0,0 +1,256 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import uuid
+import weakref
+from typing import Awaitable, Callable, Optional
+from config import global_config
+
+# 处理逻辑变化导致旧产物不可用时递增
+ARTIFACT_VERSION = 1
+
+# 每个事件循环内正在计算的 key，相同 key 的并发请求等待同一个结果
+_inflight = weakref.WeakKeyDictionary()
+
+
+def artifact_key(stage: str, *parts) -> str:
+    """
+    计算阶段产物的 key
+
+    Args:
+        stage: 阶段名称
+        parts: 阶段输入的 key 或音频哈希，以及影响该阶段输出的配置，需要可以 JSON 序列化
+
+    Returns:
+        str: sha256 十六进制字符串
+    """
+    payload = json.dumps([ARTIFACT_VERSION, stage, *parts], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class BatchJournal:
+    """
+    阶段内各批次结果的追加日志，进程中断后重新处理同一文件时跳过已完成的批次
+
+    每行一条 JSON 记录，写入后立即刷盘；中断时写了一半的最后一行在读取时忽略。
+    读写都是阻塞的文件操作，在协程中通过 asyncio.to_thread 调用
+    """
+    def __init__(self, path: Optional[str]):
+        self.path = path  # 为 None 时不记录
+        # 并发的批次在不同线程中写入，逐条追加，避免两条记录交错
+        self._lock = threading.Lock()
+
+    def load(self) -> dict:
+        """
+        读取已完成的批次
+
+        Returns:
+            dict: 批次 ID -> 批次结果
+        """
+        entries = {}
+        if not self.path or not os.path.exists(self.path):
+            return entries
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    entries[entry["batch"]] = entry["result"]
+                except (ValueError, KeyError, TypeError):
+                    continue
+        return entries
+
+    def record(self, batch: str, result):
+        """追加一个批次的结果"""
+        if not self.path:
+            return
+        line = json.dumps({"batch": batch, "result": result}, ensure_ascii=False) + "\n"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            print(f"写入批次日志失败: {str(e)}")
+
+    def remove(self):
+        """阶段产物保存后删除日志"""
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ArtifactStore:
+    """
+    按内容寻址的阶段产物存储，保存转换后的音频、增强后的音频、识别结果、矫正和翻译结果等
+
+    产物以文件形式保存在共享数据卷上，多个进程共享；总大小超过上限时按最近访问时间淘汰
+    """
+    # 每写入多少个产物检查一次总大小
+    evict_every = 50
+
+    def __init__(self, root: str, max_bytes: int, journal_dir: Optional[str] = None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.journal_dir = journal_dir  # 批次日志目录，与产物缓存是否启用无关
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.root)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def exists(self, key: str) -> bool:
+        return self.enabled and os.path.exists(self._path(key))
+
+    def get(self, key: str) -> Optional[bytes]:
+        """读取产物，不存在时返回 None"""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # 更新访问时间，淘汰时保留最近使用的产物
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def put(self, key: str, data: bytes):
+        """写入产物，先写临时文件再重命名，其他进程不会读到写了一半的文件"""
+        if not self.enabled:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"写入阶段产物失败: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % self.evict_every == 0
+        if evict:
+            self._evict()
+
+    def journal(self, key: str) -> BatchJournal:
+        """获取阶段产物对应的批次日志，产物 key 相同的重新处理才会复用已完成的批次"""
+        return BatchJournal(os.path.join(self.journal_dir, f"{key}.jsonl") if self.journal_dir else None)
+
+    def _evict(self):
+        """
+        总大小超过上限时，按访问时间从旧到新删除，直到降到上限的 90%
+
+        批次日志和其他进程正在写入的临时文件不参与淘汰
+        """
+        files = []
+        journal_dir = os.path.abspath(self.journal_dir) if self.journal_dir else None
+        for directory, dirs, names in os.walk(self.root):
+            # 批次日志目录可能配置在产物目录下
+            dirs[:] = [name for name in dirs if os.path.abspath(os.path.join(directory, name)) != journal_dir]
+            for name in names:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        if total <= self.max_bytes:
+            return
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable], encoding: str = "bytes"):
+        """
+        读取产物，不存在时调用 compute 计算并保存
+
+        同一事件循环内相同 key 的并发调用只计算一次，批次中相同的输入文件只处理一遍
+
+        Args:
+            key: 产物 key
+            compute: 无参数的协程函数，返回产物
+            encoding: 产物类型，"bytes" 为原始字节，"json" 为可以 JSON 序列化的对象
+
+        Returns:
+            产物内容
+        """
+        def decode(data: bytes):
+            # JSON 产物每次重新解析，相同输入的多个文件各自得到独立的对象，可以原地修改
+            return data if encoding == "bytes" else json.loads(data)
+
+        data = await asyncio.to_thread(self.get, key)
+        if data is not None:
+            self.hits += 1
+            return decode(data)
+
+        loop = asyncio.get_running_loop()
+        inflight = _inflight.setdefault(loop, {})
+        while key in inflight:
+            future = inflight[key]
+            try:
+                data = await asyncio.shield(future)
+                self.hits += 1
+                return decode(data)
+            except asyncio.CancelledError:
+                # 负责计算的任务被取消时，由等待者重新计算
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        self.misses += 1
+        future = loop.create_future()
+        inflight[key] = future
+        try:
+            value = await compute()
+            data = value if encoding == "bytes" else json.dumps(value, ensure_ascii=False).encode("utf-8")
+            await asyncio.to_thread(self.put, key, data)
+            future.set_result(data)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        """
+        获取本进程的命中统计
+
+        Returns:
+            dict: 包含命中数、未命中数和命中率的字典
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+artifact_store = ArtifactStore(global_config.artifact_dir, int(global_config.artifact_max_gb * 1024 ** 3), global_config.batch_journal_dir)
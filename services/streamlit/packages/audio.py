@@ -1,10 +1,15 @@
 import aiohttp
 import asyncio
 from config import global_config
+from packages.session import get_session
 from typing import Optional
-import tempfile
-import subprocess
 import os
+import time
+import wave
+import uuid
+import weakref
+from io import BytesIO
+import numpy as np
 
 def _ms_to_srt_time(ms: int) -> str:
     """
@@ -77,12 +82,88 @@ def generate_lrc(subtitles: list) -> str:
 
 
 
-async def convert_to_wav(audio_bytes: bytes) -> bytes:
+# 每个事件循环各自的 ffmpeg 并发信号量（streamlit 每次运行可能使用新的事件循环）
+_ffmpeg_semaphores = weakref.WeakKeyDictionary()
+
+def _get_ffmpeg_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    if loop not in _ffmpeg_semaphores:
+        _ffmpeg_semaphores[loop] = asyncio.Semaphore(max(global_config.ffmpeg_concurrency, 1))
+    return _ffmpeg_semaphores[loop]
+
+async def _run_ffmpeg(audio_bytes: Optional[bytes], output_args: list, chunk_size: int = 1024 * 1024, input_path: Optional[str] = None) -> bytes:
+    """
+    通过标准输入输出管道流式调用 ffmpeg，不落盘也不阻塞事件循环
+    
+    Args:
+        audio_bytes: 输入音频字节流
+        output_args: ffmpeg 输出参数，输出目标固定为标准输出
+        chunk_size: 读写管道的块大小
+        input_path: 输入音频文件路径，指定时由 ffmpeg 直接读取文件，忽略 audio_bytes
+        
+    Returns:
+        bytes: ffmpeg 的输出
+        
+    Raises:
+        Exception: 当 ffmpeg 返回非零状态码时抛出异常
+    """
+    async with _get_ffmpeg_semaphore():
+        process = await asyncio.create_subprocess_exec(
+            'ffmpeg',
+            '-hide_banner',
+            '-loglevel', 'error',
+            '-i', input_path or 'pipe:0',  # 从文件或标准输入读取
+            *output_args,
+            'pipe:1',  # 输出到标准输出
+            stdin=asyncio.subprocess.DEVNULL if input_path else asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        
+        async def feed():
+            if input_path:
+                return
+            try:
+                for i in range(0, len(audio_bytes), chunk_size):
+                    process.stdin.write(audio_bytes[i:i + chunk_size])
+                    await process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                # ffmpeg 提前退出时由返回码报告错误
+                pass
+            finally:
+                process.stdin.close()
+        
+        async def collect(stream) -> bytes:
+            chunks = []
+            while True:
+                chunk = await stream.read(chunk_size)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            return b''.join(chunks)
+        
+        try:
+            _, output, stderr = await asyncio.gather(feed(), collect(process.stdout), collect(process.stderr))
+            returncode = await process.wait()
+        except asyncio.CancelledError:
+            # 任务被取消时终止 ffmpeg 进程
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+        
+        if returncode != 0:
+            raise Exception(f"音频转换失败: {stderr.decode('utf-8', errors='ignore')}")
+        return output
+
+async def convert_to_wav(audio_bytes: Optional[bytes], sample_rate: int = 48000, input_path: Optional[str] = None) -> bytes:
     """
     将输入音频转换为 WAV 格式
     
     Args:
         audio_bytes: 输入音频字节流
+        sample_rate: 输出采样率，应与下游服务期望的输入格式一致
+        input_path: 输入音频文件路径，指定时直接读取文件，不需要把原始音频读入内存
         
     Returns:
         bytes: 转换后的 WAV 音频字节流
@@ -91,40 +172,23 @@ async def convert_to_wav(audio_bytes: bytes) -> bytes:
         Exception: 当转换失败时抛出异常
     """
     try:
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_wav:
-            with tempfile.NamedTemporaryFile(delete=False) as temp_input:
-                # 写入输入音频
-                temp_input.write(audio_bytes)
-                temp_input.flush()
-                
-                # 构建 ffmpeg 命令
-                ffmpeg_cmd = [
-                    'ffmpeg',
-                    '-y',  # 覆盖输出文件
-                    '-i', temp_input.name,  # 输入文件
-                    '-vn',  # 不处理视频
-                    '-acodec', 'pcm_s16le',  # PCM 编码
-                    '-ar', '48000',  # 采样率
-                    '-ac', '1',  # 单声道
-                    temp_wav.name  # 输出文件
-                ]
-                
-                # 执行转换
-                subprocess.run(ffmpeg_cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                
-                # 读取转换后的音频
-                temp_wav.seek(0)
-                wav_bytes = temp_wav.read()
-                
-        # 删除临时文件
-        os.unlink(temp_input.name)
-        os.unlink(temp_wav.name)
+        # 管道输出无法回写 WAV 头中的长度，因此让 ffmpeg 输出裸 PCM，再补上 WAV 头
+        pcm_bytes = await _run_ffmpeg(audio_bytes, [
+            '-vn',  # 不处理视频
+            '-acodec', 'pcm_s16le',  # PCM 编码
+            '-ar', str(sample_rate),  # 采样率
+            '-ac', '1',  # 单声道
+            '-f', 's16le'
+        ], input_path=input_path)
         
-        return wav_bytes
+        wav_buffer = BytesIO()
+        with wave.open(wav_buffer, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(sample_rate)
+            wav.writeframes(pcm_bytes)
+        return wav_buffer.getvalue()
     
-    except subprocess.CalledProcessError as e:
-        raise Exception(f"音频转换失败: {e.stderr.decode('utf-8')}")
     except Exception as e:
         raise Exception(f"音频转换发生错误: {str(e)}")
 
@@ -142,45 +206,90 @@ async def convert_to_mp3(audio_bytes: bytes) -> bytes:
         Exception: 当转换失败时抛出异常
     """
     try:
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_mp3:
-            with tempfile.NamedTemporaryFile(delete=False) as temp_input:
-                # 写入输入音频
-                temp_input.write(audio_bytes)
-                temp_input.flush()
-                
-                # 构建 ffmpeg 命令
-                ffmpeg_cmd = [
-                    'ffmpeg',
-                    '-y',  # 覆盖输出文件
-                    '-i', temp_input.name,  # 输入文件
-                    '-vn',  # 不处理视频
-                    '-acodec', 'libmp3lame',  # MP3 编码
-                    '-b:a', '192k',  # 比特率
-                    '-ar', '48000',  # 采样率
-                    '-ac', '1',  # 单声道
-                    temp_mp3.name  # 输出文件
-                ]
-                
-                # 执行转换
-                subprocess.run(ffmpeg_cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                
-                # 读取转换后的音频
-                temp_mp3.seek(0)
-                mp3_bytes = temp_mp3.read()
-                
-        # 删除临时文件
-        os.unlink(temp_input.name)
-        os.unlink(temp_mp3.name)
-        
-        return mp3_bytes
+        return await _run_ffmpeg(audio_bytes, [
+            '-vn',  # 不处理视频
+            '-acodec', 'libmp3lame',  # MP3 编码
+            '-b:a', '192k',  # 比特率
+            '-ar', '48000',  # 采样率
+            '-ac', '1',  # 单声道
+            '-f', 'mp3'
+        ])
     
-    except subprocess.CalledProcessError as e:
-        raise Exception(f"音频转换失败: {e.stderr.decode('utf-8')}")
     except Exception as e:
         raise Exception(f"音频转换发生错误: {str(e)}")
 
 
+# 服务未声明输入格式时使用的采样率
+DEFAULT_SAMPLE_RATE = 16000
+
+# 已查询到的服务输入格式，按服务地址缓存
+_input_formats = {}
+# 查询失败的服务地址 -> 重新查询的时间，期间直接使用默认采样率，避免每个文件都等待超时
+_input_format_failures = {}
+# 查询失败后多久重新查询（秒）
+INPUT_FORMAT_RETRY_SECONDS = 60
+
+async def get_input_sample_rate(service_url: str, model: Optional[str] = None) -> int:
+    """
+    向服务查询其期望的输入采样率，查询结果按服务地址缓存，查询失败时在一段时间内直接使用默认采样率
+    
+    FunASR 返回单一的 input_format，ClearVoice 按模型名称返回各自的 input_format
+    
+    Args:
+        service_url: 服务地址
+        model: 模型名称，服务按模型声明格式时使用
+        
+    Returns:
+        int: 期望的采样率，查询失败时返回 DEFAULT_SAMPLE_RATE
+    """
+    if service_url not in _input_formats:
+        if time.monotonic() < _input_format_failures.get(service_url, 0):
+            return DEFAULT_SAMPLE_RATE
+        try:
+            session = get_session()
+            async with session.get(service_url + "/", timeout=10) as response:
+                result = await response.json()
+                _input_formats[service_url] = result.get("input_format", {})
+        except Exception as e:
+            print(f"获取 {service_url} 输入格式失败，{INPUT_FORMAT_RETRY_SECONDS} 秒内使用默认采样率: {str(e)}")
+            _input_format_failures[service_url] = time.monotonic() + INPUT_FORMAT_RETRY_SECONDS
+            return DEFAULT_SAMPLE_RATE
+    
+    input_format = _input_formats[service_url]
+    if model is not None:
+        input_format = input_format.get(model, {})
+    return int(input_format.get("sample_rate", DEFAULT_SAMPLE_RATE))
+
+class SharedAudioFile:
+    """
+    将音频写入共享数据卷上的临时文件，服务端可直接按路径读取，避免通过 HTTP 传输音频
+    
+    用法:
+        with SharedAudioFile(audio_bytes) as path:
+            ...
+    """
+    def __init__(self, audio_bytes: bytes, suffix: str = '.wav'):
+        self.audio_bytes = audio_bytes
+        self.path = os.path.join(global_config.shared_tmp_dir, f"{uuid.uuid4()}{suffix}")
+
+    def __enter__(self) -> str:
+        os.makedirs(global_config.shared_tmp_dir, exist_ok=True)
+        with open(self.path, 'wb') as f:
+            f.write(self.audio_bytes)
+        return self.path
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class ServiceBusyError(Exception):
+    """服务端返回 429 时抛出，携带建议的重试等待秒数"""
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
 async def _request_with_retry(url: str, data: dict, files: dict, retries: int = 3) -> dict:
     """
     带重试功能的请求函数
@@ -188,7 +297,7 @@ async def _request_with_retry(url: str, data: dict, files: dict, retries: int =
     Args:
         url: 请求URL
         data: 表单数据
-        files: 文件数据
+        files: 文件数据，按路径请求时为 None
         retries: 重试次数
         
     Returns:
@@ -199,28 +308,38 @@ async def _request_with_retry(url: str, data: dict, files: dict, retries: int =
     """
     for i in range(retries):
         try:
-            async with aiohttp.ClientSession() as session:
-                form_data = aiohttp.FormData()
-                for key, value in data.items():
-                    form_data.add_field(key, value)
+            session = get_session()
+            form_data = aiohttp.FormData()
+            for key, value in data.items():
+                form_data.add_field(key, value)
+            if files:
                 form_data.add_field('file', files['file'], filename='audio.wav')
                 
-                async with session.post(url, data=form_data, timeout=360) as response:
-                    if response.status != 200:
-                        raise Exception(f"请求失败，状态码: {response.status}")
-                    return await response.json()
+            async with session.post(url, data=form_data, timeout=360) as response:
+                if response.status == 429:
+                    # 服务繁忙，按服务端给出的 Retry-After 等待
+                    retry_after = float(response.headers.get('Retry-After', 1 * (i + 1)))
+                    raise ServiceBusyError(f"服务繁忙，状态码: {response.status}", retry_after)
+                if response.status != 200:
+                    raise Exception(f"请求失败，状态码: {response.status}")
+                return await response.json()
         except Exception as e:
             if i == retries - 1:
                 raise Exception(f"请求失败，重试次数已达上限: {str(e)}")
-            await asyncio.sleep(1 * (i + 1))  # 指数退避
+            if isinstance(e, ServiceBusyError):
+                await asyncio.sleep(e.retry_after)
+            else:
+                await asyncio.sleep(1 * (i + 1))  # 指数退避
 
-async def speech_to_text(audio_bytes: bytes, hotwords: Optional[str] = None, spk_conf: bool = False) -> list:
+async def speech_to_text(audio_bytes: bytes, hotwords: Optional[str] = None, spk_conf: bool = False, use_path: bool = False, allow_empty: bool = False) -> list:
     """
     将语音文件转换为文字，返回带时间戳的文本列表
     
     Args:
         audio_bytes: 音频文件字节流
         hotwords: 热词，用空格分隔的字符串
+        use_path: 是否经共享数据卷按路径传给服务端，而不是上传音频
+        allow_empty: 识别结果为空时返回空列表而不是抛出异常，例如只包含静音的分片
         
     Returns:
         list: 包含 [start_time, end_time, text] 的列表
@@ -236,25 +355,127 @@ async def speech_to_text(audio_bytes: bytes, hotwords: Optional[str] = None, spk
     if hotwords:
         data['hotwords'] = hotwords
         
-    files = {
-        'file': audio_bytes
-    }
-    
     try:
-        result = await _request_with_retry(url, data, files)
+        if use_path:
+            with SharedAudioFile(audio_bytes) as path:
+                result = await _request_with_retry(url, {**data, 'path': path}, None)
+        else:
+            result = await _request_with_retry(url, data, {'file': audio_bytes})
         
         # 检查响应状态
         if result.get('code') != 0:
             raise Exception(f"语音识别失败: {result.get('message')}")
             
         # 提取并检查数据
-        data = result.get('data', [])
-        if not data:
+        data = result.get('data') or []
+        if not data and not allow_empty:
             raise Exception("语音识别结果为空")
         return data
     except Exception as e:
         raise Exception(f"语音识别失败: {str(e)}")
 
+def split_wav_on_silence(wav_bytes: bytes, shard_minutes: float = 10, search_seconds: float = 15, frame_ms: int = 50) -> list:
+    """
+    将 16 位 PCM WAV 音频在低能量处切分为若干分片
+    
+    每隔 shard_minutes 分钟寻找一次切分点，在目标位置前后 search_seconds 秒内
+    选取能量最低的帧作为切分位置，尽量避免切断句子
+    
+    Args:
+        wav_bytes: WAV 音频字节流
+        shard_minutes: 每个分片的目标时长（分钟）
+        search_seconds: 切分点的搜索范围（秒）
+        frame_ms: 计算能量的帧长（毫秒）
+        
+    Returns:
+        list: 包含 (offset_ms, shard_bytes) 的列表，offset_ms 为分片在原音频中的起始毫秒数
+    """
+    with wave.open(BytesIO(wav_bytes), 'rb') as wav:
+        params = wav.getparams()
+        frames = wav.readframes(params.nframes)
+    
+    if params.sampwidth != 2:
+        raise Exception(f"不支持的采样位宽: {params.sampwidth * 8} bit")
+    
+    rate = params.framerate
+    samples = np.frombuffer(frames, dtype=np.int16).reshape(-1, params.nchannels)
+    total = len(samples)
+    shard_size = int(shard_minutes * 60 * rate)
+    if shard_size <= 0 or total <= shard_size:
+        return [(0, wav_bytes)]
+    
+    frame_size = max(int(rate * frame_ms / 1000), 1)
+    search_size = int(search_seconds * rate)
+    
+    # 计算切分点
+    cuts = [0]
+    while total - cuts[-1] > shard_size:
+        target = cuts[-1] + shard_size
+        lo = max(target - search_size, cuts[-1] + frame_size)
+        hi = min(target + search_size, total - frame_size)
+        window = samples[lo:hi].astype(np.float32).mean(axis=1)
+        frame_count = len(window) // frame_size
+        if frame_count == 0:
+            cuts.append(target)
+            continue
+        energy = np.square(window[:frame_count * frame_size].reshape(frame_count, frame_size)).mean(axis=1)
+        cuts.append(lo + int(np.argmin(energy)) * frame_size + frame_size // 2)
+    cuts.append(total)
+    
+    shards = []
+    for start, end in zip(cuts[:-1], cuts[1:]):
+        buffer = BytesIO()
+        with wave.open(buffer, 'wb') as shard:
+            shard.setnchannels(params.nchannels)
+            shard.setsampwidth(params.sampwidth)
+            shard.setframerate(rate)
+            shard.writeframes(samples[start:end].tobytes())
+        shards.append((start * 1000 // rate, buffer.getvalue()))
+    return shards
+
+async def speech_to_text_sharded(audio_bytes: bytes, hotwords: Optional[str] = None, spk_conf: bool = False, shard_minutes: Optional[float] = None, concurrency: Optional[int] = None, use_path: bool = False) -> list:
+    """
+    将长音频切分后并发识别，并按偏移量合并时间戳
+    
+    每个分片是独立的请求，失败时只重试该分片。注意开启说话人识别时，
+    不同分片之间的说话人编号互不关联
+    
+    Args:
+        audio_bytes: WAV 音频字节流
+        hotwords: 热词，用空格分隔的字符串
+        spk_conf: 是否启用说话人识别
+        shard_minutes: 分片时长（分钟），默认使用全局配置，为 0 时不切分
+        concurrency: 同时发往 FunASR 的分片数，默认使用全局配置
+        use_path: 是否经共享数据卷按路径传给服务端
+        
+    Returns:
+        list: 与 speech_to_text 相同格式的识别结果
+        
+    Raises:
+        Exception: 当任一分片识别失败或结果为空时抛出异常
+    """
+    shard_minutes = global_config.asr_shard_minutes if shard_minutes is None else shard_minutes
+    concurrency = global_config.asr_shard_concurrency if concurrency is None else concurrency
+    
+    # 在长音频上计算能量耗时较长，放到线程中执行，不阻塞其他文件的处理
+    shards = await asyncio.to_thread(split_wav_on_silence, audio_bytes, shard_minutes) if shard_minutes > 0 else [(0, audio_bytes)]
+    if len(shards) == 1:
+        return await speech_to_text(audio_bytes, hotwords=hotwords, spk_conf=spk_conf, use_path=use_path)
+    
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    
+    async def recognize(offset_ms: int, shard_bytes: bytes) -> list:
+        async with semaphore:
+            # 分片可能只包含静音，识别结果为空时跳过
+            sentences = await speech_to_text(shard_bytes, hotwords=hotwords, spk_conf=spk_conf, use_path=use_path, allow_empty=True)
+        return [{**sentence, 'start': sentence['start'] + offset_ms, 'end': sentence['end'] + offset_ms} for sentence in sentences]
+    
+    results = await asyncio.gather(*[recognize(offset_ms, shard_bytes) for offset_ms, shard_bytes in shards])
+    sentences = [sentence for shard_result in results for sentence in shard_result]
+    if not sentences:
+        raise Exception("语音识别失败: 语音识别结果为空")
+    return sentences
+
 def remove_trailing_punctuation(text: str) -> str:
     """去除字符串末尾的标点符号"""
     punc = '。，、；：！？,.?!;:'
@@ -332,13 +553,14 @@ def format_speech_results(results: list, text_min_len: int = 5) -> list:
     return formatted_results
 
 
-async def enhance_audio(audio_bytes: bytes, model_name: str) -> bytes:
+async def enhance_audio(audio_bytes: bytes, model_name: str, use_path: bool = False) -> bytes:
     """
     使用指定模型增强音频文件
     
     Args:
         audio_bytes: 音频文件字节流
         model_name: 模型名称，如 'MossFormer2_SE_48K', 'FRCRN_SE_16K', 'MossFormerGAN_SE_16K'
+        use_path: 是否经共享数据卷按路径传给服务端，而不是上传音频
         
     Returns:
         bytes: 增强后的音频文件流
@@ -348,23 +570,32 @@ async def enhance_audio(audio_bytes: bytes, model_name: str) -> bytes:
     """
     url = global_config.clear_voice_url + "/handle"
 
-    data = {
-        'model': model_name
-    }
-    files = {
-        'file': audio_bytes
-    }
+    retries = 3
     
-    try:
-        async with aiohttp.ClientSession() as session:
+    async def request(path: Optional[str]) -> bytes:
+        for i in range(retries):
+            session = get_session()
             form_data = aiohttp.FormData()
             form_data.add_field('model', model_name)
-            form_data.add_field('file', audio_bytes, filename='audio.wav')
-            
+            if path:
+                form_data.add_field('path', path)
+            else:
+                form_data.add_field('file', audio_bytes, filename='audio.wav')
+                
             async with session.post(url, data=form_data, timeout=360) as response:
+                if response.status == 429 and i < retries - 1:
+                    # 服务繁忙，按服务端给出的 Retry-After 等待后重试
+                    await asyncio.sleep(float(response.headers.get('Retry-After', 1 * (i + 1))))
+                    continue
                 if response.status != 200:
                     raise Exception(f"增强音频失败: {await response.text()}")
                 return await response.read()
+    
+    try:
+        if use_path:
+            with SharedAudioFile(audio_bytes) as path:
+                return await request(path)
+        return await request(None)
     except Exception as e:
         raise Exception(f"增强音频失败: {str(e)}")
 
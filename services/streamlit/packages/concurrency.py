@@ -0,0 +1,159 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from config import global_config
+
+
+class AdaptiveLimiter:
+    """
+    基于 AIMD 的自适应并发控制器
+
+    延迟稳定时每完成约一个并发窗口的请求，并发上限加 1；超时、429 或 5xx 时并发上限减半。
+    streamlit 的不同会话运行在不同线程和事件循环中，因此用线程锁保护状态，
+    并通过 call_soon_threadsafe 唤醒等待者
+    """
+    def __init__(self, initial_limit: float = 2, min_limit: int = 1, max_limit: int = 64, latency_tolerance: float = 2.0):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance  # 延迟超过基线的倍数时不再增加并发
+        self.inflight = 0
+        self.successes = 0
+        self.failures = 0
+        self._latencies = deque(maxlen=200)
+        self._baseline = None  # 近期最小延迟，作为延迟基线
+        self._last_decrease = 0.0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    async def _acquire(self):
+        while True:
+            with self._lock:
+                if self.inflight < max(int(self.limit), self.min_limit):
+                    self.inflight += 1
+                    return
+                loop = asyncio.get_running_loop()
+                future = loop.create_future()
+                self._waiters.append((loop, future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                with self._lock:
+                    if (loop, future) in self._waiters:
+                        self._waiters.remove((loop, future))
+                    else:
+                        # 已被唤醒但放弃了名额，转交给下一个等待者
+                        self._wake()
+                raise
+
+    def _release(self):
+        with self._lock:
+            self.inflight -= 1
+            self._wake()
+
+    def _wake(self):
+        """唤醒可以获得并发名额的等待者，需要在持有锁时调用"""
+        available = max(int(self.limit), self.min_limit) - self.inflight
+        while available > 0 and self._waiters:
+            loop, future = self._waiters.popleft()
+            if loop.is_closed():
+                continue
+            loop.call_soon_threadsafe(lambda f=future: f.done() or f.set_result(None))
+            available -= 1
+
+    def on_success(self, latency: float):
+        with self._lock:
+            self.successes += 1
+            self._latencies.append(latency)
+            self._baseline = latency if self._baseline is None else min(self._baseline * 1.01, latency)
+            # 加性增加：延迟稳定时，每个窗口的请求全部成功后上限加 1
+            if latency <= self._baseline * self.latency_tolerance:
+                self.limit = min(self.limit + 1 / self.limit, self.max_limit)
+                self._wake()
+
+    def on_failure(self):
+        with self._lock:
+            self.failures += 1
+            now = time.monotonic()
+            # 同一批在途请求的失败只减半一次
+            window = self._percentile(0.5) or 1.0
+            if now - self._last_decrease >= window:
+                self.limit = max(self.limit / 2, self.min_limit)
+                self._last_decrease = now
+
+    def _percentile(self, p: float) -> float:
+        if not self._latencies:
+            return 0.0
+        values = sorted(self._latencies)
+        return values[min(int(len(values) * p), len(values) - 1)]
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        获取一个并发名额
+
+        用法:
+            async with limiter.slot():
+                ...
+        """
+        await self._acquire()
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self) -> dict:
+        """
+        获取当前并发上限和延迟分位数
+
+        Returns:
+            dict: 包含并发上限、在途请求数、成功失败数和 p50/p90/p99 延迟（秒）的字典
+        """
+        with self._lock:
+            return {
+                "limit": int(self.limit),
+                "inflight": self.inflight,
+                "successes": self.successes,
+                "failures": self.failures,
+                "p50": self._percentile(0.5),
+                "p90": self._percentile(0.9),
+                "p99": self._percentile(0.99),
+            }
+
+
+# 每个接口地址一个控制器
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(endpoint: str) -> AdaptiveLimiter:
+    """
+    获取接口地址对应的自适应并发控制器
+
+    Args:
+        endpoint: 接口地址
+
+    Returns:
+        AdaptiveLimiter: 控制器实例
+    """
+    with _limiters_lock:
+        if endpoint not in _limiters:
+            _limiters[endpoint] = AdaptiveLimiter(
+                initial_limit=global_config.llm_initial_concurrency,
+                max_limit=global_config.llm_max_concurrency
+            )
+        return _limiters[endpoint]
+
+
+def limiter_stats() -> dict:
+    """
+    获取所有接口地址的并发控制状态
+
+    Returns:
+        dict: 接口地址到 AdaptiveLimiter.stats() 的映射
+    """
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {endpoint: limiter.stats() for endpoint, limiter in limiters.items()}
@@ -0,0 +1,441 @@
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from typing import List, Optional
+from config import global_config
+
+# 文件状态
+FILE_PENDING = "pending"
+FILE_RUNNING = "running"
+FILE_DONE = "done"
+FILE_FAILED = "failed"
+
+# 任务状态
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_CANCELLED = "cancelled"
+
+APP_PATH = os.path.join(os.path.dirname(__file__), '../')
+
+
+# 本进程启动的 worker 进程，退出后及时回收，避免成为僵尸进程
+_children: List[subprocess.Popen] = []
+
+
+def _reap_children():
+    """回收已退出的 worker 子进程"""
+    _children[:] = [process for process in _children if process.poll() is None]
+
+
+def _process_stat(pid: int) -> Optional[List[str]]:
+    """读取 /proc/<pid>/stat 中进程名之后的字段，第一个字段为进程状态"""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            # comm 字段可能包含空格，从最后一个右括号之后开始解析
+            return f.read().rsplit(")", 1)[1].split()
+    except (OSError, IndexError):
+        return None
+
+
+def _process_start_time(pid: int) -> Optional[str]:
+    """读取进程的启动时间，用于区分复用了同一 PID 的不同进程"""
+    fields = _process_stat(pid)
+    return fields[19] if fields and len(fields) > 19 else None
+
+
+def current_worker_id() -> str:
+    """当前进程的 worker 标识：主机名:PID:进程启动时间"""
+    pid = os.getpid()
+    return f"{socket.gethostname()}:{pid}:{_process_start_time(pid) or ''}"
+
+
+def worker_alive(worker: str) -> bool:
+    """判断 worker 进程是否仍在运行，其他主机上的 worker 视为存活"""
+    try:
+        host, pid, start_time = worker.rsplit(":", 2)
+        pid = int(pid)
+    except ValueError:
+        return False
+    if host != socket.gethostname():
+        return True
+    _reap_children()
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    fields = _process_stat(pid)
+    # 已退出但尚未被父进程回收的僵尸进程仍然可以收到信号，按状态字段判断
+    if fields and fields[0] in ("Z", "X"):
+        return False
+    return not start_time or (fields is not None and len(fields) > 19 and fields[19] == start_time)
+
+
+class JobStore:
+    """
+    持久化的离线任务队列，记录每个任务及其中每个文件的状态、重试次数和耗时
+
+    使用 SQLite 存储，多个 worker 进程通过 IMMEDIATE 事务原子地领取文件；
+    worker 中断后重新启动时跳过已完成的文件，从中断处继续
+    """
+    def __init__(self, path: str, max_attempts: int = 3):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, config TEXT NOT NULL, "
+                "input_dir TEXT NOT NULL, output_dir TEXT NOT NULL, stage_major INTEGER NOT NULL DEFAULT 0, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_files ("
+                "job_id TEXT NOT NULL, idx INTEGER NOT NULL, path TEXT NOT NULL, status TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, worker TEXT, started_at REAL, finished_at REAL, "
+                "seconds REAL, error TEXT, audio_path TEXT, "
+                "PRIMARY KEY (job_id, idx))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_job_files_status ON job_files (job_id, status)")
+            # 旧版本创建的表没有阶段进度字段
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(job_files)")}
+            for column in ("stage", "progress"):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE job_files ADD COLUMN {column} TEXT")
+            self._conn = conn
+        return self._conn
+
+    def _update_job_status(self, conn: sqlite3.Connection, job_id: str):
+        """所有文件都已结束时把任务标记为完成，需要在事务中调用"""
+        row = conn.execute(
+            "SELECT COUNT(*) FROM job_files WHERE job_id = ? AND status IN (?, ?)",
+            (job_id, FILE_PENDING, FILE_RUNNING)
+        ).fetchone()
+        if row[0] == 0:
+            conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status != ?",
+                (JOB_DONE, time.time(), job_id, JOB_CANCELLED)
+            )
+
+    def create_job(self, config: dict, input_dir: str, output_dir: str, audio_files: List[str], stage_major: bool = False, job_id: str = None) -> str:
+        """
+        创建任务
+
+        Args:
+            config: 处理配置
+            input_dir: 输入目录
+            output_dir: 输出目录
+            audio_files: 音频文件路径列表
+            stage_major: 是否按阶段批量处理
+            job_id: 任务 ID，默认随机生成
+
+        Returns:
+            str: 任务 ID
+        """
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT INTO jobs (id, status, config, input_dir, output_dir, stage_major, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, JOB_PENDING, json.dumps(config, ensure_ascii=False), input_dir, output_dir, int(stage_major), now, now)
+                )
+                conn.executemany(
+                    "INSERT INTO job_files (job_id, idx, path, status) VALUES (?, ?, ?, ?)",
+                    [(job_id, idx, path, FILE_PENDING) for idx, path in enumerate(audio_files)]
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        """
+        获取任务信息和各状态的文件数
+
+        Returns:
+            Optional[dict]: 任务信息，不存在时返回 None
+        """
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = dict(row)
+            job["config"] = json.loads(job["config"])
+            job["stage_major"] = bool(job["stage_major"])
+            counts = conn.execute(
+                "SELECT status, COUNT(*), SUM(seconds) FROM job_files WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall()
+        job["files"] = {status: 0 for status in (FILE_PENDING, FILE_RUNNING, FILE_DONE, FILE_FAILED)}
+        job["files"].update({status: count for status, count, _ in counts})
+        job["total"] = sum(job["files"].values())
+        job["processing_seconds"] = sum(seconds or 0 for _, _, seconds in counts)
+        done_seconds = next((seconds for status, _, seconds in counts if status == FILE_DONE), None)
+        job["eta_seconds"] = self._estimate_eta(job, done_seconds)
+        return job
+
+    @staticmethod
+    def _estimate_eta(job: dict, done_seconds: Optional[float]) -> Optional[float]:
+        """
+        估算剩余时间：已完成文件的平均耗时 × 剩余文件数 / 同时处理的文件数
+
+        使用文件自身的耗时而不是任务开始以来的时间，任务中途暂停不影响估算；还没有完成的文件时无法估算
+        """
+        remaining = job["files"][FILE_PENDING] + job["files"][FILE_RUNNING]
+        if remaining == 0:
+            return 0.0
+        if job["status"] == JOB_CANCELLED or not job["files"][FILE_DONE] or not done_seconds:
+            return None
+        average = done_seconds / job["files"][FILE_DONE]
+        return round(average * remaining / max(job["files"][FILE_RUNNING], 1), 1)
+
+    def list_jobs(self, limit: int = 20) -> List[dict]:
+        """按创建时间倒序列出最近的任务"""
+        with self._lock:
+            rows = self._connect().execute("SELECT id FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self.get_job(row[0]) for row in rows]
+
+    def list_files(self, job_id: str) -> List[dict]:
+        """列出任务中的所有文件及其状态"""
+        with self._lock:
+            rows = self._connect().execute("SELECT * FROM job_files WHERE job_id = ? ORDER BY idx", (job_id,)).fetchall()
+        files = [dict(row) for row in rows]
+        for file in files:
+            file["progress"] = json.loads(file["progress"]) if file["progress"] else {}
+        return files
+
+    def update_progress(self, job_id: str, idx: int, stage: Optional[str] = None, progress: Optional[dict] = None):
+        """
+        记录文件当前所在的阶段和大模型阶段的批次进度
+
+        Args:
+            stage: 当前阶段名称，为 None 时不修改
+            progress: 阶段名称 -> [已完成批次数, 总批次数]，为 None 时不修改
+        """
+        with self._lock:
+            self._connect().execute(
+                "UPDATE job_files SET stage = COALESCE(?, stage), progress = COALESCE(?, progress) WHERE job_id = ? AND idx = ?",
+                (stage, json.dumps(progress) if progress is not None else None, job_id, idx)
+            )
+
+    def unfinished_jobs(self) -> List[str]:
+        """未完成且未取消的任务 ID"""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at", (JOB_PENDING, JOB_RUNNING)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def claim_files(self, job_id: str, worker: str, limit: int = 1) -> List[dict]:
+        """
+        原子地领取待处理的文件
+
+        Args:
+            job_id: 任务 ID
+            worker: worker 标识
+            limit: 最多领取的文件数
+
+        Returns:
+            list: 领取到的文件，任务已取消或没有待处理文件时为空
+        """
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                job = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if job is None or job[0] in (JOB_CANCELLED, JOB_DONE):
+                    conn.execute("COMMIT")
+                    return []
+                rows = conn.execute(
+                    "SELECT idx, path, attempts FROM job_files WHERE job_id = ? AND status = ? ORDER BY idx LIMIT ?",
+                    (job_id, FILE_PENDING, limit)
+                ).fetchall()
+                now = time.time()
+                conn.executemany(
+                    "UPDATE job_files SET status = ?, worker = ?, started_at = ?, stage = NULL, attempts = attempts + 1 WHERE job_id = ? AND idx = ?",
+                    [(FILE_RUNNING, worker, now, job_id, row["idx"]) for row in rows]
+                )
+                if rows:
+                    conn.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?", (JOB_RUNNING, now, job_id))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return [{"idx": row["idx"], "path": row["path"], "attempts": row["attempts"] + 1} for row in rows]
+
+    def complete_file(self, job_id: str, idx: int, audio_path: str, seconds: float):
+        """标记文件处理完成"""
+        self._finish_file(job_id, idx, FILE_DONE, seconds, audio_path=audio_path)
+
+    def fail_file(self, job_id: str, idx: int, error: str, seconds: float):
+        """标记文件处理失败，未达到最大重试次数时重新放回队列"""
+        self._finish_file(job_id, idx, FILE_FAILED, seconds, error=error)
+
+    def _finish_file(self, job_id: str, idx: int, status: str, seconds: float, audio_path: str = None, error: str = None):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if status == FILE_FAILED:
+                    attempts = conn.execute(
+                        "SELECT attempts FROM job_files WHERE job_id = ? AND idx = ?", (job_id, idx)
+                    ).fetchone()[0]
+                    if attempts < self.max_attempts:
+                        status = FILE_PENDING
+                conn.execute(
+                    "UPDATE job_files SET status = ?, worker = NULL, finished_at = ?, seconds = ?, error = ?, audio_path = ? "
+                    "WHERE job_id = ? AND idx = ?",
+                    (status, time.time(), seconds, error, audio_path, job_id, idx)
+                )
+                self._update_job_status(conn, job_id)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def recover(self, job_id: str) -> int:
+        """
+        把已退出的 worker 未完成的文件重新放回队列
+
+        Returns:
+            int: 重新放回队列的文件数
+        """
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT idx, worker FROM job_files WHERE job_id = ? AND status = ?", (job_id, FILE_RUNNING)
+                ).fetchall()
+                stale = [row["idx"] for row in rows if not worker_alive(row["worker"] or "")]
+                conn.executemany(
+                    "UPDATE job_files SET status = ?, worker = NULL WHERE job_id = ? AND idx = ?",
+                    [(FILE_PENDING, job_id, idx) for idx in stale]
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return len(stale)
+
+    def cancel_job(self, job_id: str):
+        """取消任务，worker 处理完手上的文件后不再领取新文件"""
+        with self._lock:
+            self._connect().execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status != ?",
+                (JOB_CANCELLED, time.time(), job_id, JOB_DONE)
+            )
+
+    def finished_jobs(self, updated_before: float) -> List[dict]:
+        """
+        列出在指定时间之前已完成或已取消的任务
+
+        Args:
+            updated_before: 时间戳，只返回最后更新时间早于该时间的任务
+
+        Returns:
+            list: 包含 id、input_dir、output_dir 的字典
+        """
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT id, input_dir, output_dir FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (JOB_DONE, JOB_CANCELLED, updated_before)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def delete_job(self, job_id: str):
+        """删除任务及其文件记录，不删除输入和输出目录"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM job_files WHERE job_id = ?", (job_id,))
+                conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def retry_failed(self, job_id: str):
+        """把失败的文件重新放回队列，并恢复已取消的任务"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "UPDATE job_files SET status = ?, attempts = 0, error = NULL WHERE job_id = ? AND status = ?",
+                    (FILE_PENDING, job_id, FILE_FAILED)
+                )
+                conn.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?", (JOB_PENDING, time.time(), job_id))
+                self._update_job_status(conn, job_id)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+
+job_store = JobStore(global_config.job_store_path, max_attempts=global_config.job_max_attempts)
+
+
+def start_job_workers(job_id: str, workers: int = None) -> List[int]:
+    """
+    启动处理任务的后台 worker 进程，进程独立于当前会话运行
+
+    Args:
+        job_id: 任务 ID
+        workers: worker 进程数，默认使用 JOB_WORKERS 配置
+
+    Returns:
+        list: worker 进程的 PID
+    """
+    _reap_children()
+    pids = []
+    for _ in range(workers or global_config.job_workers):
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(APP_PATH, "scripts/convert.py"), f"--job-id={job_id}"],
+            cwd=APP_PATH,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+        _children.append(process)
+        pids.append(process.pid)
+    return pids
+
+
+def resume_jobs() -> List[str]:
+    """
+    服务启动时恢复未完成的任务：回收已退出 worker 的文件并重新启动 worker
+
+    Returns:
+        list: 恢复的任务 ID
+    """
+    resumed = []
+    for job_id in job_store.unfinished_jobs():
+        job_store.recover(job_id)
+        job = job_store.get_job(job_id)
+        # 仍有存活 worker 在处理的任务不需要重新启动
+        if job["files"][FILE_PENDING] > 0 and job["files"][FILE_RUNNING] == 0:
+            start_job_workers(job_id)
+            resumed.append(job_id)
+    return resumed
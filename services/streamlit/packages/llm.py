@@ -1,3 +1,5 @@
+from config import global_config
+
 # 定义供应商常量
 PROVIDER_OLLAMA = "ollama"
 PROVIDER_DEEPSEEK = "deepseek"
@@ -9,19 +11,26 @@ PROVIDER_CONFIG = [
         "provider": PROVIDER_OLLAMA,
         "name": "Ollama",
         "comment": "本地运行的轻量级大模型服务，支持多种开源模型，适合本地部署",
-        "endpoint": "http://ollama:11434"
+        "endpoint": "http://ollama:11434",
+        # 每分钟请求数和 token 数上限，0 表示不限制，可通过环境变量调整
+        "rpm": global_config.ollama_rpm,
+        "tpm": global_config.ollama_tpm
     },
     {
         "provider": PROVIDER_DEEPSEEK,
         "name": "DeepSeek",
         "comment": "深度求索提供的API服务，中文处理能力强，性能优异",
-        "endpoint": "https://api.deepseek.com"
+        "endpoint": "https://api.deepseek.com",
+        "rpm": global_config.deepseek_rpm,
+        "tpm": global_config.deepseek_tpm
     },
     {
         "provider": PROVIDER_OPENAI,
         "name": "OpenAI",
         "comment": "全球领先的AI服务提供商，模型性能强大但需要网络连接",
-        "endpoint": "https://api.openai.com"
+        "endpoint": "https://api.openai.com",
+        "rpm": global_config.openai_rpm,
+        "tpm": global_config.openai_tpm
     }
 ]
 
@@ -42,6 +51,20 @@ def getProvider(provider: str) -> dict:
             return config
     raise ValueError(f"Invalid provider: {provider}. Available providers are: {[p['provider'] for p in PROVIDER_CONFIG]}")
 
+def getRateLimit(endpoint: str) -> tuple:
+    """根据接口地址获取供应商的默认限流配置
+    
+    参数:
+        endpoint: 接口地址
+    
+    返回:
+        tuple: (rpm, tpm)，未知的接口地址不限制，返回 (0, 0)
+    """
+    for config in PROVIDER_CONFIG:
+        if endpoint.rstrip('/') == config['endpoint']:
+            return config['rpm'], config['tpm']
+    return 0, 0
+
 
 
 # 定义模型常量
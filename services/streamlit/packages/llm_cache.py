@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+from config import global_config
+
+
+class CompletionCache:
+    """
+    大模型回复的持久化缓存，按模型、消息、温度和 response_format 的哈希寻址
+
+    使用 SQLite 存储，多个进程（页面、后台任务、API 服务）可共享同一个缓存文件
+    """
+    # 每写入多少条执行一次淘汰
+    evict_every = 100
+
+    def __init__(self, path: str, max_entries: int = 200000, max_age_days: float = 30):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._conn = None
+        self._disabled = not path
+        self._lock = threading.Lock()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None and not self._disabled:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS completions ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                    "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+                )
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_completions_accessed ON completions (accessed_at)")
+                self._conn.commit()
+            except (sqlite3.Error, OSError) as e:
+                print(f"大模型缓存不可用，已禁用: {str(e)}")
+                self._disabled = True
+                self._conn = None
+        return self._conn
+
+    @staticmethod
+    def make_key(model: str, messages: list, temp: float, response_format: Optional[dict] = None) -> str:
+        """
+        计算请求的缓存 key
+
+        Args:
+            model: 模型名称
+            messages: 消息列表
+            temp: 温度参数
+            response_format: 响应格式，普通文本请求为 None
+
+        Returns:
+            str: sha256 十六进制字符串
+        """
+        payload = json.dumps({
+            "model": model,
+            "messages": messages,
+            "temperature": temp,
+            "response_format": response_format,
+        }, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        读取缓存，过期的条目视为未命中
+
+        Args:
+            key: 缓存 key
+
+        Returns:
+            Optional[str]: 缓存的回复内容，未命中时返回 None
+        """
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return None
+            now = time.time()
+            try:
+                row = conn.execute(
+                    "SELECT value FROM completions WHERE key = ? AND created_at >= ?",
+                    (key, now - self.max_age)
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                conn.execute("UPDATE completions SET accessed_at = ? WHERE key = ?", (now, key))
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"读取大模型缓存失败: {str(e)}")
+                return None
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: str):
+        """
+        写入缓存
+
+        Args:
+            key: 缓存 key
+            value: 回复内容
+        """
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            now = time.time()
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO completions (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now)
+                )
+                conn.commit()
+                self._writes += 1
+                if self._writes % self.evict_every == 0:
+                    self._evict(conn, now)
+            except sqlite3.Error as e:
+                print(f"写入大模型缓存失败: {str(e)}")
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """删除过期条目，并按最近访问时间只保留 max_entries 条"""
+        conn.execute("DELETE FROM completions WHERE created_at < ?", (now - self.max_age,))
+        conn.execute(
+            "DELETE FROM completions WHERE key IN ("
+            "SELECT key FROM completions ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        conn.commit()
+
+    def stats(self) -> dict:
+        """
+        获取本进程的命中统计
+
+        Returns:
+            dict: 包含命中数、未命中数和命中率的字典
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+completion_cache = CompletionCache(
+    global_config.llm_cache_path,
+    max_entries=global_config.llm_cache_max_entries,
+    max_age_days=global_config.llm_cache_max_age_days
+)
@@ -2,6 +2,7 @@ import asyncio
 import aiohttp
 import logging
 from config import global_config
+from .session import get_session
 
 logger = logging.getLogger(__name__)
 
@@ -24,39 +25,65 @@ class OllamaHandler:
             Exception: 当模型检查或拉取失败时抛出异常
         """
         # 检查模型是否存在
-        async with aiohttp.ClientSession() as session:
-            # 获取本地模型列表
-            try:
-                async with session.get(f"{self.base_url}/api/tags") as response:
-                    if response.status != 200:
-                        raise Exception(f"获取模型列表失败，状态码：{response.status}")
+        session = get_session()
+        # 获取本地模型列表
+        try:
+            async with session.get(f"{self.base_url}/api/tags") as response:
+                if response.status != 200:
+                    raise Exception(f"获取模型列表失败，状态码：{response.status}")
                     
-                    data = await response.json()
-                    models = [m["name"] for m in data.get("models", [])]
+                data = await response.json()
+                models = [m["name"] for m in data.get("models", [])]
                     
-                    logger.info(f"已有模型 {data}")
-                    if model in models:
-                        logger.info(f"模型 {model} 已存在")
-                        return
-            except Exception as e:
-                raise Exception(f"检查模型失败: {str(e)}")
+                logger.info(f"已有模型 {data}")
+                if model in models:
+                    logger.info(f"模型 {model} 已存在")
+                    return
+        except Exception as e:
+            raise Exception(f"检查模型失败: {str(e)}")
 
-            # 如果模型不存在，开始拉取
-            logger.info(f"开始拉取模型 {model}")
-            try:
-                pull_data = {"model": model, "stream": False}
-                async with session.post(f"{self.base_url}/api/pull", json=pull_data) as response:
-                    if response.status != 200:
-                        raise Exception(f"拉取模型失败，状态码：{response.status}")
+        # 如果模型不存在，开始拉取
+        logger.info(f"开始拉取模型 {model}")
+        try:
+            pull_data = {"model": model, "stream": False}
+            async with session.post(f"{self.base_url}/api/pull", json=pull_data) as response:
+                if response.status != 200:
+                    raise Exception(f"拉取模型失败，状态码：{response.status}")
                     
-                    pull_result = await response.json()
-                    while pull_result.get("status") != "success":
-                        logger.info(f"模型拉取状态: {pull_result.get('status')}")
-                        await asyncio.sleep(3)
-                        async with session.post(f"{self.base_url}/api/pull", json=pull_data) as response:
-                            pull_result = await response.json()
+                pull_result = await response.json()
+                while pull_result.get("status") != "success":
+                    logger.info(f"模型拉取状态: {pull_result.get('status')}")
+                    await asyncio.sleep(3)
+                    async with session.post(f"{self.base_url}/api/pull", json=pull_data) as response:
+                        pull_result = await response.json()
                     
-                    logger.info(f"模型 {model} 拉取成功")
-                    return
-            except Exception as e:
-                raise Exception(f"拉取模型失败: {str(e)}")
+                logger.info(f"模型 {model} 拉取成功")
+                return
+        except Exception as e:
+            raise Exception(f"拉取模型失败: {str(e)}")
+
+    async def preload_model(self, model: str, keep_alive="30m"):
+        """
+        预加载模型到显存，不带 prompt 的 generate 请求只加载模型
+        
+        Args:
+            model: 模型名称
+            keep_alive: 模型在显存中的保留时间，如 "30m"，0 表示立即卸载
+            
+        Raises:
+            Exception: 当请求失败时抛出异常
+        """
+        session = get_session()
+        async with session.post(f"{self.base_url}/api/generate", json={"model": model, "keep_alive": keep_alive}) as response:
+            if response.status != 200:
+                raise Exception(f"加载模型失败，状态码：{response.status}")
+            await response.read()
+
+    async def unload_model(self, model: str):
+        """
+        从显存中卸载模型
+        
+        Args:
+            model: 模型名称
+        """
+        await self.preload_model(model, keep_alive=0)
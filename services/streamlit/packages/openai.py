@@ -1,9 +1,30 @@
 import asyncio
 import json
+import time
 import aiohttp
+from .session import get_session
+from .llm_cache import completion_cache
+from .rate_limit import rate_limiter, estimate_tokens
+from .concurrency import get_limiter
+from .router import endpoint_router, Endpoint
+
+
+class RateLimitedError(Exception):
+    """接口返回 429 时抛出，等待由限流器负责"""
+    pass
+
+
+class ServerError(Exception):
+    """接口返回 5xx 时抛出"""
+    pass
+
+
+class ValidationFailedError(Exception):
+    """回复未通过 validator_callback 校验，且已达到校验失败的重试上限时抛出"""
+    pass
 
 class OpenAIHandler:
-    def __init__(self, model: str, openai_url: str, openai_key: str, max_retries: int = 5, use_ollama: bool = True, retry_delay: float = 1.0):
+    def __init__(self, model: str, openai_url: str, openai_key: str, max_retries: int = 5, use_ollama: bool = True, retry_delay: float = 1.0, rpm: int = None, tpm: int = None, endpoints: list = None):
         """
         初始化 OpenAIHandler
         
@@ -13,6 +34,10 @@ class OpenAIHandler:
             openai_key: OpenAI API 密钥
             max_retries: 最大重试次数，默认5次
             retry_delay: 初始重试延迟(秒)，默认1秒
+            rpm: 每分钟请求数上限，默认按接口地址使用供应商配置，0 表示不限制
+            tpm: 每分钟 token 数上限，默认按接口地址使用供应商配置，0 表示不限制
+            endpoints: 额外的 OpenAI 兼容接口列表，每项包含 openai_url、openai_key 和可选的 model，
+                与 openai_url 组成接口池，按最少在途请求和延迟路由，失败时自动切换
         """
         self.model = model
         self.openai_url = openai_url
@@ -20,6 +45,12 @@ class OpenAIHandler:
         self.use_ollama = use_ollama
         self.max_retries = max_retries
         self.retry_delay = retry_delay
+        self.endpoints = endpoints or []
+        self._pool = [endpoint_router.endpoint(openai_url, openai_key, rpm=rpm, tpm=tpm)] + [
+            endpoint_router.endpoint(e["openai_url"], e.get("openai_key", ""), e.get("model"), e.get("rpm"), e.get("tpm"))
+            for e in self.endpoints
+        ]
+
     def get_config(self) -> dict:
         """
         获取当前配置
@@ -32,9 +63,100 @@ class OpenAIHandler:
             "openai_url": self.openai_url,
             "openai_key": self.openai_key,
             "use_ollama": self.use_ollama,
+            "endpoints": self.endpoints,
+        }
+
+    async def _post(self, endpoint: Endpoint, data: dict) -> dict:
+        """
+        在限流配额内向指定接口发送一次请求
+        
+        Args:
+            endpoint: 接口
+            data: 请求体，model 为空的接口使用请求体中的模型
+            
+        Returns:
+            dict: 响应 JSON
+            
+        Raises:
+            RateLimitedError: 当接口返回 429 时抛出，Retry-After 已同步给限流器
+        """
+        url = f"{endpoint.openai_url}/v1/chat/completions"
+        headers = {
+            "Authorization": f"Bearer {endpoint.openai_key}",
+            "Content-Type": "application/json"
         }
+        if endpoint.model:
+            data = {**data, "model": endpoint.model}
+        
+        estimated = estimate_tokens(data["messages"])
+        # 按接口地址自适应控制在途请求数
+        limiter = get_limiter(endpoint.openai_url)
+        async with limiter.slot():
+            await rate_limiter.acquire(endpoint.limiter_key, endpoint.rpm, endpoint.tpm, estimated)
+            
+            start = time.monotonic()
+            session = get_session()
+            try:
+                async with session.post(url, headers=headers, json=data, timeout=60) as response:
+                    if response.status == 429:
+                        # 让所有共享该密钥的进程一起退避
+                        await asyncio.to_thread(rate_limiter.block, endpoint.limiter_key, float(response.headers.get('Retry-After', self.retry_delay)))
+                        raise RateLimitedError(f"OpenAI API限流: {await response.text()}")
+                    if response.status >= 500:
+                        raise ServerError(f"OpenAI API服务端错误，状态码: {response.status}")
+                    result = await response.json()
+            except (RateLimitedError, ServerError, asyncio.TimeoutError):
+                # 过载信号，并发上限减半
+                limiter.on_failure()
+                raise
+            limiter.on_success(time.monotonic() - start)
+        
+        usage = result.get("usage") or {}
+        if usage.get("total_tokens"):
+            await asyncio.to_thread(rate_limiter.adjust_tokens, endpoint.limiter_key, endpoint.tpm, usage["total_tokens"] - estimated)
+        return result
 
-    async def request(self, messages: list, model: str = None, temp: float = 0.7, validator_callback=None) -> str:
+    def _served_model(self, model: str) -> str:
+        """
+        计算缓存 key 使用的模型，接口池中的接口可能指定了其他模型，按实际可能提供服务的模型区分缓存
+
+        Args:
+            model: 请求的模型名称
+
+        Returns:
+            str: 接口池只有一个模型时为该模型，否则为排序后的模型列表
+        """
+        models = sorted({endpoint.model or model for endpoint in self._pool})
+        return models[0] if len(models) == 1 else "|".join(models)
+
+    async def _route(self, data: dict, failed: list) -> dict:
+        """
+        从接口池中选择一个接口发送请求，失败的接口记入 failed，下次重试时优先切换到其他接口
+        
+        Args:
+            data: 请求体
+            failed: 本次请求已失败的接口列表
+            
+        Returns:
+            dict: 响应 JSON
+        """
+        endpoint = endpoint_router.acquire(self._pool, exclude=tuple(failed))
+        start = time.monotonic()
+        try:
+            result = await self._post(endpoint, data)
+            if "error" in result:
+                raise Exception(f"OpenAI API错误: {result['error']}")
+        except asyncio.CancelledError:
+            endpoint_router.release(endpoint)
+            raise
+        except Exception:
+            endpoint_router.on_failure(endpoint)
+            failed.append(endpoint)
+            raise
+        endpoint_router.on_success(endpoint, time.monotonic() - start)
+        return result
+
+    async def request(self, messages: list, model: str = None, temp: float = 0.7, validator_callback=None, max_retries: int = None, use_cache: bool = True, validation_retries: int = None) -> str:
         """
         异步发送请求到OpenAI API
         
@@ -43,6 +165,9 @@ class OpenAIHandler:
             model: 模型名称,默认使用初始化时设置的模型
             temp: 温度参数,控制随机性,默认0.7
             validator_callback: 可选的验证回调函数 (对响应内容进行验证)
+            max_retries: 本次请求的最大重试次数,默认使用初始化时的设置
+            use_cache: 是否使用持久化缓存,相同请求直接返回缓存的回复
+            validation_retries: 校验失败时的最大尝试次数,默认与 max_retries 相同,网络错误、限流和服务端错误不计入
             
         Returns:
             str: OpenAI的响应文本
@@ -50,14 +175,8 @@ class OpenAIHandler:
         Raises:
             Exception: 当API调用失败或验证失败时抛出异常
         """
-        url = f"{self.openai_url}/v1/chat/completions"
         model = model or self.model
         
-        headers = {
-            "Authorization": f"Bearer {self.openai_key}",
-            "Content-Type": "application/json"
-        }
-        
         data = {
             "model": model,
             "messages": messages,
@@ -65,30 +184,55 @@ class OpenAIHandler:
         }
         
         retry_delay = self.retry_delay
+        # 至少请求一次
+        max_retries = max(self.max_retries if max_retries is None else max_retries, 1)
+        validation_retries = max_retries if validation_retries is None else max(validation_retries, 1)
+        validation_failures = 0
         
-        async with aiohttp.ClientSession() as session:
-            for attempt in range(self.max_retries):
-                try:
-                    async with session.post(url, headers=headers, json=data, timeout=60) as response:
-                        result = await response.json()
-
-                        if "error" in result:
-                            raise Exception(f"OpenAI API错误: {result['error']}")
+        # 优先使用缓存，缓存内容未通过验证时重新请求
+        cache_key = completion_cache.make_key(self._served_model(model), messages, temp) if use_cache else None
+        # 缓存文件由多个进程共享，等待 SQLite 锁时不阻塞事件循环
+        cached = await asyncio.to_thread(completion_cache.get, cache_key) if cache_key else None
+        if cached is not None:
+            try:
+                if validator_callback:
+                    validator_callback(cached)
+                return cached
+            except Exception:
+                pass
+        
+        failed = []
+        for attempt in range(max_retries):
+            failed_before = len(failed)
+            try:
+                result = await self._route(data, failed)
 
-                        content = result["choices"][0]["message"]["content"]
+                content = result["choices"][0]["message"]["content"]
 
-                        if validator_callback:
-                            validator_callback(content)
+                if validator_callback:
+                    try:
+                        validator_callback(content)
+                    except Exception as e:
+                        raise ValidationFailedError(str(e)) from e
 
-                        return content
+                if cache_key:
+                    await asyncio.to_thread(completion_cache.set, cache_key, content)
+                return content
 
-                except Exception as e:
-                    print(f"openai request 第 {attempt + 1} 次重试，错误信息: {str(e)}")
-                    if attempt == self.max_retries - 1:  # 最后一次重试
-                        raise Exception(f"请求OpenAI失败(重试{self.max_retries}次): {str(e)}")
+            except Exception as e:
+                print(f"openai request 第 {attempt + 1} 次重试，错误信息: {str(e)}")
+                if isinstance(e, ValidationFailedError):
+                    validation_failures += 1
+                    if validation_failures >= validation_retries:
+                        raise ValidationFailedError(f"请求OpenAI失败(校验失败{validation_failures}次): {str(e)}") from e
+                if attempt == max_retries - 1:  # 最后一次重试
+                    raise Exception(f"请求OpenAI失败(重试{max_retries}次): {str(e)}")
+                # 限流时由限流器按 Retry-After 等待，接口失败且还有其他接口可用时直接切换
+                failover = len(failed) > failed_before and len(set(failed)) < len(self._pool)
+                if not isinstance(e, RateLimitedError) and not failover:
                     await asyncio.sleep(retry_delay)
 
-    async def request_json(self, messages: list, model: str = None, temp: float = 0.7, validator_callback=None) -> dict:
+    async def request_json(self, messages: list, model: str = None, temp: float = 0.7, validator_callback=None, max_retries: int = None, use_cache: bool = True, validation_retries: int = None) -> dict:
         """
         异步发送JSON模式的请求到OpenAI API
         
@@ -97,6 +241,9 @@ class OpenAIHandler:
             model: 模型名称,默认使用初始化时设置的模型
             temp: 温度参数,控制随机性,默认0.7
             validator_callback: 可选的JSON验证回调函数
+            max_retries: 本次请求的最大重试次数,默认使用初始化时的设置
+            use_cache: 是否使用持久化缓存,相同请求直接返回缓存的回复
+            validation_retries: 校验失败时的最大尝试次数,默认与 max_retries 相同,网络错误、限流和服务端错误不计入
             
         Returns:
             dict: OpenAI的JSON响应
@@ -104,14 +251,8 @@ class OpenAIHandler:
         Raises:
             Exception: 当API调用失败或JSON验证失败时抛出异常
         """
-        url = f"{self.openai_url}/v1/chat/completions"
         model = model or self.model
         
-        headers = {
-            "Authorization": f"Bearer {self.openai_key}",
-            "Content-Type": "application/json"
-        }
-        
         data = {
             "model": model,
             "messages": messages,
@@ -120,31 +261,57 @@ class OpenAIHandler:
         }
         
         retry_delay = self.retry_delay
+        # 至少请求一次
+        max_retries = max(self.max_retries if max_retries is None else max_retries, 1)
+        validation_retries = max_retries if validation_retries is None else max(validation_retries, 1)
+        validation_failures = 0
         
-        async with aiohttp.ClientSession() as session:
-            for attempt in range(self.max_retries):
-                try:
-                    async with session.post(url, headers=headers, json=data, timeout=60) as response:
-                        result = await response.json()
+        # 优先使用缓存，缓存内容未通过验证时重新请求
+        cache_key = completion_cache.make_key(self._served_model(model), messages, temp, data["response_format"]) if use_cache else None
+        # 缓存文件由多个进程共享，等待 SQLite 锁时不阻塞事件循环
+        cached = await asyncio.to_thread(completion_cache.get, cache_key) if cache_key else None
+        if cached is not None:
+            try:
+                json_response = json.loads(cached)
+                if validator_callback:
+                    validator_callback(json_response)
+                return json_response
+            except Exception:
+                pass
+        
+        failed = []
+        for attempt in range(max_retries):
+            failed_before = len(failed)
+            try:
+                result = await self._route(data, failed)
 
-                        if "error" in result:
-                            raise Exception(f"OpenAI API错误: {result['error']}")
+                json_response_str = result["choices"][0]["message"]["content"]
 
-                        json_response_str = result["choices"][0]["message"]["content"]
+                try:
+                    json_response = json.loads(json_response_str)
 
+                    # 如果提供了验证回调,则进行验证
+                    if validator_callback:
                         try:
-                            json_response = json.loads(json_response_str)
-
-                            # 如果提供了验证回调,则进行验证
-                            if validator_callback:
-                                validator_callback(json_response)
+                            validator_callback(json_response)
+                        except Exception as e:
+                            raise ValidationFailedError(str(e)) from e
 
-                            return json_response
-                        except json.JSONDecodeError as e:
-                            raise Exception(f"解析 OpenAI JSON 响应失败: {str(e)}: {json_response_str}")
+                    if cache_key:
+                        await asyncio.to_thread(completion_cache.set, cache_key, json_response_str)
+                    return json_response
+                except json.JSONDecodeError as e:
+                    raise Exception(f"解析 OpenAI JSON 响应失败: {str(e)}: {json_response_str}")
 
-                except Exception as e:
-                    print(f"openai json request 第 {attempt + 1} 次重试，错误信息: {str(e)}")
-                    if attempt == self.max_retries - 1:  # 最后一次重试
-                        raise Exception(f"请求OpenAI JSON失败(重试{self.max_retries}次): {str(e)}")
+            except Exception as e:
+                print(f"openai json request 第 {attempt + 1} 次重试，错误信息: {str(e)}")
+                if isinstance(e, ValidationFailedError):
+                    validation_failures += 1
+                    if validation_failures >= validation_retries:
+                        raise ValidationFailedError(f"请求OpenAI JSON失败(校验失败{validation_failures}次): {str(e)}") from e
+                if attempt == max_retries - 1:  # 最后一次重试
+                    raise Exception(f"请求OpenAI JSON失败(重试{max_retries}次): {str(e)}")
+                # 限流时由限流器按 Retry-After 等待，接口失败且还有其他接口可用时直接切换
+                failover = len(failed) > failed_before and len(set(failed)) < len(self._pool)
+                if not isinstance(e, RateLimitedError) and not failover:
                     await asyncio.sleep(retry_delay)
@@ -0,0 +1,157 @@
+import asyncio
+import time
+from typing import Callable, List, Optional
+
+# 阶段 worker 结束的标记
+_DONE = object()
+
+
+class StageStats:
+    """单个阶段的运行统计"""
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.max_queue_depth = 0
+
+
+class Pipeline:
+    """
+    多文件流水线执行器
+
+    各阶段之间通过有界队列连接，每个阶段有独立的 worker 数，
+    第 N 个文件在做大模型处理时，第 N+1 个文件可以同时进行语音识别。
+    队列有界，阶段处理不过来时上游会等待，内存中的文件数不会无限增长
+    """
+    def __init__(self, stages: list, queue_size: int = 2):
+        """
+        Args:
+            stages: (阶段名称, worker 数, 协程函数) 列表，协程函数接收并原地修改 item 字典
+            queue_size: 阶段之间队列的容量
+        """
+        self.stages = stages
+        self.queue_size = queue_size
+        self._stats = {name: StageStats(max(workers, 1)) for name, workers, _ in stages}
+        self._queues = []
+        self._on_stage = None
+        self._start = None
+        self._end = None
+
+    async def _worker(self, name: str, func: Callable, inbox: asyncio.Queue, outbox: asyncio.Queue):
+        stats = self._stats[name]
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                return
+            stats.max_queue_depth = max(stats.max_queue_depth, inbox.qsize() + 1)
+            # 前面阶段失败的文件直接传给下游，由调用方统一处理
+            if "error" not in item:
+                item.setdefault("started_at", time.time())
+                if self._on_stage:
+                    self._on_stage(item, name)
+                stage_start = time.monotonic()
+                try:
+                    await func(item)
+                    stats.processed += 1
+                except Exception as e:
+                    item["error"] = e
+                    item["failed_stage"] = name
+                    stats.failed += 1
+                seconds = time.monotonic() - stage_start
+                item.setdefault("stage_seconds", {})[name] = round(seconds, 2)
+                stats.busy_seconds += seconds
+            await outbox.put(item)
+
+    async def _run_stage(self, index: int):
+        name, _, func = self.stages[index]
+        workers = self._stats[name].workers
+        inbox, outbox = self._queues[index], self._queues[index + 1]
+        await asyncio.gather(*[self._worker(name, func, inbox, outbox) for _ in range(workers)])
+        # 本阶段结束后通知下游的每个 worker
+        if index + 1 < len(self.stages):
+            for _ in range(self._stats[self.stages[index + 1][0]].workers):
+                await outbox.put(_DONE)
+        else:
+            await outbox.put(_DONE)
+
+    async def run(self, items, on_done: Optional[Callable] = None, on_stage: Optional[Callable] = None) -> List[dict]:
+        """
+        处理所有 item
+
+        Args:
+            items: 待处理的 item 列表，也可以是异步迭代器，上游队列有空位时才取下一个
+            on_done: 可选回调，每个 item 离开最后一个阶段时调用。item 中 started_at 为开始处理的时间戳，
+                stage_seconds 为各阶段耗时，失败的 item 包含 error 和 failed_stage 字段
+            on_stage: 可选回调，item 开始进入每个阶段时以 (item, 阶段名称) 调用
+
+        Returns:
+            list: 处理后的 item，顺序与输入一致
+        """
+        self._start = time.monotonic()
+        self._end = None
+        self._on_stage = on_stage
+        # 最后一个队列收集完成的 item，不限容量
+        self._queues = [asyncio.Queue(maxsize=self.queue_size) for _ in self.stages] + [asyncio.Queue()]
+
+        fed = []
+
+        async def feed():
+            if hasattr(items, "__aiter__"):
+                async for item in items:
+                    fed.append(item)
+                    await self._queues[0].put(item)
+            else:
+                for item in items:
+                    fed.append(item)
+                    await self._queues[0].put(item)
+            for _ in range(self._stats[self.stages[0][0]].workers):
+                await self._queues[0].put(_DONE)
+
+        async def collect():
+            while True:
+                item = await self._queues[-1].get()
+                if item is _DONE:
+                    return
+                if on_done:
+                    on_done(item)
+
+        tasks = [asyncio.ensure_future(feed()), asyncio.ensure_future(collect())]
+        tasks += [asyncio.ensure_future(self._run_stage(i)) for i in range(len(self.stages))]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            self._end = time.monotonic()
+        return fed
+
+    def stats(self) -> dict:
+        """
+        获取各阶段的运行统计
+
+        Returns:
+            dict: 阶段名称 -> 包含 worker 数、处理数、失败数、忙碌时间、吞吐量（个/分钟）、利用率和队列深度的字典
+        """
+        if self._start is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self._end or time.monotonic()) - self._start
+        result = {}
+        for index, (name, _, _) in enumerate(self.stages):
+            stats = self._stats[name]
+            queue = self._queues[index] if self._queues else None
+            result[name] = {
+                "workers": stats.workers,
+                "processed": stats.processed,
+                "failed": stats.failed,
+                "busy_seconds": round(stats.busy_seconds, 2),
+                "throughput_per_minute": round(stats.processed * 60 / elapsed, 2) if elapsed else 0.0,
+                "utilization": round(stats.busy_seconds / (elapsed * stats.workers), 3) if elapsed else 0.0,
+                "queue_depth": queue.qsize() if queue else 0,
+                "max_queue_depth": stats.max_queue_depth,
+            }
+        return result
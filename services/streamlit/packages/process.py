@@ -2,157 +2,418 @@ from functools import partial
 import numpy as np
 import os
 import json
+import hashlib
 import tempfile
+import shutil
 import logging
 import re
 import asyncio
 from io import BytesIO
 from datetime import datetime
-from packages.audio import convert_to_wav, enhance_audio, speech_to_text, format_speech_results, remove_trailing_punctuation_list, generate_srt, generate_lrc
+from config import global_config
+from packages.audio import convert_to_wav, enhance_audio, speech_to_text_sharded, get_input_sample_rate, format_speech_results, remove_trailing_punctuation_list, generate_srt, generate_lrc
 from packages.text import TextCorrector, TitleGenerator
 from packages.translate import OpenAITranslator
 from packages.openai import OpenAIHandler
-import uuid
+from packages.ollama import OllamaHandler
+from packages.pipeline import Pipeline
+from packages.jobs import job_store, start_job_workers
+from packages.artifacts import artifact_store, artifact_key
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def create_openai_handler(openai_config: dict) -> OpenAIHandler:
+    """根据阶段配置中的 openai 字段创建 OpenAIHandler"""
+    return OpenAIHandler(
+        model=openai_config["model"],
+        use_ollama=openai_config["use_ollama"],
+        openai_url=openai_config["openai_url"],
+        openai_key=openai_config["openai_key"],
+        endpoints=openai_config.get("endpoints")
+    )
+
+def _openai_identity(openai_config: dict) -> list:
+    # 同一模型在不同接口上的输出视为相同，产物 key 只包含实际可能提供服务的模型；
+    # 备用接口指定了其他模型时一并计入，接口池只有一个模型时与单接口的 key 相同
+    model = openai_config["model"]
+    models = sorted({model} | {endpoint.get("model") or model for endpoint in openai_config.get("endpoints") or []})
+    return [model if len(models) == 1 else models, bool(openai_config.get("use_ollama"))]
+
+def stage_keys(item: dict, config: dict) -> dict:
+    """
+    计算各阶段产物的 key，每个阶段的 key 由上游阶段的 key 和影响本阶段输出的配置组成
+    
+    修改某个阶段的配置只会使该阶段及其下游失效，例如修改翻译语言时复用已有的识别和矫正结果
+    """
+    keys = {"decode": artifact_key("decode", item["audio_hash"], item["enhance_rate"])}
+    audio_key = keys["decode"]
+    if config.get("remove_background", False):
+        keys["enhance"] = artifact_key("enhance", audio_key, config.get("enhance_model", "MossFormer2_SE_48K"), item["asr_rate"])
+        audio_key = keys["enhance"]
+    hotwords = config.get("subtitle", {}).get("hotwords", "")
+    keys["asr"] = artifact_key("asr", audio_key, hotwords, global_config.asr_shard_minutes)
+    if config.get("correct"):
+        correct = config["correct"]
+        keys["correct"] = artifact_key("correct", keys["asr"], _openai_identity(correct["openai"]), correct.get("common_errors", []))
+    if config.get("title"):
+        title = config["title"]
+        source_key = keys["asr"] if stage_source(config, "title") == "raw_lines" else keys["correct"]
+        keys["title"] = artifact_key("title", source_key, _openai_identity(title["openai"]) if title.get("openai") else None,
+                                     title.get("book_title", ""), title.get("author", ""), title.get("lang", ""))
+    if config.get("translate"):
+        translate = config["translate"]
+        source_key = keys["asr"] if stage_source(config, "translate") == "raw_lines" else keys["correct"]
+        keys["translate"] = artifact_key("translate", source_key, _openai_identity(translate["openai"]), translate["from"], translate["to"])
+    return keys
+
+async def decode_audio(item: dict, config: dict):
+    """按第一个下游服务期望的采样率转换音频格式，结果写入 item["wav_audio"]，下游产物已存在时跳过"""
+    # 获取文件名和扩展名
+    audio_file = item["audio_file"]
+    item["base_name"], item["ext"] = os.path.splitext(audio_file.name)
+    item["translated_lines"] = None
+    item["title"] = "未生成"
+    
+    # 按第一个下游服务期望的采样率转换，避免传输多余数据和服务端重复重采样
+    convert_start = datetime.now()
+    remove_background = config.get("remove_background", False)
+    enhance_model = config.get("enhance_model", "MossFormer2_SE_48K")
+    item["asr_rate"] = await get_input_sample_rate(global_config.funasr_url)
+    item["enhance_rate"] = await get_input_sample_rate(global_config.clear_voice_url, enhance_model) if remove_background else item["asr_rate"]
+    item["audio_hash"] = await asyncio.to_thread(_hash_audio_file, audio_file)
+    item["keys"] = stage_keys(item, config)
+    
+    keys = item["keys"]
+    if artifact_store.exists(keys["asr"]) or ("enhance" in keys and artifact_store.exists(keys["enhance"])):
+        logger.info("下游阶段产物已存在，跳过音频格式转换")
+        return
+    item["wav_audio"] = await _decoded_audio(item)
+    logger.info(f"音频格式转换完成，耗时 {(datetime.now() - convert_start).total_seconds():.2f} 秒")
+
+def _hash_audio_file(audio_file) -> str:
+    # 磁盘上的文件逐块计算，不把整个音频读入内存
+    path = getattr(audio_file, 'path', None)
+    if path is None:
+        return hashlib.sha256(audio_file.body).hexdigest()
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(partial(f.read, 1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+async def _decoded_audio(item: dict) -> bytes:
+    async def compute():
+        audio_file = item["audio_file"]
+        path = getattr(audio_file, 'path', None)
+        if path is not None:
+            return await convert_to_wav(None, sample_rate=item["enhance_rate"], input_path=path)
+        return await convert_to_wav(audio_file.body, sample_rate=item["enhance_rate"])
+    return await artifact_store.get_or_compute(item["keys"]["decode"], compute)
+
+def _use_path(item: dict) -> bool:
+    # 离线任务的音频位于共享数据卷上，通过路径交给 FunASR / ClearVoice，避免经 HTTP 传输
+    return getattr(item["audio_file"], 'path', None) is not None
+
+async def _enhanced_audio(item: dict, config: dict) -> bytes:
+    # 上游阶段因产物已存在而跳过时，产物可能已被淘汰，此时按需重新计算上游
+    if "enhance" not in item["keys"]:
+        return item.pop("wav_audio", None) or await _decoded_audio(item)
+
+    async def compute():
+        wav_audio = item.pop("wav_audio", None) or await _decoded_audio(item)
+        enhance_model = config.get("enhance_model", "MossFormer2_SE_48K")
+        wav_audio = await enhance_audio(wav_audio, model_name=enhance_model, use_path=_use_path(item))
+        # 增强模型与识别模型采样率不同时再转换一次
+        if item["enhance_rate"] != item["asr_rate"]:
+            wav_audio = await convert_to_wav(wav_audio, sample_rate=item["asr_rate"])
+        return wav_audio
+    return await artifact_store.get_or_compute(item["keys"]["enhance"], compute)
+
+async def enhance_item(item: dict, config: dict):
+    """背景音移除，未启用或识别结果已存在时不做处理"""
+    if "enhance" not in item["keys"] or artifact_store.exists(item["keys"]["asr"]):
+        return
+    logger.info("正在进行背景音移除")
+    enhance_start = datetime.now()
+    item["wav_audio"] = await _enhanced_audio(item, config)
+    logger.info(f"背景音移除完成，耗时 {(datetime.now() - enhance_start).total_seconds():.2f} 秒")
+
+async def recognize_speech(item: dict, config: dict):
+    """语音转文字，完成后释放 item["wav_audio"]"""
+    stt_start = datetime.now()
+    hotwords = config.get("subtitle", {}).get("hotwords", "")
+
+    async def compute():
+        return await speech_to_text_sharded(await _enhanced_audio(item, config), hotwords=hotwords, use_path=_use_path(item))
+    results = await artifact_store.get_or_compute(item["keys"]["asr"], compute, encoding="json")
+    item.pop("wav_audio", None)
+    subtitles = format_speech_results(results)
+    item["subtitles"] = subtitles
+    item["text_lines"] = [s['text'] for s in subtitles]
+    # 未经矫正的识别结果，不依赖矫正的阶段读取这里，结果与各阶段完成的先后无关
+    item["raw_lines"] = [s['text'] for s in subtitles]
+    logger.info(f"语音转文字完成，耗时 {(datetime.now() - stt_start).total_seconds():.2f} 秒")
+
+async def transcribe_audio(index, audio_file, config, item: dict = None, on_stage=None) -> dict:
+    """
+    音频格式转换、背景音移除和语音转文字
+    
+    参数:
+        item: 可选的初始状态，例如包含 on_progress 回调，原地更新后返回
+        on_stage: 可选回调，开始每个阶段时以 (item, 阶段名称) 调用
+    
+    返回:
+        dict: 单个文件的处理状态，后续阶段在其上读写 text_lines、base_name 等字段
+    """
+    item = item if item is not None else {}
+    item.update(index=index, audio_file=audio_file)
+    for stage, func in (("decode", decode_audio), ("enhance", enhance_item), ("asr", recognize_speech)):
+        if on_stage:
+            on_stage(item, stage)
+        await func(item, config)
+    return item
+
+def stage_source(config: dict, stage: str) -> str:
+    """
+    阶段的输入文本：矫正后的 text_lines 或未经矫正的 raw_lines
+    
+    默认等待矫正完成后使用矫正后的文本；配置 "source": "raw" 时使用识别原文，与矫正并行
+    """
+    source = config[stage].get("source", "corrected")
+    if source == "raw" or not config.get("correct"):
+        return "raw_lines"
+    return "text_lines"
+
+def _report_progress(item: dict, stage: str, done: int, total: int):
+    # 大模型阶段的批次进度（已完成批次数, 总批次数），供调用方展示，item 中的 on_progress 回调可以接收更新
+    item.setdefault("progress", {})[stage] = (done, total)
+    if item.get("on_progress"):
+        item["on_progress"](item["progress"])
+
+async def correct_text(item: dict, config: dict):
+    """文本矫正，结果写回 item["text_lines"]"""
+    logger.info("正在进行文本矫正")
+    correct_start = datetime.now()
+
+    async def compute():
+        openai_handler = create_openai_handler(config["correct"]["openai"])
+        corrector = TextCorrector(openai_handler, concurrency=config["correct"].get("concurrency", 4))
+        common_errors = config["correct"].get("common_errors", [])
+        return remove_trailing_punctuation_list(await corrector.fix_text(
+            item["text_lines"], common_errors, journal=journal, on_progress=partial(_report_progress, item, "correct")
+        ))
+    journal = artifact_store.journal(item["keys"]["correct"])
+    item["text_lines"] = await artifact_store.get_or_compute(item["keys"]["correct"], compute, encoding="json")
+    await asyncio.to_thread(journal.remove)
+    logger.info(f"文本矫正完成，耗时 {(datetime.now() - correct_start).total_seconds():.2f} 秒")
+
+async def generate_file_title(item: dict, config: dict):
+    """标题生成，并按规则更新 item["base_name"]"""
+    logger.info("正在进行标题生成")
+    title_start = datetime.now()
+
+    async def compute():
+        openai_handler = create_openai_handler(config["title"]["openai"])
+        title_generator = TitleGenerator(
+            openai_handler,
+            config["title"].get("book_title", ""),
+            config["title"].get("author", ""),
+            config["title"].get("lang", "")
+        )
+        return await title_generator.generate_title("\n".join(item[stage_source(config, "title")]))
+    title = await artifact_store.get_or_compute(item["keys"]["title"], compute, encoding="json")
+    
+    # 应用标题生成规则
+    base_name = item["base_name"]
+    regex_origin = config["title"].get("regex_origin", "(\\d*)")
+    match = re.search(regex_origin, base_name)
+    groups = match.groups() if match else []
+    # {origin}_{index}_{title}_{book_title}_{author}_{0/1/2/...}，中 origin 表示原始音频名称，index 是索引+1，title 是新生成的 title（如果不需要生成标题则为空），book_title 是书名，author 是作者，{0/1/2/...} 是 regex_origin 中提取的数据，regex_origin 是从原始文件名中提取数据的正则表达式
+    rule = config["title"].get("rule", "{origin}")
+    item["base_name"] = rule.format(
+        origin=base_name,
+        index=str(item["index"]+1).zfill(3),
+        title=title,
+        book_title=config["title"].get("book_title", ""),
+        author=config["title"].get("author", ""),
+        *groups
+    )
+    item["title"] = title
+    logger.info(f"标题生成完成，耗时 {(datetime.now() - title_start).total_seconds():.2f} 秒")
+
+async def translate_text(item: dict, config: dict):
+    """多语言翻译，译文写入 item["translated_lines"]"""
+    logger.info("正在进行多语言翻译")
+    translate_start = datetime.now()
+    translator = None
+
+    async def compute():
+        nonlocal translator
+        openai_handler = create_openai_handler(config["translate"]["openai"])
+        translator = OpenAITranslator(openai_handler, max_batch_size=config["translate"].get("max_batch_size", 32))
+        from_lang = config["translate"]["from"]
+        to_lang = config["translate"]["to"]
+        return remove_trailing_punctuation_list(await translator.translate(
+            from_lang, to_lang, item[stage_source(config, "translate")], journal=journal, on_progress=partial(_report_progress, item, "translate")
+        ))
+    journal = artifact_store.journal(item["keys"]["translate"])
+    item["translated_lines"] = await artifact_store.get_or_compute(item["keys"]["translate"], compute, encoding="json")
+    await asyncio.to_thread(journal.remove)
+    if translator is None:
+        logger.info(f"多语言翻译复用已有结果，耗时 {(datetime.now() - translate_start).total_seconds():.2f} 秒")
+    else:
+        logger.info(f"多语言翻译完成，翻译记忆与去重命中率 {translator.last_stats['hit_ratio']:.1%}，耗时 {(datetime.now() - translate_start).total_seconds():.2f} 秒")
+
+def save_results(item: dict, config: dict, temp_dir: str) -> str:
+    """
+    生成并保存字幕文件，需要时保存原始音频，包含大文件复制等阻塞 IO，异步代码中通过 asyncio.to_thread 调用
+    
+    返回:
+        str: 音频文件路径
+    """
+    # 生成SRT和LRC文件
+    srt_start = datetime.now()
+    text_lines = item["text_lines"]
+    if item["translated_lines"] is not None:
+        text_lines = [f"{orig}\n{trans}" for orig, trans in zip(text_lines, item["translated_lines"])]
+    # 将处理后的文本更新到字幕信息中
+    subtitles = item["subtitles"]
+    for i, sub in enumerate(subtitles):
+        sub['text'] = text_lines[i]
+    # 生成SRT内容
+    srt_content = generate_srt(subtitles)
+    # 生成LRC内容
+    lrc_content = generate_lrc(subtitles)
+    logger.info(f"字幕文件生成完成，耗时 {(datetime.now() - srt_start).total_seconds():.2f} 秒")
+
+    # 保存文件
+    save_start = datetime.now()
+    base_name, ext = item["base_name"], item["ext"]
+    audio_path = os.path.join(temp_dir, f"{base_name}{ext}")  # 使用原始文件扩展名
+    srt_path = os.path.join(temp_dir, f"{base_name}.srt")
+    lrc_path = os.path.join(temp_dir, f"{base_name}.lrc")
+    
+    # 处理文件名冲突
+    counter = 1
+    while os.path.exists(audio_path):
+        audio_path = os.path.join(temp_dir, f"{base_name}-{counter}{ext}")
+        srt_path = os.path.join(temp_dir, f"{base_name}-{counter}.srt")
+        lrc_path = os.path.join(temp_dir, f"{base_name}-{counter}.lrc")
+        counter += 1
+    
+    # 只有当不跳过标题重命名时才保存音频文件
+    if not config.get("title", {}).get("skip_rename", False):
+        # 保存原始音频文件，磁盘上的文件直接复制
+        source_path = getattr(item["audio_file"], 'path', None)
+        if source_path is not None:
+            shutil.copyfile(source_path, audio_path)
+        else:
+            with open(audio_path, "wb") as f:
+                f.write(item["audio_file"].body)
+        logger.info(f"音频文件保存完成")
+    
+    with open(srt_path, "w", encoding="utf-8") as f:
+        f.write(srt_content)
+    with open(lrc_path, "w", encoding="utf-8") as f:
+        f.write(lrc_content)
+    logger.info(f"字幕文件保存完成，耗时 {(datetime.now() - save_start).total_seconds():.2f} 秒")
+    return audio_path
+
+# 大模型阶段，按单文件处理时的执行顺序排列
+LLM_STAGES = [
+    ("correct", correct_text),
+    ("title", generate_file_title),
+    ("translate", translate_text),
+]
+
+def enabled_llm_stages(config: dict) -> list:
+    """返回配置中启用的大模型阶段名称"""
+    enabled = {
+        "correct": bool(config.get("correct")),
+        "title": config.get("title", {}).get("generate", False) and not config.get("title", {}).get("skip_rename", False),
+        "translate": bool(config.get("translate")),
+    }
+    return [name for name, _ in LLM_STAGES if enabled[name]]
+
+async def run_stage_graph(graph: dict) -> dict:
+    """
+    按依赖关系执行阶段图，依赖全部完成的阶段立即开始，互不依赖的阶段并发执行
+    
+    参数:
+        graph: 阶段名称 -> (依赖的阶段名称列表, 无参数的协程函数)
+        
+    返回:
+        dict: 阶段名称 -> 耗时（秒），不含等待依赖的时间
+    """
+    timings = {}
+    tasks = {}
+
+    async def run(name):
+        deps, func = graph[name]
+        await asyncio.gather(*[tasks[dep] for dep in deps])
+        node_start = datetime.now()
+        await func()
+        timings[name] = (datetime.now() - node_start).total_seconds()
+
+    for name in graph:
+        tasks[name] = asyncio.ensure_future(run(name))
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        # 任一阶段失败时取消其余阶段
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+    return timings
+
+def build_llm_stage_graph(item: dict, config: dict, deps: list = None) -> dict:
+    """
+    构建大模型阶段图：矫正 / 标题 / 翻译，标题和翻译只有在读取矫正后文本时才依赖矫正，见 stage_source
+    
+    参数:
+        deps: 所有大模型阶段额外依赖的阶段
+    """
+    graph = {}
+    stages = enabled_llm_stages(config)
+    for name, stage in LLM_STAGES:
+        if name not in stages:
+            continue
+        stage_deps = list(deps or [])
+        if name != "correct" and stage_source(config, name) == "text_lines":
+            stage_deps.append("correct")
+        graph[name] = (stage_deps, partial(stage, item, config))
+    return graph
+
+def build_stage_graph(item: dict, config: dict, temp_dir: str) -> dict:
+    """
+    构建单个文件的阶段图：识别 -> 矫正 / 标题 / 翻译 -> 保存
+    
+    标题和翻译只有在读取矫正后文本时才依赖矫正，见 stage_source
+    """
+    async def asr():
+        item.update(await transcribe_audio(item["index"], item["audio_file"], config))
+
+    graph = {"asr": ([], asr)}
+    graph.update(build_llm_stage_graph(item, config, deps=["asr"]))
+
+    async def save():
+        # 复制原始音频可能有上 GB，放到线程中执行，避免阻塞事件循环
+        item["audio_path"] = await asyncio.to_thread(save_results, item, config, temp_dir)
+    graph["save"] = (list(graph), save)
+    return graph
+
 async def process_single_audio(index, audio_file, config, temp_dir):
     start_time = datetime.now()
     logger.info(f"开始处理第 {index + 1} 个音频文件")
     
     try:
-        # 获取文件名和扩展名
-        filename = audio_file.name
-        base_name, ext = os.path.splitext(filename)
-        
-        # 转换音频格式
-        convert_start = datetime.now()
-        logger.info(f"音频格式转换完成，耗时 {(datetime.now() - convert_start).total_seconds():.2f} 秒")
-        
-        wav_audio = await convert_to_wav(audio_file.body)
-        # 背景音移除
-        if config.get("remove_background", False):
-            logger.info("正在进行背景音移除")
-            enhance_start = datetime.now()
-            wav_audio = await enhance_audio(wav_audio, model_name="enhance_model")
-            logger.info(f"背景音移除完成，耗时 {(datetime.now() - enhance_start).total_seconds():.2f} 秒")
+        item = {"index": index, "audio_file": audio_file}
+        timings = await run_stage_graph(build_stage_graph(item, config, temp_dir))
+        audio_path = item["audio_path"]
         
-        # 语音转文字
-        stt_start = datetime.now()
-        hotwords = config.get("subtitle", {}).get("hotwords", "")
-        subtitles = format_speech_results(await speech_to_text(wav_audio, hotwords=hotwords))
-        text_lines = [s['text'] for s in subtitles]
-        logger.info(f"语音转文字完成，耗时 {(datetime.now() - stt_start).total_seconds():.2f} 秒")
-        
-        # 文本矫正
-        if "correct" in config and config["correct"]:
-            logger.info("正在进行文本矫正")
-            correct_start = datetime.now()
-            openai_config = config["correct"]["openai"]
-            openai_handler = OpenAIHandler(
-                model=openai_config["model"],
-                use_ollama=openai_config["use_ollama"],
-                openai_url=openai_config["openai_url"],
-                openai_key=openai_config["openai_key"]
-            )
-            corrector = TextCorrector(openai_handler)
-            common_errors = config["correct"].get("common_errors", [])
-            text_lines = remove_trailing_punctuation_list(await corrector.fix_text(text_lines, common_errors))
-            logger.info(f"文本矫正完成，耗时 {(datetime.now() - correct_start).total_seconds():.2f} 秒")
-        
-        # 标题生成
-        title = "未生成"
-        if config.get("title", {}).get("generate", False) and not config.get("title", {}).get("skip_rename", False):
-            logger.info("正在进行标题生成")
-            title_start = datetime.now()
-            openai_config = config["title"]["openai"]
-            openai_handler = OpenAIHandler(
-                model=openai_config["model"],
-                use_ollama=openai_config["use_ollama"],
-                openai_url=openai_config["openai_url"],
-                openai_key=openai_config["openai_key"]
-            )
-            title_generator = TitleGenerator(
-                openai_handler,
-                config["title"].get("book_title", ""),
-                config["title"].get("author", ""),
-                config["title"].get("lang", "")
-            )
-            title = await title_generator.generate_title("\n".join(text_lines))
-            
-            # 应用标题生成规则
-            regex_origin = config["title"].get("regex_origin", "(\\d*)")
-            match = re.search(regex_origin, base_name)
-            groups = match.groups() if match else []
-            # {origin}_{index}_{title}_{book_title}_{author}_{0/1/2/...}，中 origin 表示原始音频名称，index 是索引+1，title 是新生成的 title（如果不需要生成标题则为空），book_title 是书名，author 是作者，{0/1/2/...} 是 regex_origin 中提取的数据，regex_origin 是从原始文件名中提取数据的正则表达式
-            rule = config["title"].get("rule", "{origin}")
-            base_name = rule.format(
-                origin=base_name,
-                index=str(index+1).zfill(3),
-                title=title,
-                book_title=config["title"].get("book_title", ""),
-                author=config["title"].get("author", ""),
-                *groups
-            )
-            logger.info(f"标题生成完成，耗时 {(datetime.now() - title_start).total_seconds():.2f} 秒")
-        
-        # 多语言翻译
-        if "translate" in config and config['translate']:
-            logger.info("正在进行多语言翻译")
-            translate_start = datetime.now()
-            openai_config = config["translate"]["openai"]
-            openai_handler = OpenAIHandler(
-                model=openai_config["model"],
-                use_ollama=openai_config["use_ollama"],
-                openai_url=openai_config["openai_url"],
-                openai_key=openai_config["openai_key"]
-            )
-            translator = OpenAITranslator(openai_handler)
-            from_lang = config["translate"]["from"]
-            to_lang = config["translate"]["to"]
-            translated_lines = remove_trailing_punctuation_list(await translator.translate(from_lang, to_lang, text_lines))
-            text_lines = [f"{orig}\n{trans}" for orig, trans in zip(text_lines, translated_lines)]
-            logger.info(f"多语言翻译完成，耗时 {(datetime.now() - translate_start).total_seconds():.2f} 秒")
-        
-        # 生成SRT和LRC文件
-        srt_start = datetime.now()
-        # 将处理后的文本更新到字幕信息中
-        for i, sub in enumerate(subtitles):
-            sub['text'] = text_lines[i]
-        # 生成SRT内容
-        srt_content = generate_srt(subtitles)
-        # 生成LRC内容
-        lrc_content = generate_lrc(subtitles)
-        logger.info(f"字幕文件生成完成，耗时 {(datetime.now() - srt_start).total_seconds():.2f} 秒")
-
-        # 保存文件
-        save_start = datetime.now()
-        audio_path = os.path.join(temp_dir, f"{base_name}{ext}")  # 使用原始文件扩展名
-        srt_path = os.path.join(temp_dir, f"{base_name}.srt")
-        lrc_path = os.path.join(temp_dir, f"{base_name}.lrc")
-        
-        # 处理文件名冲突
-        counter = 1
-        while os.path.exists(audio_path):
-            audio_path = os.path.join(temp_dir, f"{base_name}-{counter}{ext}")
-            srt_path = os.path.join(temp_dir, f"{base_name}-{counter}.srt")
-            lrc_path = os.path.join(temp_dir, f"{base_name}-{counter}.lrc")
-            counter += 1
-        
-        # 只有当不跳过标题重命名时才保存音频文件
-        if not config.get("title", {}).get("skip_rename", False):
-            with open(audio_path, "wb") as f:
-                f.write(audio_file.body)  # 保存原始音频文件
-            logger.info(f"音频文件保存完成")
-        
-        with open(srt_path, "w", encoding="utf-8") as f:
-            f.write(srt_content)
-        with open(lrc_path, "w", encoding="utf-8") as f:
-            f.write(lrc_content)
-        logger.info(f"字幕文件保存完成，耗时 {(datetime.now() - save_start).total_seconds():.2f} 秒")
-        
-        logger.info(f"第 {index + 1} 个音频处理完成，总耗时 {(datetime.now() - start_time).total_seconds():.2f} 秒")
+        logger.info(f"第 {index + 1} 个音频处理完成，总耗时 {(datetime.now() - start_time).total_seconds():.2f} 秒，各阶段耗时: {timings}")
         return audio_path
         
     except Exception as e:
@@ -161,52 +422,160 @@ async def process_single_audio(index, audio_file, config, temp_dir):
         logger.error(f"错误堆栈信息: {traceback.format_exc()}")
         raise e
 
-async def process_audio_batch_backround(input_dir: str, output_dir: str, config: dict, audio_files: list):
+def _stage_model(config: dict, stage: str) -> tuple:
+    openai_config = config[stage]["openai"]
+    return (openai_config["openai_url"], openai_config["model"], openai_config["use_ollama"])
+
+def order_llm_stages_by_model(config: dict) -> list:
+    """
+    按模型排列启用的大模型阶段，使用相同模型的阶段相邻执行
+    
+    纠错的结果是标题和翻译的输入，必须最先执行；标题和翻译互不依赖，与纠错模型相同的排在前面
+    """
+    stages = enabled_llm_stages(config)
+    if "correct" not in stages:
+        return stages
+    correct_model = _stage_model(config, "correct")
+    rest = [stage for stage in stages if stage != "correct"]
+    rest.sort(key=lambda stage: _stage_model(config, stage) != correct_model)
+    return ["correct"] + rest
+
+def has_model_switches(config: dict) -> bool:
+    """启用的大模型阶段是否使用了多个 Ollama 模型，此时按阶段批量处理可以避免反复加载模型"""
+    models = {_stage_model(config, stage) for stage in enabled_llm_stages(config)}
+    return len([model for model in models if model[2]]) > 1
+
+async def _switch_ollama_model(openai_config: dict, loaded: tuple) -> tuple:
+    """
+    切换到阶段使用的 Ollama 模型：卸载同一服务上的上一个模型并预加载新模型
+    
+    返回:
+        tuple: 当前已加载的 (openai_url, model)
+    """
+    if not openai_config.get("use_ollama"):
+        return loaded
+    target = (openai_config["openai_url"], openai_config["model"])
+    if target == loaded:
+        return loaded
+    try:
+        if loaded and loaded[0] == target[0]:
+            await OllamaHandler(loaded[0]).unload_model(loaded[1])
+        logger.info(f"预加载模型 {target[1]}")
+        await OllamaHandler(target[0]).preload_model(target[1], keep_alive=global_config.ollama_keep_alive)
+    except Exception as e:
+        # 预加载只是优化，失败时由首个请求触发加载
+        logger.warning(f"预加载模型 {target[1]} 失败: {str(e)}")
+    return target
+
+async def process_audio_stage_major(items: list, config: dict, on_stage=None, on_progress=None) -> list:
+    """按阶段批量处理多个音频文件
+    
+    先完成所有文件的语音识别，再依次对所有文件执行每个大模型阶段，
+    使用相同模型的阶段相邻执行，并在切换模型前预加载，避免 Ollama 在多个模型间反复加载卸载
+    
+    参数:
+        items: (index, audio_file, temp_dir) 列表，调用方按窗口分批传入以限制内存占用
+        config: 配置字典
+        on_stage: 可选回调，每个文件开始每个阶段时以 (item, 阶段名称) 调用
+        on_progress: 可选回调，大模型阶段的批次进度更新时以 (item, 进度) 调用
+        
+    返回:
+        与 items 一一对应的列表，成功时为音频文件路径，失败时为异常
+    """
+    results = [None] * len(items)
+    stage_funcs = dict(LLM_STAGES)
+    
+    def run_stage(item: dict, stage: str, func):
+        if on_stage:
+            on_stage(item, stage)
+        return func(item, config)
+    
+    live = {}
+    for pos, (index, audio_file, _) in enumerate(items):
+        item = {}
+        if on_progress:
+            item["on_progress"] = partial(on_progress, item)
+        try:
+            live[pos] = await transcribe_audio(index, audio_file, config, item=item, on_stage=on_stage)
+        except Exception as e:
+            logger.error(f"处理第 {index + 1} 个音频时发生错误: {str(e)}")
+            results[pos] = e
+    
+    loaded = None
+    for stage in order_llm_stages_by_model(config):
+        loaded = await _switch_ollama_model(config[stage]["openai"], loaded)
+        stage_start = datetime.now()
+        positions = list(live)
+        outcomes = await asyncio.gather(
+            *[run_stage(live[pos], stage, stage_funcs[stage]) for pos in positions],
+            return_exceptions=True
+        )
+        for pos, outcome in zip(positions, outcomes):
+            if isinstance(outcome, BaseException):
+                logger.error(f"处理第 {items[pos][0] + 1} 个音频时发生错误: {str(outcome)}")
+                results[pos] = outcome
+                del live[pos]
+        logger.info(f"{len(positions)} 个文件的 {stage} 阶段完成，耗时 {(datetime.now() - stage_start).total_seconds():.2f} 秒")
+    
+    for pos, item in live.items():
+        try:
+            if on_stage:
+                on_stage(item, "write")
+            results[pos] = await asyncio.to_thread(save_results, item, config, items[pos][2])
+        except Exception as e:
+            logger.error(f"处理第 {items[pos][0] + 1} 个音频时发生错误: {str(e)}")
+            results[pos] = e
+    
+    return results
+
+def create_audio_pipeline(config: dict) -> Pipeline:
+    """
+    创建多文件流水线：解码 -> 背景音移除 -> 语音识别 -> 大模型 -> 写入
+    
+    item 需要包含 index、temp_dir，以及 audio_file 或返回 audio_file 的无参函数 load_audio_file，
+    后者在解码阶段才读取文件，避免一次性读入所有音频
+    """
+    async def decode(item):
+        if "audio_file" not in item:
+            item["audio_file"] = item.pop("load_audio_file")()
+        await decode_audio(item, config)
+
+    async def llm(item):
+        item["timings"] = await run_stage_graph(build_llm_stage_graph(item, config))
+
+    async def write(item):
+        item["audio_path"] = await asyncio.to_thread(save_results, item, config, item["temp_dir"])
+        # 原始音频已写入，释放内存
+        item.pop("audio_file", None)
+
+    return Pipeline([
+        ("decode", global_config.pipeline_decode_workers, decode),
+        ("enhance", global_config.pipeline_enhance_workers, partial(enhance_item, config=config)),
+        ("asr", global_config.pipeline_asr_workers, partial(recognize_speech, config=config)),
+        ("llm", global_config.pipeline_llm_workers, llm),
+        ("write", global_config.pipeline_write_workers, write),
+    ], queue_size=global_config.pipeline_queue_size)
+
+async def process_audio_batch_backround(input_dir: str, output_dir: str, config: dict, audio_files: list) -> str:
     """异步批量处理音频文件
     
+    在任务队列中创建任务并启动后台 worker 进程，进程中断后可从已完成的文件之后继续
+    
     参数:
         input_dir: 输入目录路径
         output_dir: 输出目录路径
         config: 配置字典
         audio_files: 需要处理的音频文件列表
+        
+    返回:
+        任务 ID
     """
     try:
-        # 生成唯一ID
-        config_id = str(uuid.uuid4())
-        
-        # 创建临时配置文件路径
-        config_path = f"/tmp/config_{config_id}.json"
-        files_path = f"/tmp/files_{config_id}.json"
-        
-        # 将配置写入临时文件
-        with open(config_path, 'w', encoding='utf-8') as f:
-            json.dump(config, f, ensure_ascii=False, indent=2)
-        
-        # 将音频文件列表写入临时文件
-        with open(files_path, 'w', encoding='utf-8') as f:
-            json.dump(audio_files, f, ensure_ascii=False, indent=2)
-        
-        # 构造nohup命令
-        command = f"nohup python3 scripts/convert.py --config=\"{config_path}\" --input-dir=\"{input_dir}\" --output-dir=\"{output_dir}\" --audio-files=\"{files_path}\" > /dev/null 2>&1 &"
-
-        logger.info(f"运行命令：{command}")
-        
-        # 执行命令
-        import subprocess
-        process = subprocess.Popen(command, shell=True)
-        
-        # 等待进程启动
-        await asyncio.sleep(1)
-        
-        # 检查进程是否在运行
-        if process.poll() is None:
-            logger.info(f"成功启动后台处理进程，PID: {process.pid}")
-            logger.info(f"配置文件已保存至: {config_path}")
-            logger.info(f"音频文件列表已保存至: {files_path}")
-            return True
-        else:
-            logger.error("后台处理进程启动失败")
-            return False
+        # 多个阶段使用不同 Ollama 模型时按阶段批量处理，避免反复加载模型
+        job_id = job_store.create_job(config, input_dir, output_dir, audio_files, stage_major=has_model_switches(config))
+        pids = start_job_workers(job_id)
+        logger.info(f"已创建任务 {job_id}，共 {len(audio_files)} 个文件，后台 worker 进程 PID: {pids}")
+        return job_id
             
     except Exception as e:
         logger.error(f"启动后台处理进程时发生错误: {str(e)}")
@@ -320,12 +689,7 @@ async def ai_rename_files(openai_config, book_title, author, lang, audio_path, l
         # print("text_lines", text_lines)
 
         # 初始化OpenAI处理器
-        openai_handler = OpenAIHandler(
-            model=openai_config["model"],
-            use_ollama=openai_config["use_ollama"],
-            openai_url=openai_config["openai_url"],
-            openai_key=openai_config["openai_key"]
-        )
+        openai_handler = create_openai_handler(openai_config)
 
         # 创建标题生成器并生成标题
         title_generator = TitleGenerator(
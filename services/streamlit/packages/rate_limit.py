@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+from config import global_config
+
+
+def limiter_key(openai_url: str, openai_key: str) -> str:
+    """
+    计算限流桶的 key，同一接口地址和密钥共享一个桶，密钥只保存哈希
+    """
+    key_hash = hashlib.sha256((openai_key or "").encode("utf-8")).hexdigest()[:16]
+    return f"{openai_url}|{key_hash}"
+
+
+def estimate_tokens(messages: list) -> int:
+    """粗略估算请求的 token 数，中文约每字一个 token，英文约每 4 个字符一个 token，这里取偏大的估计"""
+    return sum(len(message.get("content", "")) for message in messages) + 1
+
+
+class RateLimiter:
+    """
+    跨进程的令牌桶限流器，按接口地址和密钥分别限制每分钟请求数（RPM）和 token 数（TPM）
+
+    桶状态保存在 SQLite 中，页面、后台任务和 API 服务等多个进程共享同一个限额；
+    服务端要求的暂停时间同时记录在进程内，不限流或限流器不可用时也会遵守；
+    不限流的桶只有在本进程记录过暂停后才查询 SQLite，平时不产生额外的读写
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._disabled = not path
+        self._lock = threading.Lock()
+        self._local_blocks = {}  # 限流桶 key -> 本进程记录的暂停截止时间
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None and not self._disabled:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS buckets ("
+                    "key TEXT PRIMARY KEY, requests REAL NOT NULL, tokens REAL NOT NULL, "
+                    "updated_at REAL NOT NULL, blocked_until REAL NOT NULL DEFAULT 0)"
+                )
+            except (sqlite3.Error, OSError) as e:
+                print(f"限流器不可用，已禁用: {str(e)}")
+                self._disabled = True
+                self._conn = None
+        return self._conn
+
+    def _try_acquire(self, key: str, rpm: int, tpm: int, tokens: int) -> float:
+        """
+        尝试从桶中取出一次请求和对应的 token
+
+        Returns:
+            float: 0 表示成功，否则为需要等待的秒数
+        """
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return 0
+            # 超过桶容量的请求按桶容量计算，避免永远等待
+            tokens = min(tokens, tpm) if tpm > 0 else tokens
+            now = time.time()
+            try:
+                # IMMEDIATE 事务在读取前即获取写锁，保证跨进程的读改写是原子的
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute(
+                    "SELECT requests, tokens, updated_at, blocked_until FROM buckets WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    available_requests, available_tokens, blocked_until = float(rpm), float(tpm), 0.0
+                else:
+                    elapsed = max(now - row[2], 0)
+                    available_requests = min(rpm, row[0] + elapsed * rpm / 60)
+                    available_tokens = min(tpm, row[1] + elapsed * tpm / 60)
+                    blocked_until = row[3]
+
+                if now < blocked_until:
+                    wait = blocked_until - now
+                else:
+                    wait = 0.0
+                    if rpm > 0 and available_requests < 1:
+                        wait = max(wait, (1 - available_requests) * 60 / rpm)
+                    if tpm > 0 and available_tokens < tokens:
+                        wait = max(wait, (tokens - available_tokens) * 60 / tpm)
+                    if wait == 0:
+                        available_requests -= 1
+                        available_tokens -= tokens
+
+                conn.execute(
+                    "INSERT OR REPLACE INTO buckets (key, requests, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?, ?)",
+                    (key, available_requests, available_tokens, now, blocked_until)
+                )
+                conn.execute("COMMIT")
+                return wait
+            except sqlite3.Error as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                print(f"限流器读写失败，跳过限流: {str(e)}")
+                return 0
+
+    def _blocked_wait(self, key: str) -> float:
+        """
+        查询所有进程记录的暂停截止时间，用于本进程记录过暂停的不限流的桶，只读不占用写锁
+
+        Returns:
+            float: 需要等待的秒数
+        """
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return 0
+            try:
+                row = conn.execute("SELECT blocked_until FROM buckets WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                print(f"限流器读写失败: {str(e)}")
+                return 0
+        return max(row[0] - time.time(), 0) if row else 0
+
+    async def acquire(self, key: str, rpm: int, tpm: int, tokens: int = 0):
+        """
+        等待直到桶中有足够的配额，rpm 和 tpm 为 0 表示不限制，但仍会等待服务端要求的暂停时间
+
+        Args:
+            key: 限流桶 key
+            rpm: 每分钟请求数上限
+            tpm: 每分钟 token 数上限
+            tokens: 本次请求预计消耗的 token 数
+        """
+        while True:
+            local_wait = self._local_blocks.get(key, 0) - time.time()
+            if local_wait > 0:
+                await asyncio.sleep(local_wait)
+                continue
+            # 桶状态由多个进程共享，等待 SQLite 锁时不阻塞事件循环
+            if rpm <= 0 and tpm <= 0:
+                if key not in self._local_blocks:
+                    return
+                # 本进程暂停结束后，其他进程可能延长了暂停时间
+                wait = await asyncio.to_thread(self._blocked_wait, key)
+            else:
+                wait = await asyncio.to_thread(self._try_acquire, key, rpm, tpm, tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def adjust_tokens(self, key: str, tpm: int, delta: int):
+        """
+        请求完成后按实际消耗修正 token 余额
+
+        Args:
+            key: 限流桶 key
+            tpm: 每分钟 token 数上限
+            delta: 实际消耗减去预估消耗的差值
+        """
+        if tpm <= 0 or delta == 0:
+            return
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            try:
+                conn.execute("UPDATE buckets SET tokens = MIN(tokens - ?, ?) WHERE key = ?", (delta, tpm, key))
+            except sqlite3.Error as e:
+                print(f"限流器读写失败: {str(e)}")
+
+    def block(self, key: str, seconds: float):
+        """
+        服务端返回 Retry-After 时，让所有进程在这段时间内暂停向该接口发送请求
+
+        Args:
+            key: 限流桶 key
+            seconds: 暂停的秒数
+        """
+        until = time.time() + seconds
+        with self._lock:
+            self._local_blocks[key] = max(self._local_blocks.get(key, 0), until)
+            conn = self._connect()
+            if conn is None:
+                return
+            try:
+                conn.execute(
+                    "INSERT INTO buckets (key, requests, tokens, updated_at, blocked_until) VALUES (?, 0, 0, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET blocked_until = MAX(blocked_until, excluded.blocked_until)",
+                    (key, time.time(), until)
+                )
+            except sqlite3.Error as e:
+                print(f"限流器读写失败: {str(e)}")
+
+
+rate_limiter = RateLimiter(global_config.rate_limit_path)
@@ -0,0 +1,146 @@
+import threading
+import time
+from typing import List, Optional
+from .llm import getRateLimit
+from .rate_limit import limiter_key
+
+
+class Endpoint:
+    """
+    一个 OpenAI 兼容的接口地址及其健康状态
+
+    同一进程内相同地址、密钥和模型的 Endpoint 共享在途请求数、延迟和健康状态
+    """
+    def __init__(self, openai_url: str, openai_key: str, model: Optional[str] = None, rpm: int = None, tpm: int = None):
+        self.openai_url = openai_url.rstrip('/')
+        self.openai_key = openai_key
+        self.model = model  # 为空时使用请求指定的模型
+        default_rpm, default_tpm = getRateLimit(self.openai_url)
+        self.rpm = default_rpm if rpm is None else rpm
+        self.tpm = default_tpm if tpm is None else tpm
+        self.limiter_key = limiter_key(self.openai_url, openai_key)
+        self.outstanding = 0
+        self.latency = None  # 延迟的指数移动平均（秒）
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+    def score(self, default_latency: float) -> float:
+        """路由得分，越小越优先：在途请求数乘以平均延迟，尚无延迟数据时使用 default_latency"""
+        return (self.outstanding + 1) * (self.latency or default_latency)
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model,
+            "outstanding": self.outstanding,
+            "latency": self.latency,
+            "consecutive_failures": self.consecutive_failures,
+            "ejected": self.ejected_until > time.monotonic(),
+        }
+
+
+class EndpointRouter:
+    """
+    在多个接口之间按最少在途请求和观测延迟分配请求
+
+    连续失败达到 eject_after 次的接口被暂时摘除，摘除时间按次数指数增长，到期后重新参与路由；
+    所有接口都被摘除时选择最早恢复的一个，保证请求总能发出
+    """
+    def __init__(self, eject_after: int = 3, eject_seconds: float = 10.0, max_eject_seconds: float = 300.0, latency_alpha: float = 0.3):
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+        self.latency_alpha = latency_alpha
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def endpoint(self, openai_url: str, openai_key: str, model: Optional[str] = None, rpm: int = None, tpm: int = None) -> Endpoint:
+        """
+        获取共享的 Endpoint 实例
+
+        Args:
+            openai_url: 接口地址
+            openai_key: 接口密钥
+            model: 该接口使用的模型名称，为空时使用请求指定的模型
+            rpm: 每分钟请求数上限，默认按接口地址使用供应商配置
+            tpm: 每分钟 token 数上限，默认按接口地址使用供应商配置
+
+        Returns:
+            Endpoint: 接口实例
+        """
+        key = (openai_url.rstrip('/'), limiter_key(openai_url.rstrip('/'), openai_key), model)
+        with self._lock:
+            if key not in self._endpoints:
+                self._endpoints[key] = Endpoint(openai_url, openai_key, model, rpm, tpm)
+            return self._endpoints[key]
+
+    def acquire(self, endpoints: List[Endpoint], exclude: tuple = ()) -> Endpoint:
+        """
+        选择一个接口并计入在途请求，请求结束后必须调用 on_success 或 on_failure
+
+        Args:
+            endpoints: 候选接口列表
+            exclude: 本次请求已经失败过的接口，其余接口可用时不再选择
+
+        Returns:
+            Endpoint: 选中的接口
+        """
+        with self._lock:
+            now = time.monotonic()
+            candidates = [e for e in endpoints if e not in exclude] or list(endpoints)
+            healthy = [e for e in candidates if e.ejected_until <= now]
+            if healthy:
+                # 尚无延迟数据的接口按已知的最低延迟估计，相同得分时保持配置顺序，靠前的接口优先
+                known = [e.latency for e in healthy if e.latency is not None]
+                default_latency = min(known) if known else 1.0
+                chosen = min(healthy, key=lambda e: e.score(default_latency))
+            else:
+                chosen = min(candidates, key=lambda e: e.ejected_until)
+            chosen.outstanding += 1
+            return chosen
+
+    def release(self, endpoint: Endpoint):
+        """请求被取消时只释放在途计数，不影响健康状态"""
+        with self._lock:
+            endpoint.outstanding -= 1
+
+    def on_success(self, endpoint: Endpoint, latency: float):
+        with self._lock:
+            endpoint.outstanding -= 1
+            endpoint.consecutive_failures = 0
+            endpoint.ejections = 0
+            if endpoint.latency is None:
+                endpoint.latency = latency
+            else:
+                endpoint.latency += self.latency_alpha * (latency - endpoint.latency)
+
+    def on_failure(self, endpoint: Endpoint):
+        with self._lock:
+            endpoint.outstanding -= 1
+            now = time.monotonic()
+            # 摘除前已发出的请求陆续失败时不再延长摘除时间
+            if endpoint.ejected_until > now:
+                return
+            endpoint.consecutive_failures += 1
+            if endpoint.consecutive_failures >= self.eject_after:
+                seconds = min(self.eject_seconds * 2 ** endpoint.ejections, self.max_eject_seconds)
+                endpoint.ejected_until = now + seconds
+                endpoint.ejections += 1
+                endpoint.consecutive_failures = 0
+                print(f"接口 {endpoint.openai_url} 连续失败，暂停使用 {seconds:.0f} 秒")
+
+    def stats(self) -> dict:
+        """
+        获取所有接口的路由状态
+
+        Returns:
+            dict: 接口地址到 Endpoint.stats() 列表的映射
+        """
+        with self._lock:
+            result = {}
+            for endpoint in self._endpoints.values():
+                result.setdefault(endpoint.openai_url, []).append(endpoint.stats())
+            return result
+
+
+endpoint_router = EndpointRouter()
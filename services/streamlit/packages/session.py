@@ -0,0 +1,92 @@
+import asyncio
+import weakref
+import aiohttp
+from config import global_config
+
+# 每个事件循环共享一个 ClientSession（streamlit 每次运行可能使用新的事件循环）
+_sessions = weakref.WeakKeyDictionary()
+
+# 连接统计，用于观察连接复用率
+_stats = {
+    "requests": 0,
+    "connections_created": 0,
+    "connections_reused": 0,
+}
+
+
+async def _on_request_start(session, trace_config_ctx, params):
+    _stats["requests"] += 1
+
+
+async def _on_connection_create_end(session, trace_config_ctx, params):
+    _stats["connections_created"] += 1
+
+
+async def _on_connection_reuseconn(session, trace_config_ctx, params):
+    _stats["connections_reused"] += 1
+
+
+def _create_session() -> aiohttp.ClientSession:
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(_on_request_start)
+    trace_config.on_connection_create_end.append(_on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(_on_connection_reuseconn)
+
+    connector = aiohttp.TCPConnector(
+        limit=global_config.http_pool_limit,
+        limit_per_host=global_config.http_pool_limit_per_host,
+        keepalive_timeout=global_config.http_keepalive_timeout,
+        ttl_dns_cache=300
+    )
+    return aiohttp.ClientSession(connector=connector, trace_configs=[trace_config])
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    获取当前事件循环共享的 ClientSession，复用连接、DNS 缓存和 TLS 会话
+
+    注意不要关闭返回的 session，由 close_session 统一关闭
+
+    Returns:
+        aiohttp.ClientSession: 共享的会话
+    """
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = _create_session()
+        _sessions[loop] = session
+    return session
+
+
+async def close_session():
+    """关闭当前事件循环的共享会话"""
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+async def run_with_session(coro):
+    """
+    运行协程，结束后关闭当前事件循环的共享会话
+
+    用法:
+        asyncio.run(run_with_session(main()))
+    """
+    try:
+        return await coro
+    finally:
+        await close_session()
+
+
+def session_stats() -> dict:
+    """
+    获取连接池统计信息
+
+    Returns:
+        dict: 包含请求数、新建连接数、复用连接数和复用率的字典
+    """
+    connections = _stats["connections_created"] + _stats["connections_reused"]
+    return {
+        **_stats,
+        "reuse_rate": _stats["connections_reused"] / connections if connections else 0.0,
+    }
@@ -1,12 +1,18 @@
 import asyncio
-from typing import List
+import logging
+import time
+from typing import Callable, List, Optional
 from .openai import OpenAIHandler
 
+logger = logging.getLogger(__name__)
+
 class TextCorrector:
-    def __init__(self, openai_handler: OpenAIHandler, batch_size: int = 20, context_size: int = 4):
+    def __init__(self, openai_handler: OpenAIHandler, batch_size: int = 20, context_size: int = 4, concurrency: int = 4):
         self.openai_handler = openai_handler
         self.batch_size = batch_size
         self.context_size = context_size
+        self.concurrency = concurrency  # 同时请求的批次数
+        self.batch_latencies = []  # 最近一次 fix_text 各批次的耗时（秒）
 
     def _create_sysprompt(self, common_errors: List[dict]) -> str:
         error_examples = "\n".join([f"- {error['from']} => {error['to']}" for error in common_errors])
@@ -37,45 +43,90 @@ class TextCorrector:
             "1: 我觉得还行，用了之后皮肤真的变得又白又嫩"
         )
 
-    async def fix_text(self, sentences: List[str], common_errors: List[dict]) -> List[str]:
+    async def _fix_batch(self, sentences: List[str], start: int, sysprompt: str) -> List[tuple]:
+        """矫正一批句子，返回 (index, text) 列表"""
+        batch = sentences[start:start + self.batch_size]
+        context = sentences[max(0, start - self.context_size):start]
+        
+        user_prompt = "\n".join([f"{idx}: {text}" for idx, text in enumerate(batch, start=start)])
+        if context:
+            user_prompt = f"Context:\n" + "\n".join(context) + "\n\n" + user_prompt
+
+        messages = [
+            {"role": "system", "content": sysprompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
+        corrected_text = await self.openai_handler.request(
+            messages=messages
+        )
+
+        # Parse the corrected results
+        results = []
+        for line in corrected_text.split('\n'):
+            if ':' in line:
+                idx, text = line.split(':', 1)
+                try:
+                    idx = int(idx.strip())
+                    if 0 <= idx < len(sentences):
+                        results.append((idx, text.strip()))
+                except ValueError:
+                    continue
+        return results
+
+    async def fix_text(self, sentences: List[str], common_errors: List[dict], journal=None, on_progress: Optional[Callable[[int, int], None]] = None) -> List[str]:
+        """
+        矫正所有句子
+
+        Args:
+            journal: 可选的 BatchJournal，已记录的批次直接复用，新完成的批次立即写入
+            on_progress: 可选回调，每完成一个批次以 (已完成批次数, 总批次数) 调用
+        """
         if not isinstance(sentences, list):
             raise ValueError("sentences must be a list of strings")
 
-        results = []
         sysprompt = self._create_sysprompt(common_errors)
-
-        for i in range(0, len(sentences), self.batch_size):
-            batch = sentences[i:i + self.batch_size]
-            context = sentences[max(0, i - self.context_size):i]
-            
-            user_prompt = "\n".join([f"{idx}: {text}" for idx, text in enumerate(batch, start=i)])
-            if context:
-                user_prompt = f"Context:\n" + "\n".join(context) + "\n\n" + user_prompt
-
-            messages = [
-                {"role": "system", "content": sysprompt},
-                {"role": "user", "content": user_prompt}
-            ]
-
-            corrected_text = await self.openai_handler.request(
-                messages=messages
-            )
-
-            # Parse the corrected results
-            for line in corrected_text.split('\n'):
-                if ':' in line:
-                    idx, text = line.split(':', 1)
-                    try:
-                        idx = int(idx.strip())
-                        if 0 <= idx < len(sentences):
-                            results.append((idx, text.strip()))
-                    except ValueError:
-                        continue
-
-        # Apply corrections to original sentences
+        semaphore = asyncio.Semaphore(max(self.concurrency, 1))
+        self.batch_latencies = []
+        starts = list(range(0, len(sentences), self.batch_size))
+        # 批次 ID 包含批大小，批大小变化后不会误用旧的记录
+        journaled = await asyncio.to_thread(journal.load) if journal else {}
+        done = 0
+
+        def report():
+            if on_progress:
+                on_progress(done, len(starts))
+
+        # 上下文只依赖原始句子，各批次互不依赖，可以并发请求
+        async def run_batch(start: int) -> List[tuple]:
+            nonlocal done
+            batch_id = f"{start}:{self.batch_size}"
+            if batch_id in journaled:
+                done += 1
+                report()
+                return [tuple(result) for result in journaled[batch_id]]
+            async with semaphore:
+                batch_start = time.monotonic()
+                results = await self._fix_batch(sentences, start, sysprompt)
+                latency = time.monotonic() - batch_start
+                self.batch_latencies.append(latency)
+                if journal:
+                    await asyncio.to_thread(journal.record, batch_id, results)
+                done += 1
+                logger.info(f"文本矫正批次 {start // self.batch_size + 1} 完成（{done}/{len(starts)}），耗时 {latency:.2f} 秒")
+                report()
+                return results
+
+        resumed = sum(1 for start in starts if f"{start}:{self.batch_size}" in journaled)
+        if resumed:
+            logger.info(f"文本矫正从日志恢复 {resumed}/{len(starts)} 个批次")
+        batch_results = await asyncio.gather(*[run_batch(i) for i in starts])
+
+        # Apply corrections to original sentences, in batch order
         corrected_sentences = sentences.copy()
-        for idx, text in results:
-            corrected_sentences[idx] = text
+        for results in batch_results:
+            for idx, text in results:
+                corrected_sentences[idx] = text
 
         return corrected_sentences
 
@@ -1,6 +1,8 @@
 import asyncio
-from typing import List
-from .openai import OpenAIHandler
+import math
+from typing import Callable, List, Optional
+from .openai import OpenAIHandler, ValidationFailedError
+from .translation_memory import TranslationMemory, translation_memory, normalize_text
 
 
 # 这是 qwen2.5 7b-q4_K_M 支持较好的语言
@@ -14,20 +16,87 @@ from_languages = [
 to_languages = from_languages[1:] + [from_languages[0]]
 
 class OpenAITranslator:
-    def __init__(self, openai_handler: OpenAIHandler):
+    # 按 (接口地址, 模型) 记录学习到的可靠批大小，同一进程内的翻译任务共享
+    _learned_batch_sizes = {}
+    # 连续成功多少个整批后尝试扩大批大小
+    grow_after = 8
+
+    def __init__(self, openai_handler: OpenAIHandler, max_batch_size: int = 32, memory: TranslationMemory = translation_memory):
         self.openai_handler = openai_handler
-        self.batch_size = 1 # 本地模型只能每条翻译，可能输出太长，注意力不够？
+        self.max_batch_size = max(max_batch_size, 1)
+        self.memory = memory  # 翻译记忆，为 None 时不使用
+        self._success_streak = 0
+        self.request_count = 0  # 最近一次 translate 的请求次数
+        self.last_stats = {}  # 最近一次 translate 的去重和翻译记忆命中统计
+
+    @property
+    def _model_key(self) -> tuple:
+        return (self.openai_handler.openai_url, self.openai_handler.model)
+
+    @property
+    def batch_size(self) -> int:
+        """当前模型的批大小，从 max_batch_size 开始，校验失败时减半，连续成功后翻倍"""
+        return min(self._learned_batch_sizes.get(self._model_key, self.max_batch_size), self.max_batch_size)
+
+    def _record_success(self, size: int):
+        if size < self.batch_size:
+            return
+        self._success_streak += 1
+        if self._success_streak >= self.grow_after and self.batch_size < self.max_batch_size:
+            self._learned_batch_sizes[self._model_key] = min(self.batch_size * 2, self.max_batch_size)
+            self._success_streak = 0
+
+    def _record_failure(self, size: int):
+        self._success_streak = 0
+        self._learned_batch_sizes[self._model_key] = max(min(self.batch_size, size // 2), 1)
 
     def _validate_translation(self, original_text: List[str]):
         def validator(translated_text: str):
             translated_lines = translated_text.split('\n')
             if len(translated_lines) != len(original_text):
-                print("original_text", original_text)
-                print("translated_lines", translated_lines)
                 raise ValueError(f"翻译结果行数({len(translated_lines)})与原文行数({len(original_text)})不匹配")
         return validator
 
-    async def translate(self, from_lang: str, to_lang: str, texts: List[str]) -> List[str]:
+    async def _translate_batch(self, sysprompt: str, batch: List[str]) -> List[str]:
+        """
+        翻译一批文本，多行批次的译文行数不匹配时不再重试，二分为两半分别翻译
+
+        网络错误、限流和服务端错误按 OpenAIHandler 的重试次数和退避重试，不拆分批次，也不影响学习到的批大小；
+        单行批次无法再拆分，校验失败也按 OpenAIHandler 的重试次数重试
+        """
+        messages = [
+            {"role": "system", "content": sysprompt},
+            {"role": "user", "content": "\n".join(batch)}
+        ]
+
+        self.request_count += 1
+        try:
+            translated_text = await self.openai_handler.request(
+                messages=messages,
+                validator_callback=self._validate_translation(batch),
+                temp=0.7,
+                validation_retries=1 if len(batch) > 1 else None
+            )
+        except ValidationFailedError as e:
+            if len(batch) == 1:
+                raise
+            print(f"{len(batch)} 行批次翻译结果校验失败，拆分后重试: {str(e)}")
+            self._record_failure(len(batch))
+            mid = len(batch) // 2
+            return await self._translate_batch(sysprompt, batch[:mid]) + await self._translate_batch(sysprompt, batch[mid:])
+
+        self._record_success(len(batch))
+        return translated_text.split('\n')
+
+    async def translate(self, from_lang: str, to_lang: str, texts: List[str], journal=None, on_progress: Optional[Callable[[int, int], None]] = None) -> List[str]:
+        """
+        翻译所有文本
+
+        Args:
+            journal: 可选的 BatchJournal，已记录的译文直接复用，新完成的批次立即写入
+            on_progress: 可选回调，每完成一个批次以 (已完成批次数, 总批次数) 调用。
+                批大小会自适应调整，总批次数按剩余句子数和当前批大小估算
+        """
         if from_lang == to_lang:
             raise ValueError("源语言和目标语言不能相同")
         if not isinstance(texts, list):
@@ -42,29 +111,53 @@ class OpenAITranslator:
             f"注意：确保{to_lang}的翻译结果中不包含任何{from_lang}的字符或单词。\n\n"
         )
 
-        results = []
-
-        # 分批处理
-        total_batches = (len(texts) + self.batch_size - 1) // self.batch_size
-        for i in range(0, len(texts), self.batch_size):
-            batch_num = i // self.batch_size + 1
-            
-            batch = texts[i:i + self.batch_size]
-            # print(f"正在处理第 {batch_num}/{total_batches} 批，本批次翻译 {len(batch)} 条文本，共 {len(texts)} 行文本")
-            user_prompt = "\n".join(batch)
+        self.request_count = 0
 
-            messages = [
-                {"role": "system", "content": sysprompt},
-                {"role": "user", "content": user_prompt}
-            ]
+        # 先在本次调用内去重，再查询翻译记忆，只把未翻译过的句子交给大模型
+        # 规范化后的原文只用于查找和去重，发给大模型的是每个规范化原文第一次出现时的原始文本，
+        # 只把其中的换行替换为空格，保证逐行对应
+        sources = [normalize_text(text) for text in texts]
+        originals = {}
+        for source, text in zip(sources, texts):
+            if source:
+                originals.setdefault(source, " ".join(text.splitlines()).strip())
+        unique_sources = list(originals)
+        translations = await asyncio.to_thread(self.memory.lookup, from_lang, to_lang, unique_sources) if self.memory else {}
+        memory_hits = len(translations)
+        # 中断前已完成的批次，与翻译记忆命中一样不再请求
+        new_translations = {}
+        if journal:
+            for result in (await asyncio.to_thread(journal.load)).values():
+                new_translations.update({source: text for source, text in result.items() if source in originals})
+        pending = [source for source in unique_sources if source not in translations and source not in new_translations]
+        resumed = len(new_translations)
 
-            translated_text = await self.openai_handler.request(
-                messages=messages,
-                validator_callback=self._validate_translation(batch),
-                temp=0.7
-            )
+        # 分批处理，批大小随校验结果自适应调整
+        done = 0
+        i = 0
+        while i < len(pending):
+            batch = pending[i:i + self.batch_size]
+            result = dict(zip(batch, await self._translate_batch(sysprompt, [originals[source] for source in batch])))
+            new_translations.update(result)
+            i += len(batch)
+            if journal:
+                await asyncio.to_thread(journal.record, batch[0], result)
+            done += 1
+            total = done + math.ceil((len(pending) - i) / self.batch_size)
+            if on_progress:
+                on_progress(done, total)
 
-            results.extend(translated_text.split('\n'))
-            # print(f"第 {batch_num} 批处理完成，已处理 {min(i + self.batch_size, len(texts))} 行")
+        if self.memory:
+            await asyncio.to_thread(self.memory.save, from_lang, to_lang, new_translations)
+        translations.update(new_translations)
 
-        return results
+        self.last_stats = {
+            "lines": len(texts),
+            "unique": len(unique_sources),
+            "memory_hits": memory_hits,
+            "resumed": resumed,
+            "translated": len(pending),
+            "hit_ratio": (len(texts) - len(pending)) / len(texts) if texts else 0.0,
+        }
+        print(f"翻译 {len(texts)} 行文本（去重后 {len(unique_sources)} 行，翻译记忆命中 {memory_hits} 行，从日志恢复 {resumed} 行）共请求 {self.request_count} 次，当前批大小 {self.batch_size}")
+        return [translations.get(source, "") for source in sources]
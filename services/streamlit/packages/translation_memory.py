@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import List, Optional
+from config import global_config
+
+
+def normalize_text(text: str) -> str:
+    """
+    规范化原文，用作翻译记忆的 key
+
+    统一全角半角字符，合并多余空白
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class TranslationMemory:
+    """
+    持久化的翻译记忆，按 (源语言, 目标语言, 规范化原文) 保存译文
+
+    使用 SQLite 存储，同一任务的不同文件以及不同任务之间共享
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._disabled = not path
+        self._lock = threading.Lock()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None and not self._disabled:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS translations ("
+                    "from_lang TEXT NOT NULL, to_lang TEXT NOT NULL, source TEXT NOT NULL, "
+                    "target TEXT NOT NULL, updated_at REAL NOT NULL, "
+                    "PRIMARY KEY (from_lang, to_lang, source))"
+                )
+                self._conn.commit()
+            except (sqlite3.Error, OSError) as e:
+                print(f"翻译记忆不可用，已禁用: {str(e)}")
+                self._disabled = True
+                self._conn = None
+        return self._conn
+
+    def lookup(self, from_lang: str, to_lang: str, sources: List[str]) -> dict:
+        """
+        批量查询译文
+
+        Args:
+            from_lang: 源语言
+            to_lang: 目标语言
+            sources: 规范化后的原文列表
+
+        Returns:
+            dict: 原文到译文的映射，只包含命中的条目
+        """
+        found = {}
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return found
+            try:
+                # SQLite 默认最多 999 个参数，分段查询
+                for i in range(0, len(sources), 500):
+                    chunk = sources[i:i + 500]
+                    rows = conn.execute(
+                        "SELECT source, target FROM translations WHERE from_lang = ? AND to_lang = ? "
+                        f"AND source IN ({','.join('?' * len(chunk))})",
+                        (from_lang, to_lang, *chunk)
+                    ).fetchall()
+                    found.update(rows)
+            except sqlite3.Error as e:
+                print(f"读取翻译记忆失败: {str(e)}")
+        return found
+
+    def save(self, from_lang: str, to_lang: str, pairs: dict):
+        """
+        保存译文
+
+        Args:
+            from_lang: 源语言
+            to_lang: 目标语言
+            pairs: 规范化原文到译文的映射
+        """
+        if not pairs:
+            return
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            now = time.time()
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO translations (from_lang, to_lang, source, target, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    [(from_lang, to_lang, source, target, now) for source, target in pairs.items()]
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"写入翻译记忆失败: {str(e)}")
+
+
+translation_memory = TranslationMemory(global_config.translation_memory_path)
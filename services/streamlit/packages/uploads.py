@@ -0,0 +1,225 @@
+import asyncio
+import os
+import re
+from typing import List, Optional, Tuple
+
+
+class LocalAudioFile:
+    """
+    磁盘上的音频文件，接口与 Sanic 上传的文件相同
+
+    body 在访问时才读取，处理流程优先通过 path 读取文件，不把整个音频放进内存
+    """
+    def __init__(self, path: str, name: Optional[str] = None):
+        self.path = path
+        self.name = name or os.path.basename(path)
+
+    @property
+    def size(self) -> int:
+        return os.path.getsize(self.path)
+
+    @property
+    def body(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+
+class UploadTooLarge(Exception):
+    """请求体超过单个请求的上限"""
+
+
+class UploadBusy(Exception):
+    """正在接收的上传总量已达到全局上限"""
+
+
+class UploadBudget:
+    """
+    进程内正在接收和处理的上传字节数预算
+
+    Sanic 的每个 worker 进程只有一个事件循环，计数不需要加锁
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.in_flight = 0
+
+    def reserve(self, size: int):
+        """
+        预留字节数
+
+        Raises:
+            UploadBusy: 预留后超过全局上限
+        """
+        if self.max_bytes and self.in_flight + size > self.max_bytes:
+            raise UploadBusy(f"正在处理的上传已达到上限 {self.max_bytes} 字节")
+        self.in_flight += size
+
+    def release(self, size: int):
+        self.in_flight = max(self.in_flight - size, 0)
+
+    def stats(self) -> dict:
+        return {"in_flight_bytes": self.in_flight, "max_bytes": self.max_bytes}
+
+
+def unique_path(directory: str, name: str) -> str:
+    """在目录中为文件名生成不冲突的路径，同名文件按 save_results 的规则加序号"""
+    base_name, ext = os.path.splitext(os.path.basename(name) or "upload")
+    path = os.path.join(directory, f"{base_name}{ext}")
+    counter = 1
+    while os.path.exists(path):
+        path = os.path.join(directory, f"{base_name}-{counter}{ext}")
+        counter += 1
+    return path
+
+
+def _parse_disposition(headers: bytes) -> Tuple[Optional[str], Optional[str]]:
+    """从分段头中解析字段名和文件名"""
+    name = filename = None
+    for line in headers.decode("utf-8", "replace").split("\r\n"):
+        key, _, value = line.partition(":")
+        if key.strip().lower() != "content-disposition":
+            continue
+        match = re.search(r'(?:^|;)\s*name="([^"]*)"', value)
+        name = match.group(1) if match else None
+        match = re.search(r'(?:^|;)\s*filename="([^"]*)"', value)
+        filename = match.group(1) if match else None
+    return name, filename
+
+
+class SpooledUpload:
+    """
+    流式解析 multipart/form-data 请求体：文件逐块写入目录，普通字段保存在内存中
+
+    receive() 之前按 Content-Length 预先占用预算，没有 Content-Length 时按实际接收的字节数逐步占用；
+    文件处理完成后调用 release() 释放预算
+    """
+    # 普通字段和分段头的大小上限
+    max_field_bytes = 1024 * 1024
+    max_header_bytes = 16 * 1024
+
+    def __init__(self, request, directory: str, max_bytes: int, budget: UploadBudget, file_field: str = "files"):
+        self.request = request
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.budget = budget
+        self.file_field = file_field
+        self.fields = {}
+        self.files: List[LocalAudioFile] = []
+        self._reserved = 0
+
+    def _reserve(self, size: int):
+        self.budget.reserve(size)
+        self._reserved += size
+
+    async def receive(self):
+        """
+        接收整个请求体，失败时删除已写入的文件并释放预算
+
+        Raises:
+            UploadTooLarge: 请求体超过单个请求的上限
+            UploadBusy: 超过全局上限
+            ValueError: 请求体格式错误
+        """
+        match = re.search(r'boundary="?([^";]+)"?', self.request.headers.get("content-type", ""))
+        if not match:
+            raise ValueError("请求需要使用 multipart/form-data 格式")
+        length = self.request.headers.get("content-length")
+        try:
+            if length is not None:
+                if self.max_bytes and int(length) > self.max_bytes:
+                    raise UploadTooLarge(f"请求体超过上限 {self.max_bytes} 字节")
+                self._reserve(int(length))
+            await self._receive(match.group(1).encode("latin-1"), length is None)
+        except BaseException:
+            self.release()
+            for file in self.files:
+                if os.path.exists(file.path):
+                    os.remove(file.path)
+            raise
+
+    def release(self):
+        """释放占用的预算，文件由调用方负责删除或保留"""
+        self.budget.release(self._reserved)
+        self._reserved = 0
+
+    async def _receive(self, boundary: bytes, reserve_incrementally: bool):
+        delimiter = b"--" + boundary
+        separator = b"\r\n" + delimiter
+        os.makedirs(self.directory, exist_ok=True)
+
+        buffer = b""
+        received = 0
+        state = "preamble"
+        name = None
+        field_value = b""
+        out = None
+        try:
+            while True:
+                chunk = await self.request.stream.read()
+                if chunk is None:
+                    break
+                received += len(chunk)
+                if self.max_bytes and received > self.max_bytes:
+                    raise UploadTooLarge(f"请求体超过上限 {self.max_bytes} 字节")
+                if reserve_incrementally:
+                    self._reserve(len(chunk))
+                buffer += chunk
+
+                while True:
+                    if state == "preamble":
+                        index = buffer.find(delimiter + b"\r\n")
+                        if index < 0:
+                            buffer = buffer[-(len(delimiter) + 1):]
+                            break
+                        buffer = buffer[index + len(delimiter) + 2:]
+                        state = "headers"
+                    elif state == "headers":
+                        index = buffer.find(b"\r\n\r\n")
+                        if index < 0:
+                            if len(buffer) > self.max_header_bytes:
+                                raise ValueError("分段头过大")
+                            break
+                        name, filename = _parse_disposition(buffer[:index])
+                        buffer = buffer[index + 4:]
+                        if filename is not None and name == self.file_field:
+                            path = unique_path(self.directory, filename)
+                            out = open(path, "wb")
+                            self.files.append(LocalAudioFile(path, os.path.basename(path)))
+                        field_value = b""
+                        state = "body"
+                    elif state == "body":
+                        index = buffer.find(separator)
+                        # 分隔符可能被切在两个数据块之间，末尾保留不足一个分隔符长度的数据
+                        end = index if index >= 0 else max(len(buffer) - len(separator) + 1, 0)
+                        data, buffer = buffer[:end], buffer[end:]
+                        if out is not None:
+                            await asyncio.to_thread(out.write, data)
+                        elif name is not None:
+                            field_value += data
+                            if len(field_value) > self.max_field_bytes:
+                                raise ValueError(f"字段 {name} 过大")
+                        if index < 0:
+                            break
+                        if out is not None:
+                            out.close()
+                            out = None
+                        elif name is not None:
+                            self.fields[name] = field_value.decode("utf-8")
+                        buffer = buffer[len(separator):]
+                        state = "after_part"
+                    elif state == "after_part":
+                        if len(buffer) < 2:
+                            break
+                        if buffer[:2] == b"--":
+                            state = "end"
+                        else:
+                            buffer = buffer[2:]
+                            state = "headers"
+                    else:
+                        # 结束分隔符之后的内容忽略
+                        buffer = b""
+                        break
+        finally:
+            if out is not None:
+                out.close()
+        if state != "end":
+            raise ValueError("请求体不完整")
@@ -0,0 +1,120 @@
+import asyncio
+import io
+import os
+import zipfile
+from typing import AsyncIterator, Iterable, Iterator, Tuple
+
+# 本身已经压缩的格式，再用 DEFLATE 压缩几乎没有收益，只会消耗 CPU
+COMPRESSED_EXTENSIONS = {".mp3", ".m4a", ".aac", ".ogg", ".opus", ".flac", ".zip"}
+
+
+class _ChunkSink(io.RawIOBase):
+    """收集 ZipFile 写出的数据，由生成器取走后清空，内存中只保留当前的一小块"""
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_directory(directory: str) -> Iterator[Tuple[str, str]]:
+    """
+    列出目录中的所有文件
+
+    Returns:
+        Iterator: (文件路径, 压缩包内的相对路径)
+    """
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for file in sorted(files):
+            file_path = os.path.join(root, file)
+            yield file_path, os.path.relpath(file_path, directory)
+
+
+class ZipStream:
+    """
+    边读取文件边生成 zip 数据，内存占用与文件数量和大小无关
+
+    输出流不可回退，ZipFile 在每个文件之后写入数据描述符；已压缩的音频使用 ZIP_STORED，其余文件使用 ZIP_DEFLATED
+    """
+    def __init__(self, chunk_size: int = 1024 * 1024):
+        self.chunk_size = chunk_size
+        self._sink = _ChunkSink()
+        self._zip_file = zipfile.ZipFile(self._sink, "w")
+
+    def add(self, file_path: str, arcname: str) -> Iterator[bytes]:
+        """
+        添加一个文件
+
+        Returns:
+            Iterator: 该文件的 zip 数据块，需要全部取出后才能添加下一个文件
+        """
+        info = zipfile.ZipInfo.from_file(file_path, arcname)
+        compressed = os.path.splitext(file_path)[1].lower() in COMPRESSED_EXTENSIONS
+        info.compress_type = zipfile.ZIP_STORED if compressed else zipfile.ZIP_DEFLATED
+        with open(file_path, "rb") as src, self._zip_file.open(info, "w") as dst:
+            while True:
+                data = src.read(self.chunk_size)
+                if not data:
+                    break
+                dst.write(data)
+                chunk = self._sink.pop()
+                if chunk:
+                    yield chunk
+        # 数据描述符在文件关闭时写入
+        chunk = self._sink.pop()
+        if chunk:
+            yield chunk
+
+    def close(self) -> bytes:
+        """
+        结束压缩包
+
+        Returns:
+            bytes: 中央目录数据
+        """
+        self._zip_file.close()
+        return self._sink.pop()
+
+
+def iter_zip(entries: Iterable[Tuple[str, str]], chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """
+    逐块生成 zip 数据
+
+    Args:
+        entries: (文件路径, 压缩包内的相对路径)
+        chunk_size: 每次读取的字节数
+
+    Returns:
+        Iterator: zip 数据块
+    """
+    stream = ZipStream(chunk_size)
+    for file_path, arcname in entries:
+        yield from stream.add(file_path, arcname)
+    yield stream.close()
+
+
+async def aiter_zip(entries: Iterable[Tuple[str, str]], chunk_size: int = 1024 * 1024) -> AsyncIterator[bytes]:
+    """iter_zip 的异步版本，读取和压缩在线程中进行，不阻塞事件循环"""
+    async for chunk in iterate_in_thread(iter_zip(entries, chunk_size)):
+        yield chunk
+
+
+async def iterate_in_thread(chunks: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """在线程中逐个取出同步迭代器的数据块"""
+    done = object()
+    while True:
+        chunk = await asyncio.to_thread(next, chunks, done)
+        if chunk is done:
+            return
+        yield chunk
+
@@ -9,6 +9,7 @@ import re
 import time
 import requests
 from components.home import step_upload_audio,step_remove_background,step_subtitle_config,step_translate_config,step_correct_config,step_title_config, step_preview_config, step_choose_audio_dir, step_local_fileoutput
+from packages.session import run_with_session
 
 async def render_page():
     st.title("直接处理服务器本地音频文件")
@@ -89,7 +90,7 @@ async def render_page():
             st.rerun()
 
 def main():
-    asyncio.run(render_page())
+    asyncio.run(run_with_session(render_page()))
 
 if __name__ == "__main__":
     main()
@@ -2,13 +2,53 @@ import streamlit as st
 import pandas as pd
 import os
 import asyncio
-import shutil
+from urllib.parse import urlencode
 from components.form import model_selection, select_target_language
 from packages.process import check_offline_task_output, get_audio_files, ai_rename_files
 from components.home import display_audio_files
 from packages.llm import QWEN2_5_MODEL, MINICPM3_MODEL
+from packages.session import run_with_session
+from packages.jobs import job_store, start_job_workers, JOB_PENDING, JOB_RUNNING, JOB_CANCELLED, JOB_DONE
+from config import global_config
+
+def render_jobs():
+    """显示离线任务队列中最近的任务"""
+    jobs = job_store.list_jobs()
+    if not jobs:
+        return
+    with st.expander("后台任务", expanded=True):
+        status_names = {"pending": "等待中", "running": "处理中", "done": "已完成", "cancelled": "已取消"}
+        for job in jobs:
+            files = job["files"]
+            st.write(f"**{job['id']}** {status_names.get(job['status'], job['status'])}：{job['output_dir']}")
+            st.progress(
+                (files["done"] + files["failed"]) / job["total"] if job["total"] else 1.0,
+                text=f"完成 {files['done']}，失败 {files['failed']}，处理中 {files['running']}，等待 {files['pending']}，共 {job['total']}"
+            )
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                if job["status"] in (JOB_PENDING, JOB_RUNNING) and st.button("停止任务", key=f"cancel_{job['id']}", help="正在处理的文件完成后停止"):
+                    job_store.cancel_job(job["id"])
+                    st.rerun()
+            with col2:
+                if (job["status"] == JOB_CANCELLED or files["failed"]) and st.button("继续/重试", key=f"resume_{job['id']}", help="重新处理失败的文件，已完成的文件会跳过"):
+                    job_store.retry_failed(job["id"])
+                    job_store.recover(job["id"])
+                    start_job_workers(job["id"])
+                    st.rerun()
+            with col3:
+                if st.button("使用此目录", key=f"use_{job['id']}"):
+                    st.session_state.input_audio_dir = job["input_dir"]
+                    st.session_state.output_audio_dir = job["output_dir"]
+                    st.rerun()
+            with col4:
+                # 由 API 服务边打包边发送，不经过 Streamlit 进程的内存
+                if global_config.public_api_url and job["status"] == JOB_DONE:
+                    st.link_button("下载结果", f"{global_config.public_api_url.rstrip('/')}/jobs/{job['id']}/result")
 
 async def render_page():
+    render_jobs()
+    
     # 输入输出目录表单
     st.subheader("目录设置")
     input_dir = st.text_input("输入目录", value=st.session_state.get("input_audio_dir", "/mnt/data/"))
@@ -23,25 +63,16 @@ async def render_page():
 
     output_dir = st.text_input("输出目录", value=st.session_state.get("output_audio_dir", ""))
     
-    # 打包下载输出目录功能
+    # 打包下载输出目录功能，由 API 服务边打包边发送，不经过 Streamlit 进程的内存
     if output_dir and os.path.exists(output_dir):
-        # 显示下载按钮
-        if st.button("打包下载输出目录", help="点击下载输出目录中的所有文件"):
-            # 使用tempfile创建临时zip文件
-            import tempfile
-            with tempfile.NamedTemporaryFile(suffix=".zip", delete=False) as tmp_file:
-                zip_path = tmp_file.name
-                shutil.make_archive(zip_path[:-4], "zip", output_dir)
-                
-                # 触发下载
-                with open(zip_path, "rb") as f:
-                    st.download_button(
-                        label="开始下载",
-                        data=f,
-                        file_name="output.zip",
-                        mime="application/zip",
-                        help="点击下载输出目录中的所有文件"
-                    )
+        if global_config.public_api_url:
+            st.link_button(
+                "打包下载输出目录",
+                f"{global_config.public_api_url.rstrip('/')}/outputs?{urlencode({'path': output_dir})}",
+                help="点击下载输出目录中的所有文件"
+            )
+        else:
+            st.caption("设置 PUBLIC_API_URL 环境变量后可以打包下载输出目录")
 
     # 显示输出目录音频文件并检查数量
     output_audio_files = get_audio_files(output_dir)
@@ -180,7 +211,7 @@ async def render_page():
                                 st.error(f"AI生成标题失败: {str(e)}")
 
 def main():
-    asyncio.run(render_page())
+    asyncio.run(run_with_session(render_page()))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
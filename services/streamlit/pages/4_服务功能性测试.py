@@ -5,6 +5,7 @@ import asyncio
 from components.form import model_selection, get_text_correct_common_errors, select_translate_languages, select_target_language
 from packages.openai import OpenAIHandler
 from packages.llm import QWEN2_5_MODEL, MINICPM3_MODEL
+from packages.session import run_with_session
 
 async def render_text_correction():
     st.header("语音识别文本矫正")
@@ -190,8 +191,9 @@ async def render_audio_to_subtitle():
                     audio_bytes = audio_file.getvalue()
                     
                     # 调用音频处理函数
-                    from packages.audio import convert_to_wav, speech_to_text, format_speech_results
-                    wav_audio = await convert_to_wav(audio_bytes)
+                    from packages.audio import convert_to_wav, speech_to_text, format_speech_results, get_input_sample_rate
+                    from config import global_config
+                    wav_audio = await convert_to_wav(audio_bytes, sample_rate=await get_input_sample_rate(global_config.funasr_url))
                     subtitles = await speech_to_text(wav_audio, hotwords=hotwords)
                     # st.json(subtitles)
                     subtitles = format_speech_results(subtitles)
@@ -227,7 +229,7 @@ async def render_page():
         await render_audio_to_subtitle()
 
 def main():
-    asyncio.run(render_page())
+    asyncio.run(run_with_session(render_page()))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -5,10 +5,17 @@ import argparse
 import sys
 import asyncio
 import traceback
+from functools import partial
 from io import StringIO
 app_path = os.path.join(os.path.dirname(__file__), '../')
 sys.path.append(app_path)
-from packages.process import process_single_audio
+from packages.process import process_audio_stage_major, create_audio_pipeline
+from packages.session import run_with_session, session_stats
+from packages.llm_cache import completion_cache
+from packages.concurrency import limiter_stats
+from packages.artifacts import artifact_store
+from packages.uploads import LocalAudioFile
+from packages.jobs import job_store, current_worker_id, JOB_DONE
 
 class LogManager:
     """日志管理器，负责日志的捕获和写入"""
@@ -36,7 +43,173 @@ class LogManager:
         if not self.has_error and os.path.exists(self.log_file):
             os.remove(self.log_file)
 
-async def convert_audio_files(config_path: str, input_dir: str, output_dir: str, audio_files_path: str = None):
+def read_audio_file(file_path: str):
+    """返回类似上传文件的对象，处理流程通过路径读取文件，不把整个音频读入内存"""
+    return LocalAudioFile(file_path)
+
+def get_target_dir(file_path: str, input_dir: str, output_dir: str) -> str:
+    """创建并返回音频文件对应的输出目录"""
+    # 计算相对路径
+    relative_path = os.path.relpath(os.path.dirname(file_path), input_dir)
+    # 创建对应的输出目录
+    target_dir = os.path.join(output_dir, relative_path)
+    os.makedirs(target_dir, exist_ok=True)
+    return target_dir
+
+async def convert_audio_files_pipelined(audio_files: list, config: dict, input_dir: str, output_dir: str, log_manager: LogManager) -> int:
+    """按流水线处理，不同文件的解码、背景音移除、识别、大模型和写入阶段重叠执行，返回成功处理的文件数"""
+    pipeline = create_audio_pipeline(config)
+    items = [{
+        "index": index,
+        "name": os.path.basename(file_path),
+        "temp_dir": get_target_dir(file_path, input_dir, output_dir),
+        "load_audio_file": partial(read_audio_file, file_path),
+    } for index, file_path in enumerate(audio_files)]
+    
+    def on_done(item):
+        file_processing_time = time.time() - item.get("started_at", time.time())
+        if "error" in item:
+            log_manager.write(f"Error processing file {item['name']} at stage {item['failed_stage']}: {str(item['error'])} (Time: {file_processing_time:.2f}s)\n")
+            log_manager.has_error = True
+        else:
+            log_manager.write(f"Successfully processed: {item['name']} (Time: {file_processing_time:.2f}s, stages: {item['stage_seconds']}, LLM stages: {item['timings']})\n")
+    
+    await pipeline.run(items, on_done=on_done)
+    log_manager.write(f"Pipeline stats: {pipeline.stats()}\n")
+    return sum(1 for item in items if item.get("audio_path"))
+
+async def convert_audio_files_stage_major(audio_files: list, config: dict, input_dir: str, output_dir: str, window: int, log_manager: LogManager) -> int:
+    """按阶段批量处理，每次读取 window 个文件，返回成功处理的文件数"""
+    success_count = 0
+    for offset in range(0, len(audio_files), window):
+        window_start_time = time.time()
+        items = []
+        for index in range(offset, min(offset + window, len(audio_files))):
+            file_path = audio_files[index]
+            try:
+                items.append((index, read_audio_file(file_path), get_target_dir(file_path, input_dir, output_dir)))
+            except Exception as e:
+                log_manager.write(f"Error processing file {os.path.basename(file_path)}: {str(e)}\n")
+                log_manager.has_error = True
+        
+        results = await process_audio_stage_major(items, config)
+        window_processing_time = time.time() - window_start_time
+        for (index, file_obj, _), result in zip(items, results):
+            if isinstance(result, BaseException):
+                log_manager.write(f"Error processing file {file_obj.name}: {str(result)}\n")
+                log_manager.has_error = True
+            elif result:
+                success_count += 1
+                log_manager.write(f"Successfully processed: {file_obj.name}\n")
+        log_manager.write(f"Processed files {offset + 1}-{offset + len(items)} (Time: {window_processing_time:.2f}s)\n")
+    return success_count
+
+async def run_job_worker(job_id: str, window: int = 8):
+    """任务队列 worker：领取任务中的文件进行处理并写回结果，重新启动时跳过已完成的文件继续处理
+    
+    参数:
+        job_id: 任务 ID
+        window: 按阶段批量处理时每次领取的文件数
+    """
+    job = job_store.get_job(job_id)
+    if job is None:
+        print(f"Error: job {job_id} not found")
+        return
+    config, input_dir, output_dir = job["config"], job["input_dir"], job["output_dir"]
+    os.makedirs(output_dir, exist_ok=True)
+    log_manager = LogManager(output_dir)
+    worker = current_worker_id()
+    
+    try:
+        recovered = job_store.recover(job_id)
+        log_manager.write(f"Worker {worker} started on job {job_id}: {job['files']['done']}/{job['total']} files already done, {recovered} interrupted files requeued\n")
+        start_time = time.time()
+        
+        def finish(idx: int, name: str, audio_path, error, seconds: float):
+            if error is not None:
+                job_store.fail_file(job_id, idx, str(error), seconds)
+                log_manager.write(f"Error processing file {name}: {str(error)} (Time: {seconds:.2f}s)\n")
+                log_manager.has_error = True
+            else:
+                job_store.complete_file(job_id, idx, audio_path, seconds)
+                log_manager.write(f"Successfully processed: {name} (Time: {seconds:.2f}s)\n")
+        
+        def on_stage(item, stage):
+            job_store.update_progress(job_id, item["index"], stage)
+        
+        if job["stage_major"]:
+            def on_progress(item, progress):
+                job_store.update_progress(job_id, item["index"], None, progress)
+            
+            while True:
+                claimed = job_store.claim_files(job_id, worker, limit=max(window, 1))
+                if not claimed:
+                    break
+                window_start_time = time.time()
+                items = []
+                for file in claimed:
+                    try:
+                        items.append((file["idx"], read_audio_file(file["path"]), get_target_dir(file["path"], input_dir, output_dir)))
+                    except Exception as e:
+                        finish(file["idx"], os.path.basename(file["path"]), None, e, 0)
+                results = await process_audio_stage_major(items, config, on_stage=on_stage, on_progress=on_progress)
+                # 按阶段批量处理时无法区分单个文件的耗时，按窗口平均
+                seconds = (time.time() - window_start_time) / max(len(items), 1)
+                for (idx, file_obj, _), result in zip(items, results):
+                    error = result if isinstance(result, BaseException) else None
+                    finish(idx, file_obj.name, None if error else result, error, seconds)
+        else:
+            async def claim():
+                # 上游队列有空位时才领取下一个文件，其余文件留给其他 worker
+                while True:
+                    claimed = job_store.claim_files(job_id, worker)
+                    if not claimed:
+                        return
+                    file = claimed[0]
+                    try:
+                        temp_dir = get_target_dir(file["path"], input_dir, output_dir)
+                    except Exception as e:
+                        finish(file["idx"], os.path.basename(file["path"]), None, e, 0)
+                        continue
+                    yield {
+                        "index": file["idx"],
+                        "name": os.path.basename(file["path"]),
+                        "temp_dir": temp_dir,
+                        "load_audio_file": partial(read_audio_file, file["path"]),
+                        "on_progress": partial(job_store.update_progress, job_id, file["idx"], None),
+                    }
+            
+            def on_done(item):
+                seconds = time.time() - item.get("started_at", time.time())
+                error = f"{item['failed_stage']}: {str(item['error'])}" if "error" in item else None
+                finish(item["index"], item["name"], item.get("audio_path"), error, seconds)
+            
+            pipeline = create_audio_pipeline(config)
+            # 失败的文件会重新放回队列，直到没有可领取的文件为止
+            while await pipeline.run(claim(), on_done=on_done, on_stage=on_stage):
+                log_manager.write(f"Pipeline stats: {pipeline.stats()}\n")
+        
+        job = job_store.get_job(job_id)
+        log_manager.write(f"Worker finished: job {job_id} is {job['status']}, {job['files']['done']}/{job['total']} files done, {job['files']['failed']} failed\n")
+        log_manager.write(f"Worker processing time: {time.time() - start_time:.2f} seconds\n")
+        log_manager.write(f"HTTP connection stats: {session_stats()}\n")
+        log_manager.write(f"LLM cache stats: {completion_cache.stats()}\n")
+        log_manager.write(f"LLM concurrency stats: {limiter_stats()}\n")
+        log_manager.write(f"Artifact cache stats: {artifact_store.stats()}\n")
+        # 任务还有其他 worker 在处理或存在失败文件时保留日志
+        if job["status"] != JOB_DONE or job["files"]["failed"]:
+            log_manager.has_error = True
+        
+    except Exception as e:
+        log_manager.write(f"Error during processing: {str(e)}\n")
+        log_manager.write(traceback.format_exc())
+        log_manager.has_error = True
+        raise e
+    finally:
+        # 清理日志文件
+        log_manager.clean_up()
+
+async def convert_audio_files(config_path: str, input_dir: str, output_dir: str, audio_files_path: str = None, stage_major: bool = False, window: int = 8):
     """转换音频文件
     
     参数:
@@ -44,6 +217,8 @@ async def convert_audio_files(config_path: str, input_dir: str, output_dir: str,
         input_dir: 输入目录路径
         output_dir: 输出目录路径
         audio_files_path: 音频文件列表JSON文件路径
+        stage_major: 是否按阶段批量处理，各大模型阶段使用不同 Ollama 模型时可避免反复加载模型
+        window: 按阶段批量处理时每批的文件数
     """
     # 初始化日志管理器
     log_manager = LogManager(output_dir)
@@ -78,51 +253,20 @@ async def convert_audio_files(config_path: str, input_dir: str, output_dir: str,
         start_time = time.time()
         success_count = 0
         
-        # 顺序处理每个文件
-        for index, file_path in enumerate(audio_files):
-            try:
-                file_start_time = time.time()  # 记录单个文件开始处理时间
-                
-                with open(file_path, 'rb') as f:
-                    # 创建类似Streamlit上传文件的对象
-                    file_obj = type('StreamlitUploadedFile', (), {
-                        'name': os.path.basename(file_path),
-                        'body': f.read()
-                    })()
-                    
-                    # 计算相对路径
-                    relative_path = os.path.relpath(os.path.dirname(file_path), input_dir)
-                    # 创建对应的输出目录
-                    target_dir = os.path.join(output_dir, relative_path)
-                    os.makedirs(target_dir, exist_ok=True)
-                    
-                    # 处理单个音频文件
-                    audio_path = await process_single_audio(
-                        index=index,
-                        audio_file=file_obj,
-                        config=config,
-                        temp_dir=target_dir
-                    )
-                    
-                    if audio_path:
-                        success_count += 1
-                        file_end_time = time.time()  # 记录单个文件处理结束时间
-                        file_processing_time = file_end_time - file_start_time  # 计算单个文件处理时间
-                        log_manager.write(f"Successfully processed: {os.path.basename(file_path)} (Time: {file_processing_time:.2f}s)\n")
-                        
-            except Exception as e:
-                file_end_time = time.time()  # 记录单个文件处理结束时间
-                file_processing_time = file_end_time - file_start_time  # 计算单个文件处理时间
-                error_msg = f"Error processing file {os.path.basename(file_path)}: {str(e)} (Time: {file_processing_time:.2f}s)\n"
-                log_manager.write(error_msg)
-                log_manager.has_error = True
-                continue
+        if stage_major:
+            success_count = await convert_audio_files_stage_major(audio_files, config, input_dir, output_dir, max(window, 1), log_manager)
+        else:
+            success_count = await convert_audio_files_pipelined(audio_files, config, input_dir, output_dir, log_manager)
         
         end_time = time.time()
         processing_time = end_time - start_time
         log_manager.write(f"Processing completed! Successfully processed {success_count}/{len(audio_files)} files\n")
         log_manager.write(f"Total processing time: {processing_time:.2f} seconds\n")
         log_manager.write(f"Results saved to: {output_dir}\n")
+        log_manager.write(f"HTTP connection stats: {session_stats()}\n")
+        log_manager.write(f"LLM cache stats: {completion_cache.stats()}\n")
+        log_manager.write(f"LLM concurrency stats: {limiter_stats()}\n")
+        log_manager.write(f"Artifact cache stats: {artifact_store.stats()}\n")
         
     except Exception as e:
         error_msg = f"Error during processing: {str(e)}\n"
@@ -138,15 +282,24 @@ async def convert_audio_files(config_path: str, input_dir: str, output_dir: str,
 def main():
     # 解析命令行参数
     parser = argparse.ArgumentParser(description="Convert audio files")
-    parser.add_argument('--config', required=True, help="Path to config JSON file")
-    parser.add_argument('--input-dir', required=True, help="Input directory containing audio files")
-    parser.add_argument('--output-dir', required=True, help="Output directory for processed files")
+    parser.add_argument('--job-id', help="Run as a worker for a job in the job store; other options except --window are ignored")
+    parser.add_argument('--config', help="Path to config JSON file")
+    parser.add_argument('--input-dir', help="Input directory containing audio files")
+    parser.add_argument('--output-dir', help="Output directory for processed files")
     parser.add_argument('--audio-files', help="Path to JSON file containing list of audio files to process")
+    parser.add_argument('--stage-major', action='store_true', help="Run each LLM stage across a window of files before the next stage, grouping work by model")
+    parser.add_argument('--window', type=int, default=8, help="Number of files per window in stage-major mode")
     
     args = parser.parse_args()
     
+    if args.job_id:
+        asyncio.run(run_with_session(run_job_worker(args.job_id, args.window)))
+        return
+    if not (args.config and args.input_dir and args.output_dir):
+        parser.error("--config, --input-dir and --output-dir are required without --job-id")
+    
     # 运行转换任务
-    asyncio.run(convert_audio_files(args.config, args.input_dir, args.output_dir, args.audio_files))
+    asyncio.run(run_with_session(convert_audio_files(args.config, args.input_dir, args.output_dir, args.audio_files, args.stage_major, args.window)))
 
 if __name__ == "__main__":
     main()
@@ -5,17 +5,27 @@ import numpy as np
 import os
 import json as JSON
 import tempfile
-import zipfile
+import shutil
 import logging
 import re
 import asyncio
-from io import BytesIO
+import time
+import uuid
 from datetime import datetime
 from packages.audio import convert_to_wav, enhance_audio, speech_to_text, format_speech_results, remove_trailing_punctuation_list, generate_srt, generate_lrc
 from packages.text import TextCorrector, TitleGenerator
 from packages.translate import OpenAITranslator
 from packages.openai import OpenAIHandler
-from packages.process import process_single_audio
+from packages.process import process_single_audio, has_model_switches
+from packages.jobs import job_store, start_job_workers, JOB_DONE
+from config import global_config
+from packages.session import close_session, session_stats
+from packages.llm_cache import completion_cache
+from packages.concurrency import limiter_stats
+from packages.artifacts import artifact_store
+from packages.router import endpoint_router
+from packages.zipstream import ZipStream, aiter_zip, iter_directory, iterate_in_thread
+from packages.uploads import SpooledUpload, UploadBudget, UploadTooLarge, UploadBusy
 
 class CustomJSONEncoder(JSON.JSONEncoder):
     def default(self, obj):
@@ -35,24 +45,52 @@ WorkerManager.THRESHOLD = 400
 app = Sanic("LiberSonora", dumps=partial(JSON.dumps, cls=CustomJSONEncoder))
 app.config.REQUEST_TIMEOUT = 1000
 app.config.RESPONSE_TIMEOUT = 1000
-app.config.REQUEST_MAX_SIZE = 1000000000
+app.config.REQUEST_MAX_SIZE = global_config.upload_max_bytes
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 清理过期 HTTP 接口任务的间隔（秒）
+API_JOB_SWEEP_INTERVAL = 3600
+
+@app.after_server_start
+async def start_api_job_sweeper(app, _):
+    app.add_task(sweep_api_jobs_periodically(), name="api_job_sweeper")
+
+@app.after_server_stop
+async def stop_session(app, _):
+    await close_session()
+
 @app.get("/")
 async def welcome(_):
     return json({
         "success": True,
         "message": "欢迎使用 LiberSonora AI 服务",
+        "http": session_stats(),
+        "llm_cache": completion_cache.stats(),
+        "llm_concurrency": limiter_stats(),
+        "artifacts": artifact_store.stats(),
+        "llm_endpoints": endpoint_router.stats(),
+        "uploads": upload_budget.stats(),
     })
 
-@app.post("/handle")
+upload_budget = UploadBudget(global_config.upload_inflight_bytes)
+
+def _upload_error(e: Exception):
+    """把接收上传时的错误转换为响应"""
+    if isinstance(e, UploadTooLarge):
+        return json({"error": str(e)}, status=413)
+    if isinstance(e, UploadBusy):
+        return json({"error": str(e)}, status=503, headers={"Retry-After": "30"})
+    return json({"error": f"上传失败: {str(e)}"}, status=400)
+
+@app.post("/handle", stream=True)
 async def handle_audio(request):
     """
     config 示例
     {
         "remove_background": true,
+        "enhance_model": "MossFormer2_SE_48K",
         "subtitle": {
             "hotwords": ""
         },
@@ -61,14 +99,26 @@ async def handle_audio(request):
                 "model": "xxx",
                 "use_ollama": true,
                 "openai_url": "xxx",
-                "openai_key": "xxx"
+                "openai_key": "xxx",
+                "endpoints": [
+                    {
+                        "openai_url": "http://ollama-2:11434",
+                        "openai_key": ""
+                    },
+                    {
+                        "openai_url": "https://api.deepseek.com",
+                        "openai_key": "xxx",
+                        "model": "deepseek-chat"
+                    }
+                ]
             },
             "common_errors": [
                 {
                     "from": "因改",
                     "to": "应该"
                 }
-            ]
+            ],
+            "concurrency": 4
         },
         "translate": {
             "openai": {
@@ -78,7 +128,9 @@ async def handle_audio(request):
                 "openai_key": "xxx"
             },
             "from": "zh-CN",
-            "to": "en"
+            "to": "en",
+            "max_batch_size": 32,
+            "source": "corrected"
         },
         "title": {
             "openai": {
@@ -90,41 +142,226 @@ async def handle_audio(request):
             "book_title": "",
             "author": "",
             "generate": true,
+            "source": "raw",
             "regex_origin": "(\\d*)",
             "rule": "{origin}_{index}_{title}_{0}"
         }
     }
     """
-    if not request.files:
+    # 上传的文件逐块写入暂存目录，处理期间一直占用上传预算
+    os.makedirs(global_config.upload_spool_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=global_config.upload_spool_dir) as spool_dir, tempfile.TemporaryDirectory() as temp_dir:
+        upload = SpooledUpload(request, spool_dir, global_config.upload_max_bytes, upload_budget)
+        try:
+            await upload.receive()
+        except Exception as e:
+            return _upload_error(e)
+        
+        try:
+            if not upload.files:
+                return json({"error": "需要上传音频文件"}, status=400)
+            
+            try:
+                config = JSON.loads(upload.fields.get("config", "{}"))
+            except JSON.JSONDecodeError:
+                return json({"error": "配置文件格式错误"}, status=400)
+            
+            # 每个文件处理完成后立即把它的输出写入压缩包发出，不在内存中拼出整个压缩包
+            stream = ZipStream()
+            sent = set()
+            zip_response = None
+            for index, audio_file in enumerate(upload.files):
+                try:
+                    await process_single_audio(index, audio_file, config, temp_dir)
+                except Exception as e:
+                    if zip_response is None:
+                        return json({"error": f"处理音频时发生错误: {str(e)}"}, status=500)
+                    # 响应已经开始发送，无法再返回错误状态码；压缩包不写入中央目录，客户端解压时会报错
+                    logger.error(f"处理第 {index + 1} 个音频时发生错误，已发送的压缩包不完整: {str(e)}")
+                    raise
+                if zip_response is None:
+                    zip_response = await request.respond(
+                        content_type="application/zip",
+                        headers={"Content-Disposition": "attachment; filename=results.zip"}
+                    )
+                for file_path, arcname in iter_directory(temp_dir):
+                    if arcname in sent:
+                        continue
+                    sent.add(arcname)
+                    async for chunk in iterate_in_thread(stream.add(file_path, arcname)):
+                        await zip_response.send(chunk)
+            await zip_response.send(stream.close())
+            await zip_response.eof()
+        finally:
+            upload.release()
+
+async def send_zip(request, directory: str, filename: str):
+    """把目录中的文件逐块打包，以分块传输编码边生成边发送"""
+    zip_response = await request.respond(
+        content_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+    async for chunk in aiter_zip(iter_directory(directory)):
+        await zip_response.send(chunk)
+    await zip_response.eof()
+
+def sweep_api_jobs() -> int:
+    """
+    删除超过保留时间的 HTTP 接口任务：已完成或已取消的任务及其目录，以及没有任务记录的残留目录
+
+    Returns:
+        int: 删除的目录数
+    """
+    retention = global_config.api_job_retention_hours * 3600
+    root = os.path.abspath(global_config.api_job_dir)
+    if retention <= 0 or not os.path.isdir(root):
+        return 0
+    cutoff = time.time() - retention
+    removed = 0
+    for job in job_store.finished_jobs(cutoff):
+        job_dir = os.path.dirname(os.path.abspath(job["input_dir"]))
+        # 只清理通过 HTTP 接口提交的任务，页面提交的任务使用用户自己的目录
+        if os.path.dirname(job_dir) != root:
+            continue
+        shutil.rmtree(job_dir, ignore_errors=True)
+        job_store.delete_job(job["id"])
+        removed += 1
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        try:
+            expired = os.path.getmtime(path) < cutoff
+        except OSError:
+            continue
+        # 接收上传后、创建任务前中断时留下的目录
+        if expired and job_store.get_job(name) is None:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
+
+async def sweep_api_jobs_periodically():
+    while True:
+        try:
+            removed = await asyncio.to_thread(sweep_api_jobs)
+            if removed:
+                logger.info(f"已清理 {removed} 个过期的接口任务目录")
+        except Exception as e:
+            logger.error(f"清理过期的接口任务失败: {str(e)}")
+        await asyncio.sleep(API_JOB_SWEEP_INTERVAL)
+
+def resolve_output_dir(path: str) -> str:
+    """
+    校验要打包下载的目录，只允许 DATA_ROOT 下已存在的目录，不允许下载以 . 开头的内部目录（缓存、任务队列等）
+
+    Raises:
+        ValueError: 目录不在允许的根目录下、是内部目录或不存在
+    """
+    root = os.path.realpath(global_config.data_root)
+    real_path = os.path.realpath(path)
+    if os.path.commonpath([root, real_path]) != root:
+        raise ValueError(f"目录不在允许的目录 {global_config.data_root} 下: {path}")
+    if any(part.startswith(".") for part in os.path.relpath(real_path, root).split(os.sep) if part != "."):
+        raise ValueError(f"不允许下载内部目录: {path}")
+    if not os.path.isdir(real_path):
+        raise ValueError(f"目录不存在: {path}")
+    return real_path
+
+@app.get("/outputs")
+async def download_output_dir(request):
+    """把共享数据卷上的输出目录边打包边发送，参数 path 为目录路径，供离线任务页面下载"""
+    try:
+        directory = resolve_output_dir(request.args.get("path", ""))
+    except ValueError as e:
+        return json({"error": str(e)}, status=400)
+    await send_zip(request, directory, "output.zip")
+
+@app.post("/jobs", stream=True)
+async def submit_job(request):
+    """
+    提交后台任务，立即返回任务 ID
+
+    参数与 /handle 相同：files 为音频文件，config 为配置 JSON。
+    文件逐块写入共享数据卷后由后台 worker 进程处理，客户端断开或代理超时不影响处理，服务重启后自动继续。
+    任务完成或取消后，上传文件和处理结果保留 API_JOB_RETENTION_HOURS 小时
+    """
+    job_id = uuid.uuid4().hex
+    job_dir = os.path.join(global_config.api_job_dir, job_id)
+    input_dir, output_dir = os.path.join(job_dir, "input"), os.path.join(job_dir, "output")
+    # 直接写入任务输入目录，接收完成后即释放上传预算
+    upload = SpooledUpload(request, input_dir, global_config.upload_max_bytes, upload_budget)
+    try:
+        await upload.receive()
+    except Exception as e:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        return _upload_error(e)
+    upload.release()
+
+    if not upload.files:
+        shutil.rmtree(job_dir, ignore_errors=True)
         return json({"error": "需要上传音频文件"}, status=400)
-    
+
     try:
-        config = JSON.loads(request.form.get("config", "{}"))
+        config = JSON.loads(upload.fields.get("config", "{}"))
     except JSON.JSONDecodeError:
+        shutil.rmtree(job_dir, ignore_errors=True)
         return json({"error": "配置文件格式错误"}, status=400)
-    
-    with tempfile.TemporaryDirectory() as temp_dir:
+
+    audio_files = [file.path for file in upload.files]
+    try:
+        job_store.create_job(config, input_dir, output_dir, audio_files, stage_major=has_model_switches(config), job_id=job_id)
+        start_job_workers(job_id)
+    except Exception as e:
+        # 任务无法运行，删除可能已创建的记录和已接收的文件
         try:
-            for index, audio_file in enumerate(request.files.getlist("files")):
-                await process_single_audio(index, audio_file, config, temp_dir)
-        except Exception as e:
-            return json({"error": f"处理音频时发生错误: {str(e)}"}, status=500)
-        
-        # 打包文件
-        zip_buffer = BytesIO()
-        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-            for root, dirs, files in os.walk(temp_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, temp_dir)
-                    zip_file.write(file_path, arcname)
-        
-        zip_buffer.seek(0)
-        return response.raw(
-            zip_buffer.getvalue(),
-            content_type="application/zip",
-            headers={"Content-Disposition": "attachment; filename=results.zip"}
-        )
+            job_store.delete_job(job_id)
+        except Exception:
+            pass
+        shutil.rmtree(job_dir, ignore_errors=True)
+        return json({"error": f"创建任务时发生错误: {str(e)}"}, status=500)
+    logger.info(f"已创建任务 {job_id}，共 {len(audio_files)} 个文件")
+    return json({"job_id": job_id, "total": len(audio_files)}, status=202)
+
+@app.get("/jobs/<job_id>")
+async def get_job(request, job_id: str):
+    """
+    查询任务状态
+
+    返回任务状态、各状态的文件数、预计剩余时间（秒，无法估算时为 null），
+    以及每个文件的状态、当前阶段（decode / enhance / asr / llm / write）和大模型阶段的批次进度
+    """
+    job = job_store.get_job(job_id)
+    if job is None:
+        return json({"error": "任务不存在"}, status=404)
+    files = [{
+        "name": os.path.basename(file["path"]),
+        "status": file["status"],
+        "stage": file["stage"],
+        "progress": file["progress"],
+        "attempts": file["attempts"],
+        "seconds": file["seconds"],
+        "error": file["error"],
+    } for file in job_store.list_files(job_id)]
+    # 配置中包含接口密钥，不返回
+    return json({
+        "job_id": job_id,
+        "status": job["status"],
+        "files": job["files"],
+        "total": job["total"],
+        "eta_seconds": job["eta_seconds"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "file_details": files,
+    })
+
+@app.get("/jobs/<job_id>/result")
+async def get_job_result(request, job_id: str):
+    """下载任务的处理结果，任务完成后才能下载"""
+    job = job_store.get_job(job_id)
+    if job is None:
+        return json({"error": "任务不存在"}, status=404)
+    if job["status"] != JOB_DONE:
+        return json({"error": "任务尚未完成", "status": job["status"]}, status=409)
+
+    await send_zip(request, job["output_dir"], f"results-{job_id}.zip")
 
 if __name__ == '__main__':
     cpu_count = int(os.getenv('WORKER_COUNT', '1'))
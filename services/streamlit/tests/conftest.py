@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+
+# config.py 在导入时读取环境变量，测试中的持久化文件全部放到临时目录，共享的缓存和限流默认禁用
+_tmp_dir = tempfile.mkdtemp(prefix="libersonora-test-")
+os.environ.update({
+    "LLM_CACHE_PATH": "",
+    "RATE_LIMIT_PATH": "",
+    "TRANSLATION_MEMORY_PATH": "",
+    "ARTIFACT_DIR": "",
+    "JOB_STORE_PATH": os.path.join(_tmp_dir, "jobs.db"),
+    "API_JOB_DIR": os.path.join(_tmp_dir, "api_jobs"),
+    "UPLOAD_SPOOL_DIR": os.path.join(_tmp_dir, "uploads"),
+    "SHARED_TMP_DIR": os.path.join(_tmp_dir, "tmp"),
+})
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -0,0 +1,131 @@
+import asyncio
+import io
+import json
+import os
+import time
+import zipfile
+
+import pytest
+
+import server
+from config import global_config
+from packages.jobs import JobStore, JOB_DONE
+
+BOUNDARY = "api-job-test"
+
+
+class FakeStream:
+    def __init__(self, body: bytes):
+        self.chunks = [body[i:i + 1024] for i in range(0, len(body), 1024)]
+
+    async def read(self):
+        return self.chunks.pop(0) if self.chunks else None
+
+
+class FakeResponse:
+    def __init__(self):
+        self.chunks = []
+
+    async def send(self, chunk):
+        self.chunks.append(chunk)
+
+    async def eof(self):
+        pass
+
+
+class FakeRequest:
+    def __init__(self, body: bytes = b""):
+        self.headers = {"content-type": f"multipart/form-data; boundary={BOUNDARY}", "content-length": str(len(body))}
+        self.stream = FakeStream(body)
+        self.response = FakeResponse()
+
+    async def respond(self, content_type=None, headers=None):
+        return self.response
+
+
+def multipart(config: dict, files: dict) -> bytes:
+    parts = [(f'name="config"', json.dumps(config).encode("utf-8"))]
+    parts += [(f'name="files"; filename="{name}"', data) for name, data in files.items()]
+    body = b"".join(f"--{BOUNDARY}\r\nContent-Disposition: form-data; {disposition}\r\n\r\n".encode("utf-8") + data + b"\r\n" for disposition, data in parts)
+    return body + f"--{BOUNDARY}--\r\n".encode("latin-1")
+
+
+def body(response) -> dict:
+    return json.loads(response.body)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    started = []
+    monkeypatch.setattr(server, "job_store", store)
+    monkeypatch.setattr(server, "start_job_workers", started.append)
+    monkeypatch.setattr(global_config, "api_job_dir", str(tmp_path / "api_jobs"))
+    store.started = started
+    return store
+
+
+CONFIG = {"translate": {"openai": {"openai_url": "https://api.openai.com", "openai_key": "sk-secret", "model": "gpt-4o", "use_ollama": False}}}
+
+
+def submit(files: dict, config: dict = None) -> dict:
+    response = asyncio.run(server.submit_job(FakeRequest(multipart(config or CONFIG, files))))
+    assert response.status == 202
+    return body(response)
+
+
+def test_submit_poll_and_fetch_result(store):
+    job_id = submit({"第一章.mp3": b"audio-1", "第二章.mp3": b"audio-2"})["job_id"]
+    assert store.started == [job_id]
+    job = store.get_job(job_id)
+    assert sorted(os.listdir(job["input_dir"])) == ["第一章.mp3", "第二章.mp3"]
+
+    status = body(asyncio.run(server.get_job(None, job_id)))
+    assert status["total"] == 2
+    assert [file["name"] for file in status["file_details"]] == ["第一章.mp3", "第二章.mp3"]
+    assert "sk-secret" not in json.dumps(status)
+    assert asyncio.run(server.get_job_result(FakeRequest(), job_id)).status == 409
+
+    os.makedirs(job["output_dir"])
+    with open(os.path.join(job["output_dir"], "第一章.srt"), "w", encoding="utf-8") as f:
+        f.write("字幕")
+    for file in store.claim_files(job_id, "worker", limit=2):
+        store.complete_file(job_id, file["idx"], file["path"], 1.0)
+    assert store.get_job(job_id)["status"] == JOB_DONE
+
+    request = FakeRequest()
+    assert asyncio.run(server.get_job_result(request, job_id)) is None
+    with zipfile.ZipFile(io.BytesIO(b"".join(request.response.chunks))) as zf:
+        assert zf.read("第一章.srt").decode("utf-8") == "字幕"
+
+
+def test_unknown_job_and_bad_submissions(store):
+    assert asyncio.run(server.get_job(None, "missing")).status == 404
+    assert asyncio.run(server.get_job_result(FakeRequest(), "missing")).status == 404
+    assert asyncio.run(server.submit_job(FakeRequest(multipart({}, {})))).status == 400
+    # 失败的提交不留下目录
+    assert os.listdir(global_config.api_job_dir) == []
+    assert store.started == []
+
+
+def test_sweep_removes_expired_jobs_and_orphans_only(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(global_config, "api_job_retention_hours", 1)
+    expired = submit({"a.mp3": b"a"})["job_id"]
+    fresh = submit({"b.mp3": b"b"})["job_id"]
+    running = submit({"c.mp3": b"c"})["job_id"]
+    page_job = store.create_job({}, str(tmp_path / "page" / "input"), str(tmp_path / "page" / "output"), [])
+    old = time.time() - 7200
+    for job_id in (expired, fresh, page_job):
+        store.cancel_job(job_id)
+    conn = store._connect()
+    conn.execute("UPDATE jobs SET updated_at = ? WHERE id IN (?, ?, ?)", (old, expired, running, page_job))
+    conn.commit()
+    orphan = os.path.join(global_config.api_job_dir, "orphan")
+    os.makedirs(orphan)
+    os.utime(orphan, (old, old))
+    os.makedirs(os.path.join(global_config.api_job_dir, "uploading"))
+
+    assert server.sweep_api_jobs() == 2
+    assert sorted(os.listdir(global_config.api_job_dir)) == sorted([fresh, running, "uploading"])
+    assert store.get_job(expired) is None
+    assert store.get_job(page_job) is not None
@@ -0,0 +1,63 @@
+import asyncio
+import os
+import time
+
+from packages.artifacts import ArtifactStore, BatchJournal, artifact_key
+
+
+def test_journal_round_trip_ignores_truncated_last_line(tmp_path):
+    journal = BatchJournal(str(tmp_path / "journals" / "key.jsonl"))
+    journal.record("0:8", [["原句", "改句"]])
+    journal.record("8:8", {"你好": "hello"})
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"batch": "16:8", "resu')
+    assert journal.load() == {"0:8": [["原句", "改句"]], "8:8": {"你好": "hello"}}
+    journal.remove()
+    assert journal.load() == {}
+
+
+def test_journal_works_without_artifact_cache(tmp_path):
+    store = ArtifactStore("", 0, str(tmp_path / "journals"))
+    assert not store.enabled
+    journal = store.journal(artifact_key("translate", "audio"))
+    journal.record("batch", {"a": "b"})
+    assert store.journal(artifact_key("translate", "audio")).load() == {"batch": {"a": "b"}}
+    assert ArtifactStore("", 0, "").journal("key").load() == {}
+
+
+def test_evict_skips_journals_and_temp_files(tmp_path):
+    root = tmp_path / "artifacts"
+    store = ArtifactStore(str(root), 1000, str(root / "journals"))
+    store.put("aa" + "0" * 62, b"x" * 600)
+    time.sleep(0.01)
+    store.journal("k").record("batch", "y" * 2000)
+    (root / "aa" / "partial.tmp").write_bytes(b"z" * 2000)
+    store.put("bb" + "0" * 62, b"x" * 600)
+    store._evict()
+
+    assert not store.exists("aa" + "0" * 62)
+    assert store.exists("bb" + "0" * 62)
+    assert (root / "aa" / "partial.tmp").exists()
+    assert os.path.exists(store.journal("k").path)
+
+
+def test_get_or_compute_runs_once_and_returns_independent_copies(tmp_path):
+    store = ArtifactStore(str(tmp_path / "artifacts"), 10 ** 9)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return ["一", "二"]
+
+    async def run():
+        return await asyncio.gather(*[store.get_or_compute("k" * 64, compute, encoding="json") for _ in range(3)])
+
+    results = asyncio.run(run())
+    assert calls == [1]
+    assert results == [["一", "二"]] * 3
+    results[1].append("三")
+    assert results[2] == ["一", "二"]
+    # 之后的调用直接读取保存的产物
+    assert asyncio.run(store.get_or_compute("k" * 64, compute, encoding="json")) == ["一", "二"]
+    assert calls == [1]
@@ -0,0 +1,88 @@
+import asyncio
+import wave
+from io import BytesIO
+
+import numpy as np
+import pytest
+
+from packages import audio
+
+RATE = 16000
+
+
+def make_wav(segments) -> bytes:
+    """按 (秒数, 是否有声音) 生成 16 位单声道 WAV"""
+    parts = []
+    for seconds, loud in segments:
+        count = int(seconds * RATE)
+        parts.append((np.sin(np.arange(count) * 0.1) * 10000).astype(np.int16) if loud else np.zeros(count, dtype=np.int16))
+    buffer = BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        wav.writeframes(np.concatenate(parts).tobytes())
+    return buffer.getvalue()
+
+
+def test_split_cuts_inside_silence():
+    # 目标切分点在 60 秒，静音位于 55~57 秒
+    wav_bytes = make_wav([(55, True), (2, False), (50, True)])
+    shards = audio.split_wav_on_silence(wav_bytes, shard_minutes=1, search_seconds=10)
+    assert len(shards) == 2
+    assert 55000 <= shards[1][0] <= 57000
+    assert shards[0][0] == 0
+
+
+def test_short_audio_is_not_split():
+    wav_bytes = make_wav([(5, True)])
+    assert audio.split_wav_on_silence(wav_bytes, shard_minutes=1) == [(0, wav_bytes)]
+
+
+def test_sharded_offsets_timestamps_and_skips_silent_shards(monkeypatch):
+    wav_bytes = make_wav([(55, True), (2, False), (40, False)])
+    calls = []
+
+    async def speech_to_text(shard_bytes, hotwords=None, spk_conf=False, use_path=False, allow_empty=False):
+        calls.append(allow_empty)
+        with wave.open(BytesIO(shard_bytes), "rb") as wav:
+            silent = not np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16).any()
+        return [] if silent else [{"text": "你好", "start": 100, "end": 200, "spk": 0}]
+
+    monkeypatch.setattr(audio, "speech_to_text", speech_to_text)
+    sentences = asyncio.run(audio.speech_to_text_sharded(wav_bytes, shard_minutes=0.5, concurrency=2))
+
+    # 静音分片返回空列表，不需要解析错误信息
+    assert calls and all(calls)
+    assert [sentence["start"] for sentence in sentences] == sorted(sentence["start"] for sentence in sentences)
+    assert sentences[0] == {"text": "你好", "start": 100, "end": 200, "spk": 0}
+    assert all(sentence["start"] >= 100 for sentence in sentences)
+    assert len(sentences) < len(calls)
+
+
+def test_sharded_raises_when_every_shard_is_empty(monkeypatch):
+    async def speech_to_text(*args, **kwargs):
+        return []
+
+    monkeypatch.setattr(audio, "speech_to_text", speech_to_text)
+    with pytest.raises(Exception, match="语音识别结果为空"):
+        asyncio.run(audio.speech_to_text_sharded(make_wav([(70, False)]), shard_minutes=0.5))
+
+
+def test_sharded_propagates_service_errors(monkeypatch):
+    async def speech_to_text(*args, **kwargs):
+        raise Exception("语音识别失败: 服务不可用")
+
+    monkeypatch.setattr(audio, "speech_to_text", speech_to_text)
+    with pytest.raises(Exception, match="服务不可用"):
+        asyncio.run(audio.speech_to_text_sharded(make_wav([(70, True)]), shard_minutes=0.5))
+
+
+def test_empty_result_only_allowed_when_requested(monkeypatch):
+    async def request_with_retry(url, data, files):
+        return {"code": 0, "message": "识别成功", "data": []}
+
+    monkeypatch.setattr(audio, "_request_with_retry", request_with_retry)
+    assert asyncio.run(audio.speech_to_text(b"RIFF", allow_empty=True)) == []
+    with pytest.raises(Exception, match="语音识别结果为空"):
+        asyncio.run(audio.speech_to_text(b"RIFF"))
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+
+from packages.concurrency import AdaptiveLimiter
+
+
+def test_limit_grows_additively_while_latency_is_stable():
+    limiter = AdaptiveLimiter(initial_limit=2, max_limit=4)
+    for _ in range(2):
+        limiter.on_success(0.1)
+    assert 2.8 < limiter.limit <= 3  # 一个窗口（2 个请求）成功后约加 1
+    for _ in range(20):
+        limiter.on_success(0.1)
+    assert limiter.limit == 4
+
+
+def test_limit_does_not_grow_when_latency_degrades():
+    limiter = AdaptiveLimiter(initial_limit=2, latency_tolerance=2.0)
+    limiter.on_success(0.1)
+    limit = limiter.limit
+    limiter.on_success(1.0)
+    assert limiter.limit == limit
+
+
+def test_failures_of_one_window_halve_the_limit_once():
+    limiter = AdaptiveLimiter(initial_limit=16, min_limit=1)
+    limiter._latencies.extend([10.0] * 5)
+    for _ in range(5):
+        limiter.on_failure()
+    assert limiter.limit == 8
+    assert limiter.failures == 5
+
+    limiter._last_decrease = 0.0
+    for _ in range(10):
+        limiter.on_failure()
+        limiter._last_decrease = 0.0
+    assert limiter.limit == 1
+
+
+def test_slots_never_exceed_limit():
+    limiter = AdaptiveLimiter(initial_limit=3)
+    active = max_active = 0
+
+    async def request():
+        nonlocal active, max_active
+        async with limiter.slot():
+            active += 1
+            max_active = max(max_active, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    async def main():
+        await asyncio.gather(*[request() for _ in range(12)])
+
+    asyncio.run(main())
+    assert max_active == 3
+    assert limiter.inflight == 0
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    limiter = AdaptiveLimiter(initial_limit=1)
+
+    async def main():
+        async with limiter.slot():
+            waiter = asyncio.create_task(limiter._acquire())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+        # 取消的等待者不占用名额
+        await asyncio.wait_for(limiter._acquire(), 1)
+        limiter._release()
+
+    asyncio.run(main())
+    assert limiter.inflight == 0
+    assert not limiter._waiters
+
+
+def test_slots_are_shared_across_event_loops_in_different_threads():
+    # streamlit 的每个会话有自己的线程和事件循环
+    limiter = AdaptiveLimiter(initial_limit=2)
+    lock = threading.Lock()
+    active = max_active = 0
+
+    async def session():
+        nonlocal active, max_active
+        for _ in range(3):
+            async with limiter.slot():
+                with lock:
+                    active += 1
+                    max_active = max(max_active, active)
+                await asyncio.sleep(0.01)
+                with lock:
+                    active -= 1
+
+    threads = [threading.Thread(target=asyncio.run, args=(session(),)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert max_active == 2
+    assert limiter.inflight == 0
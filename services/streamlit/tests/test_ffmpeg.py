@@ -0,0 +1,74 @@
+import asyncio
+import os
+import stat
+import sys
+import time
+import wave
+from io import BytesIO
+
+import pytest
+
+from packages import audio
+
+# 测试环境不一定安装 ffmpeg，用一个原样转发输入的脚本代替，只验证管道的读写、错误和取消处理
+FAKE_FFMPEG = f"""#!{sys.executable}
+import shutil, sys, time
+args = sys.argv[1:]
+source = args[args.index("-i") + 1]
+stream = sys.stdin.buffer if source == "pipe:0" else open(source, "rb")
+head = stream.read(4)
+if head == b"BAD!":
+    sys.stderr.write("Invalid data found when processing input")
+    sys.exit(1)
+if head == b"SLOW":
+    time.sleep(30)
+sys.stdout.buffer.write(head)
+shutil.copyfileobj(stream, sys.stdout.buffer)
+"""
+
+
+@pytest.fixture(autouse=True)
+def fake_ffmpeg(tmp_path, monkeypatch):
+    path = tmp_path / "ffmpeg"
+    path.write_text(FAKE_FFMPEG)
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    return path
+
+
+def test_large_input_streams_through_pipes_without_deadlock():
+    # 远大于管道缓冲区，输入和输出必须同时读写
+    data = os.urandom(8 * 1024 * 1024)
+    assert asyncio.run(audio._run_ffmpeg(data, [], chunk_size=64 * 1024)) == data
+
+
+def test_input_path_is_read_by_ffmpeg(tmp_path):
+    path = tmp_path / "input.mp3"
+    path.write_bytes(b"audio-from-file")
+    assert asyncio.run(audio._run_ffmpeg(None, [], input_path=str(path))) == b"audio-from-file"
+
+
+def test_early_exit_reports_stderr():
+    with pytest.raises(Exception, match="Invalid data found"):
+        asyncio.run(audio._run_ffmpeg(b"BAD!" + b"\x00" * (4 * 1024 * 1024), []))
+
+
+def test_cancel_kills_ffmpeg():
+    async def main():
+        task = asyncio.create_task(audio._run_ffmpeg(b"SLOW", []))
+        await asyncio.sleep(0.5)
+        task.cancel()
+        start = time.monotonic()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return time.monotonic() - start
+
+    assert asyncio.run(main()) < 5
+
+
+def test_convert_to_wav_adds_header_for_requested_rate():
+    pcm = b"\x01\x00\x02\x00" * 1000
+    wav_bytes = asyncio.run(audio.convert_to_wav(pcm, sample_rate=16000))
+    with wave.open(BytesIO(wav_bytes)) as wav:
+        assert (wav.getframerate(), wav.getnchannels(), wav.getsampwidth()) == (16000, 1, 2)
+        assert wav.readframes(wav.getnframes()) == pcm
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from packages import audio
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    async def __aenter__(self):
+        if isinstance(self.body, Exception):
+            raise self.body
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def json(self):
+        return self.body
+
+
+class FakeSession:
+    def __init__(self, bodies: dict):
+        self.bodies = bodies
+        self.calls = []
+
+    def get(self, url, timeout=None):
+        self.calls.append(url)
+        return FakeResponse(self.bodies[url])
+
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setattr(audio, "_input_formats", {})
+    monkeypatch.setattr(audio, "_input_format_failures", {})
+    session = FakeSession({
+        "http://funasr/": {"input_format": {"sample_rate": 16000, "channels": 1}},
+        "http://clear-voice/": {"input_format": {
+            "MossFormer2_SE_48K": {"sample_rate": 48000},
+            "FRCRN_SE_16K": {"sample_rate": 16000},
+        }},
+        "http://old-service/": {"status": "ok"},
+        "http://down/": ConnectionError("connection refused"),
+    })
+    monkeypatch.setattr(audio, "get_session", lambda: session)
+    return session
+
+
+def test_sample_rate_is_queried_once_per_service(session):
+    assert asyncio.run(audio.get_input_sample_rate("http://funasr")) == 16000
+    assert asyncio.run(audio.get_input_sample_rate("http://funasr")) == 16000
+    assert session.calls == ["http://funasr/"]
+
+
+def test_sample_rate_is_per_model(session):
+    assert asyncio.run(audio.get_input_sample_rate("http://clear-voice", "MossFormer2_SE_48K")) == 48000
+    assert asyncio.run(audio.get_input_sample_rate("http://clear-voice", "FRCRN_SE_16K")) == 16000
+    assert asyncio.run(audio.get_input_sample_rate("http://clear-voice", "unknown")) == audio.DEFAULT_SAMPLE_RATE
+
+
+def test_services_without_input_format_use_default(session):
+    assert asyncio.run(audio.get_input_sample_rate("http://old-service")) == audio.DEFAULT_SAMPLE_RATE
+
+
+def test_failed_query_is_not_retried_until_backoff_expires(session):
+    assert asyncio.run(audio.get_input_sample_rate("http://down")) == audio.DEFAULT_SAMPLE_RATE
+    assert asyncio.run(audio.get_input_sample_rate("http://down")) == audio.DEFAULT_SAMPLE_RATE
+    assert session.calls == ["http://down/"]
+
+    audio._input_format_failures["http://down"] = 0
+    asyncio.run(audio.get_input_sample_rate("http://down"))
+    assert len(session.calls) == 2
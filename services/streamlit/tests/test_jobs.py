@@ -0,0 +1,127 @@
+import socket
+import subprocess
+import threading
+import time
+
+import pytest
+
+from packages import jobs
+from packages.jobs import JobStore, FILE_DONE, FILE_FAILED, FILE_PENDING, FILE_RUNNING, JOB_DONE, JOB_RUNNING
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.db"), max_attempts=2)
+
+
+def create(store, count: int) -> str:
+    return store.create_job({}, "/in", "/out", [f"/in/{idx}.mp3" for idx in range(count)])
+
+
+def statuses(store, job_id: str) -> list:
+    return [file["status"] for file in store.list_files(job_id)]
+
+
+def exited_worker_id() -> str:
+    """已退出并被回收的进程"""
+    process = subprocess.Popen(["true"])
+    start_time = jobs._process_start_time(process.pid)
+    process.wait()
+    return f"{socket.gethostname()}:{process.pid}:{start_time}"
+
+
+def test_two_workers_claim_each_file_exactly_once(store):
+    job_id = create(store, 40)
+    # 两个 JobStore 各自持有 SQLite 连接，相当于两个 worker 进程
+    workers = [JobStore(store.path), JobStore(store.path)]
+    claimed = [[], []]
+
+    def work(n: int):
+        while True:
+            files = workers[n].claim_files(job_id, f"worker-{n}", limit=3)
+            if not files:
+                return
+            claimed[n].extend(file["idx"] for file in files)
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    all_claimed = claimed[0] + claimed[1]
+    assert sorted(all_claimed) == list(range(40))
+    assert statuses(store, job_id) == [FILE_RUNNING] * 40
+    assert store.get_job(job_id)["status"] == JOB_RUNNING
+
+
+def test_failed_file_is_requeued_then_fails_permanently(store):
+    job_id = create(store, 1)
+
+    first = store.claim_files(job_id, "worker")
+    assert first[0]["attempts"] == 1
+    store.fail_file(job_id, 0, "超时", 1.0)
+    # 未达到最大尝试次数，重新放回队列
+    assert statuses(store, job_id) == [FILE_PENDING]
+
+    second = store.claim_files(job_id, "worker")
+    assert second[0]["attempts"] == 2
+    store.fail_file(job_id, 0, "超时", 1.0)
+    assert statuses(store, job_id) == [FILE_FAILED]
+    assert store.claim_files(job_id, "worker") == []
+
+    job = store.get_job(job_id)
+    assert job["status"] == JOB_DONE
+    assert job["files"][FILE_FAILED] == 1
+
+
+def test_recover_requeues_files_of_dead_and_zombie_workers(store):
+    job_id = create(store, 3)
+    store.claim_files(job_id, exited_worker_id())
+    # 已退出但尚未被回收的子进程
+    zombie = subprocess.Popen(["true"])
+    time.sleep(0.2)
+    try:
+        store.claim_files(job_id, f"{socket.gethostname()}:{zombie.pid}:{jobs._process_start_time(zombie.pid)}")
+        store.claim_files(job_id, jobs.current_worker_id())
+
+        assert store.recover(job_id) == 2
+        assert statuses(store, job_id) == [FILE_PENDING, FILE_PENDING, FILE_RUNNING]
+    finally:
+        zombie.wait()
+
+
+def test_pid_reuse_is_not_mistaken_for_the_original_worker(store):
+    job_id = create(store, 1)
+    host, pid, _ = jobs.current_worker_id().rsplit(":", 2)
+    store.claim_files(job_id, f"{host}:{pid}:0")
+    assert store.recover(job_id) == 1
+
+
+def test_resume_skips_done_files(store, monkeypatch):
+    job_id = create(store, 4)
+    for file in store.claim_files(job_id, "worker", limit=2):
+        store.complete_file(job_id, file["idx"], f"/out/{file['idx']}.mp3", 1.0)
+    # worker 在处理第 3 个文件时中断
+    store.claim_files(job_id, exited_worker_id())
+
+    started = []
+    monkeypatch.setattr(jobs, "job_store", store)
+    monkeypatch.setattr(jobs, "start_job_workers", lambda job_id: started.append(job_id))
+    assert jobs.resume_jobs() == [job_id]
+    assert started == [job_id]
+
+    remaining = store.claim_files(job_id, "worker", limit=10)
+    assert [file["idx"] for file in remaining] == [2, 3]
+    assert statuses(store, job_id)[:2] == [FILE_DONE, FILE_DONE]
+
+
+def test_resume_leaves_jobs_with_live_workers_alone(store, monkeypatch):
+    job_id = create(store, 2)
+    store.claim_files(job_id, jobs.current_worker_id())
+
+    started = []
+    monkeypatch.setattr(jobs, "job_store", store)
+    monkeypatch.setattr(jobs, "start_job_workers", lambda job_id: started.append(job_id))
+    assert jobs.resume_jobs() == []
+    assert started == []
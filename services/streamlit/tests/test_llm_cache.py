@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from packages import openai
+from packages.llm_cache import CompletionCache
+
+
+def test_key_depends_on_model_messages_temperature_and_format():
+    messages = [{"role": "user", "content": "你好"}]
+    key = CompletionCache.make_key("m", messages, 0.7)
+    assert key == CompletionCache.make_key("m", [{"content": "你好", "role": "user"}], 0.7)
+    assert len({
+        key,
+        CompletionCache.make_key("other", messages, 0.7),
+        CompletionCache.make_key("m", messages, 0.2),
+        CompletionCache.make_key("m", messages, 0.7, {"type": "json_object"}),
+    }) == 4
+
+
+def test_get_set_and_expiry(tmp_path):
+    cache = CompletionCache(str(tmp_path / "cache.db"))
+    assert cache.get("k") is None
+    cache.set("k", "回复")
+    assert cache.get("k") == "回复"
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+    expired = CompletionCache(str(tmp_path / "cache.db"), max_age_days=0)
+    assert expired.get("k") is None
+
+
+def test_evicts_least_recently_accessed_entries(tmp_path):
+    cache = CompletionCache(str(tmp_path / "cache.db"), max_entries=2)
+    cache.evict_every = 3
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+
+
+def test_disabled_without_path():
+    cache = CompletionCache("")
+    cache.set("k", "v")
+    assert cache.get("k") is None
+
+
+@pytest.fixture
+def handler(tmp_path, monkeypatch):
+    monkeypatch.setattr(openai, "completion_cache", CompletionCache(str(tmp_path / "cache.db")))
+    handler = openai.OpenAIHandler("m", "http://cache-test", "k", retry_delay=0)
+    handler.calls = 0
+
+    async def post(endpoint, data):
+        handler.calls += 1
+        return {"choices": [{"message": {"content": f"回复{handler.calls}"}}]}
+
+    monkeypatch.setattr(handler, "_post", post)
+    return handler
+
+
+def test_repeated_request_is_served_from_cache(handler):
+    messages = [{"role": "user", "content": "你好"}]
+    assert asyncio.run(handler.request(messages)) == "回复1"
+    assert asyncio.run(handler.request(messages)) == "回复1"
+    assert handler.calls == 1
+    assert asyncio.run(handler.request(messages, use_cache=False)) == "回复2"
+
+
+def test_cached_reply_failing_validation_is_refetched(handler):
+    messages = [{"role": "user", "content": "你好"}]
+    asyncio.run(handler.request(messages))
+
+    def validator(content):
+        if content == "回复1":
+            raise ValueError("旧回复不合格")
+
+    assert asyncio.run(handler.request(messages, validator_callback=validator)) == "回复2"
+    # 新回复覆盖缓存
+    assert asyncio.run(handler.request(messages)) == "回复2"
+    assert handler.calls == 2
@@ -0,0 +1,76 @@
+import asyncio
+import io
+import os
+import zipfile
+
+import pytest
+
+import server
+from config import global_config
+
+
+class FakeResponse:
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+
+    async def send(self, chunk):
+        self.chunks.append(chunk)
+
+    async def eof(self):
+        self.finished = True
+
+
+class FakeRequest:
+    def __init__(self, path):
+        self.args = {"path": path}
+        self.response = FakeResponse()
+        self.headers = None
+
+    async def respond(self, content_type=None, headers=None):
+        self.headers = headers
+        return self.response
+
+
+@pytest.fixture
+def data_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(global_config, "data_root", str(tmp_path))
+    output_dir = tmp_path / "book" / "output"
+    output_dir.mkdir(parents=True)
+    (output_dir / "01.mp3").write_bytes(b"\x00" * 5000)
+    (output_dir / "01.lrc").write_text("[00:00.00]第一句", encoding="utf-8")
+    (tmp_path / ".libersonora").mkdir()
+    return tmp_path
+
+
+def test_resolve_output_dir_only_allows_dirs_under_data_root(data_root, tmp_path_factory):
+    output_dir = data_root / "book" / "output"
+    assert server.resolve_output_dir(str(output_dir)) == os.path.realpath(output_dir)
+
+    outside = tmp_path_factory.mktemp("outside")
+    for path in [str(outside), str(data_root / "book" / ".." / ".."), str(data_root / ".libersonora"), str(data_root / "missing")]:
+        with pytest.raises(ValueError):
+            server.resolve_output_dir(path)
+
+    # 符号链接指向根目录之外时同样拒绝
+    os.symlink(outside, data_root / "link")
+    with pytest.raises(ValueError):
+        server.resolve_output_dir(str(data_root / "link"))
+
+
+def test_download_output_dir_streams_zip(data_root):
+    request = FakeRequest(str(data_root / "book" / "output"))
+    assert asyncio.run(server.download_output_dir(request)) is None
+
+    assert request.response.finished
+    assert len(request.response.chunks) > 1
+    with zipfile.ZipFile(io.BytesIO(b"".join(request.response.chunks))) as zf:
+        assert sorted(zf.namelist()) == ["01.lrc", "01.mp3"]
+        assert zf.read("01.lrc").decode("utf-8") == "[00:00.00]第一句"
+
+
+def test_download_output_dir_rejects_internal_dir(data_root):
+    request = FakeRequest(str(data_root / ".libersonora"))
+    response = asyncio.run(server.download_output_dir(request))
+    assert response.status == 400
+    assert request.headers is None
@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+from packages.pipeline import Pipeline
+
+
+def make_stage(log, name, seconds=0.0, fail_on=None):
+    async def stage(item):
+        log.append((name, item["index"], "start"))
+        await asyncio.sleep(seconds)
+        if item["index"] == fail_on:
+            raise RuntimeError(f"{name} 失败")
+        item.setdefault("done", []).append(name)
+        log.append((name, item["index"], "end"))
+    return stage
+
+
+def test_stages_overlap_and_order_is_preserved():
+    log = []
+    pipeline = Pipeline([
+        ("asr", 1, make_stage(log, "asr", 0.05)),
+        ("llm", 1, make_stage(log, "llm", 0.05)),
+    ])
+    start = time.monotonic()
+    items = asyncio.run(pipeline.run([{"index": i} for i in range(4)]))
+    elapsed = time.monotonic() - start
+
+    assert [item["index"] for item in items] == [0, 1, 2, 3]
+    assert all(item["done"] == ["asr", "llm"] for item in items)
+    # 第 N 个文件做大模型处理时第 N+1 个文件同时识别，串行需要 0.4 秒
+    assert elapsed < 0.35
+    assert log.index(("asr", 1, "start")) < log.index(("llm", 0, "end"))
+    stats = pipeline.stats()
+    assert stats["asr"]["processed"] == stats["llm"]["processed"] == 4
+
+
+def test_failed_item_skips_remaining_stages():
+    log = []
+    done = []
+    pipeline = Pipeline([
+        ("asr", 2, make_stage(log, "asr", fail_on=1)),
+        ("llm", 1, make_stage(log, "llm")),
+    ])
+    items = asyncio.run(pipeline.run([{"index": i} for i in range(3)], on_done=done.append))
+
+    assert isinstance(items[1]["error"], RuntimeError)
+    assert items[1]["failed_stage"] == "asr"
+    assert ("llm", 1, "start") not in log
+    assert [item.get("done") for item in items] == [["asr", "llm"], None, ["asr", "llm"]]
+    assert sorted(item["index"] for item in done) == [0, 1, 2]
+    assert pipeline.stats()["asr"]["failed"] == 1
+
+
+def test_bounded_queues_limit_items_in_memory():
+    in_flight = max_in_flight = 0
+
+    async def items():
+        nonlocal in_flight, max_in_flight
+        for i in range(10):
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            yield {"index": i}
+
+    async def slow(item):
+        await asyncio.sleep(0.01)
+
+    def on_done(item):
+        nonlocal in_flight
+        in_flight -= 1
+
+    pipeline = Pipeline([("decode", 1, slow), ("llm", 1, slow)], queue_size=1)
+    asyncio.run(pipeline.run(items(), on_done=on_done))
+    # 每个阶段的队列各 1 个、worker 各 1 个，加上正在放入队列的 1 个
+    assert max_in_flight <= 5
@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+from config import global_config
+from packages.llm import getRateLimit
+from packages.rate_limit import RateLimiter
+
+
+def timed_acquire(limiter, *args) -> float:
+    start = time.monotonic()
+    asyncio.run(limiter.acquire(*args))
+    return time.monotonic() - start
+
+
+def test_unlimited_bucket_skips_sqlite_until_blocked(tmp_path, monkeypatch):
+    limiter = RateLimiter(str(tmp_path / "rate_limit.db"))
+    calls = []
+    blocked_wait = limiter._blocked_wait
+    monkeypatch.setattr(limiter, "_blocked_wait", lambda key: calls.append(key) or blocked_wait(key))
+
+    for _ in range(3):
+        asyncio.run(limiter.acquire("ollama", 0, 0))
+    assert calls == []
+
+    limiter.block("ollama", 0.2)
+    assert timed_acquire(limiter, "ollama", 0, 0) >= 0.15
+    assert calls == ["ollama"]
+
+
+def test_block_is_honored_when_limiter_is_disabled():
+    limiter = RateLimiter("")
+    limiter.block("custom", 0.2)
+    assert timed_acquire(limiter, "custom", 0, 0) >= 0.15
+    assert timed_acquire(limiter, "custom", 0, 0) < 0.05
+
+
+def test_block_is_shared_across_limiters(tmp_path):
+    path = str(tmp_path / "rate_limit.db")
+    first, second = RateLimiter(path), RateLimiter(path)
+    first.block("openai", 0.2)
+    # 另一个进程在限流的桶上等待暂停结束
+    assert timed_acquire(second, "openai", 60, 0) >= 0.15
+
+
+def test_rpm_bucket_waits_when_empty(tmp_path):
+    limiter = RateLimiter(str(tmp_path / "rate_limit.db"))
+    # 每分钟 600 次即每 0.1 秒补充一次，桶容量耗尽后需要等待
+    for _ in range(600):
+        assert limiter._try_acquire("deepseek", 600, 0, 0) == 0
+    assert 0 < limiter._try_acquire("deepseek", 600, 0, 0) <= 0.1
+
+
+def test_provider_limits_come_from_config():
+    assert getRateLimit("https://api.openai.com/") == (global_config.openai_rpm, global_config.openai_tpm)
+    assert getRateLimit("https://api.deepseek.com") == (global_config.deepseek_rpm, global_config.deepseek_tpm)
+    assert getRateLimit("http://unknown") == (0, 0)
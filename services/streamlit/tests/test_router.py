@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from packages import openai
+from packages.router import EndpointRouter
+
+
+@pytest.fixture
+def router(monkeypatch):
+    router = EndpointRouter(eject_after=2, eject_seconds=10.0, max_eject_seconds=30.0)
+    monkeypatch.setattr(openai, "endpoint_router", router)
+    return router
+
+
+def test_endpoints_with_same_url_key_and_model_are_shared(router):
+    a = router.endpoint("http://a/", "key")
+    assert router.endpoint("http://a", "key") is a
+    assert router.endpoint("http://a", "key", model="other") is not a
+    assert router.endpoint("http://a", "other-key") is not a
+
+
+def test_least_outstanding_and_config_order_win(router):
+    a, b = router.endpoint("http://a", "k"), router.endpoint("http://b", "k")
+    assert router.acquire([a, b]) is a
+    assert router.acquire([a, b]) is b
+    assert router.acquire([a, b]) is a
+    assert (a.outstanding, b.outstanding) == (2, 1)
+
+
+def test_slow_endpoint_gets_fewer_requests(router):
+    fast, slow = router.endpoint("http://fast", "k"), router.endpoint("http://slow", "k")
+    for endpoint, latency in [(fast, 0.1), (slow, 1.0)]:
+        router.acquire([endpoint])
+        router.on_success(endpoint, latency)
+    # 在途请求数乘以延迟，延迟高 10 倍的接口约分到十分之一的请求
+    chosen = [router.acquire([slow, fast]) for _ in range(12)]
+    assert chosen.count(slow) == 1
+
+
+def test_consecutive_failures_eject_with_exponential_backoff(router):
+    a, b = router.endpoint("http://a", "k"), router.endpoint("http://b", "k")
+    for _ in range(2):
+        router.acquire([a])
+        router.on_failure(a)
+    first = a.ejected_until
+    assert first > 0
+    assert router.acquire([a, b]) is b
+
+    # 摘除期间在途请求的失败不延长摘除时间
+    router.acquire([a])
+    router.on_failure(a)
+    assert a.ejected_until == first
+
+    a.ejected_until = 0.0
+    for _ in range(2):
+        router.acquire([a])
+        router.on_failure(a)
+    assert a.ejections == 2
+    assert a.ejected_until - first > 9  # 第二次摘除 20 秒
+
+    router.acquire([a])
+    router.on_success(a, 0.1)
+    assert a.ejections == 0
+
+
+def test_all_ejected_still_routes_to_earliest_recovery(router):
+    a, b = router.endpoint("http://a", "k"), router.endpoint("http://b", "k")
+    a.ejected_until, b.ejected_until = 1e12, 1e11
+    assert router.acquire([a, b]) is b
+
+
+def test_request_fails_over_to_next_endpoint(router, monkeypatch):
+    handler = openai.OpenAIHandler("m", "http://a", "k", retry_delay=0, endpoints=[{"openai_url": "http://b", "model": "m2"}])
+    calls = []
+
+    async def post(endpoint, data):
+        calls.append(endpoint.openai_url)
+        if endpoint.openai_url == "http://a":
+            raise openai.ServerError("down")
+        return {"choices": [{"message": {"content": "ok"}}]}
+
+    monkeypatch.setattr(handler, "_post", post)
+    assert asyncio.run(handler.request([{"role": "user", "content": "hi"}], use_cache=False)) == "ok"
+    assert calls == ["http://a", "http://b"]
+    a, b = handler._pool
+    assert (a.outstanding, b.outstanding) == (0, 0)
+    assert (a.consecutive_failures, b.consecutive_failures) == (1, 0)
+
+
+def test_cancelled_request_only_releases_outstanding(router, monkeypatch):
+    handler = openai.OpenAIHandler("m", "http://a", "k")
+
+    async def post(endpoint, data):
+        raise asyncio.CancelledError()
+
+    monkeypatch.setattr(handler, "_post", post)
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(handler._route({}, []))
+    endpoint = handler._pool[0]
+    assert (endpoint.outstanding, endpoint.consecutive_failures) == (0, 0)
@@ -0,0 +1,63 @@
+import asyncio
+
+from aiohttp import web
+
+from packages import session as session_module
+from packages.session import close_session, get_session, run_with_session, session_stats
+
+
+async def status(request):
+    return web.json_response({"status": "ok"})
+
+
+async def start_server():
+    app = web.Application()
+    app.router.add_get("/", status)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/"
+
+
+def test_requests_reuse_one_connection():
+    async def main():
+        runner, url = await start_server()
+        before = session_stats()
+        try:
+            for _ in range(5):
+                async with get_session().get(url) as response:
+                    assert (await response.json()) == {"status": "ok"}
+        finally:
+            await runner.cleanup()
+        after = session_stats()
+        return {key: after[key] - before[key] for key in ("requests", "connections_created", "connections_reused")}
+
+    assert asyncio.run(run_with_session(main())) == {"requests": 5, "connections_created": 1, "connections_reused": 4}
+
+
+def test_session_is_shared_per_event_loop():
+    async def main():
+        session = get_session()
+        assert get_session() is session
+        return session
+
+    first = asyncio.run(run_with_session(main()))
+    second = asyncio.run(run_with_session(main()))
+    assert first is not second
+    # run_with_session 结束时关闭会话
+    assert first.closed and second.closed
+
+
+def test_closed_session_is_replaced():
+    async def main():
+        session = get_session()
+        await close_session()
+        assert session.closed
+        replacement = get_session()
+        assert replacement is not session and not replacement.closed
+        await close_session()
+
+    asyncio.run(main())
+    assert not session_module._sessions
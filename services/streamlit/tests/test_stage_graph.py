@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from packages.process import build_llm_stage_graph, run_stage_graph
+
+
+def test_independent_stages_run_concurrently_after_dependencies():
+    events = []
+
+    def node(name, seconds=0.0, fail=False):
+        async def run():
+            events.append(f"{name}:start")
+            await asyncio.sleep(seconds)
+            if fail:
+                raise RuntimeError(name)
+            events.append(f"{name}:end")
+        return run
+
+    graph = {
+        "asr": ([], node("asr", 0.01)),
+        "title": (["asr"], node("title", 0.05)),
+        "translate": (["asr"], node("translate", 0.05)),
+        "save": (["title", "translate"], node("save")),
+    }
+    timings = asyncio.run(run_stage_graph(graph))
+
+    assert events[:2] == ["asr:start", "asr:end"]
+    assert set(events[2:4]) == {"title:start", "translate:start"}
+    assert events[-2:] == ["save:start", "save:end"]
+    assert set(timings) == set(graph)
+
+
+def test_failure_cancels_remaining_stages():
+    events = []
+
+    async def fail():
+        raise RuntimeError("asr 失败")
+
+    async def slow():
+        await asyncio.sleep(1)
+        events.append("slow")
+
+    async def after():
+        events.append("after")
+
+    graph = {"asr": ([], fail), "slow": ([], slow), "save": (["asr"], after)}
+    with pytest.raises(RuntimeError):
+        asyncio.run(run_stage_graph(graph))
+    assert events == []
+
+
+def test_llm_stages_depend_on_correction_only_when_reading_corrected_text():
+    config = {
+        "correct": {"openai": {}},
+        "title": {"generate": True},
+        "translate": {"source": "raw"},
+    }
+    graph = build_llm_stage_graph({}, config, deps=["asr"])
+    assert {name: deps for name, (deps, _) in graph.items()} == {
+        "correct": ["asr"],
+        "title": ["asr", "correct"],
+        "translate": ["asr"],
+    }
+
+    graph = build_llm_stage_graph({}, {"title": {"generate": True, "skip_rename": True}, "translate": {"openai": {}}})
+    assert {name: deps for name, (deps, _) in graph.items()} == {"translate": []}
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from packages import process
+
+
+def llm(model, use_ollama=True):
+    return {"openai": {"openai_url": "http://ollama:11434", "model": model, "use_ollama": use_ollama}}
+
+
+CONFIG = {
+    "correct": llm("qwen"),
+    "title": {"generate": True, **llm("minicpm")},
+    "translate": llm("qwen"),
+}
+
+
+def test_stages_sharing_the_correction_model_run_next_to_it():
+    assert process.order_llm_stages_by_model(CONFIG) == ["correct", "translate", "title"]
+    assert process.has_model_switches(CONFIG)
+    assert not process.has_model_switches({**CONFIG, "title": {"generate": True, **llm("gpt-4o", use_ollama=False)}})
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+
+    class FakeOllama:
+        def __init__(self, url):
+            self.url = url
+
+        async def preload_model(self, model, keep_alive=None):
+            calls.append(("preload", model))
+
+        async def unload_model(self, model):
+            calls.append(("unload", model))
+
+    async def transcribe_audio(index, audio_file, config, item=None, on_stage=None):
+        if audio_file == "bad":
+            raise RuntimeError("识别失败")
+        item["index"] = index
+        return item
+
+    def stage(name):
+        async def run(item, config):
+            calls.append((name, item["index"]))
+            if name == "translate" and item["index"] == 2:
+                raise RuntimeError("翻译失败")
+        return name, run
+
+    monkeypatch.setattr(process, "OllamaHandler", FakeOllama)
+    monkeypatch.setattr(process, "transcribe_audio", transcribe_audio)
+    monkeypatch.setattr(process, "LLM_STAGES", [stage("correct"), stage("title"), stage("translate")])
+    monkeypatch.setattr(process, "save_results", lambda item, config, temp_dir: f"{temp_dir}/{item['index']}.mp3")
+    return calls
+
+
+def test_each_model_is_loaded_once_and_failures_stay_per_file(calls):
+    items = [(0, "a", "/out"), (1, "bad", "/out"), (2, "c", "/out"), (3, "d", "/out")]
+    results = asyncio.run(process.process_audio_stage_major(items, CONFIG))
+
+    assert results[0] == "/out/0.mp3" and results[3] == "/out/3.mp3"
+    assert isinstance(results[1], RuntimeError) and isinstance(results[2], RuntimeError)
+    assert calls == [
+        ("preload", "qwen"),
+        ("correct", 0), ("correct", 2), ("correct", 3),
+        ("translate", 0), ("translate", 2), ("translate", 3),
+        ("unload", "qwen"), ("preload", "minicpm"),
+        ("title", 0), ("title", 3),
+    ]
@@ -0,0 +1,51 @@
+import asyncio
+
+from packages.artifacts import BatchJournal
+from packages.text import TextCorrector
+
+
+class FakeHandler:
+    """把每句改为 "改:" 前缀的假大模型接口，后面的批次先返回，记录并发数"""
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.prompts = []
+
+    async def request(self, messages, **kwargs):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        prompt = messages[1]["content"]
+        self.prompts.append(prompt)
+        lines = [line for line in prompt.split("\n") if line[:1].isdigit()]
+        await asyncio.sleep(0.05 / (len(self.prompts)))
+        self.active -= 1
+        return "\n".join(f"{line.split(':', 1)[0]}: 改{line.split(':', 1)[1].strip()}" for line in lines)
+
+
+SENTENCES = [f"句子{i}" for i in range(10)]
+
+
+def test_batches_run_concurrently_and_keep_order():
+    handler = FakeHandler()
+    corrector = TextCorrector(handler, batch_size=2, context_size=1, concurrency=3)
+    result = asyncio.run(corrector.fix_text(SENTENCES, []))
+
+    assert result == [f"改句子{i}" for i in range(10)]
+    assert handler.max_active == 3
+    assert len(corrector.batch_latencies) == 5
+    # 上下文取自原始句子，不依赖前一批次的矫正结果
+    assert any(prompt.startswith("Context:\n句子1\n\n2: 句子2") for prompt in handler.prompts)
+
+
+def test_resumes_from_journal_and_reports_progress(tmp_path):
+    journal = BatchJournal(str(tmp_path / "correct.jsonl"))
+    journal.record("0:2", [[0, "已矫正0"]])
+    handler = FakeHandler()
+    progress = []
+    corrector = TextCorrector(handler, batch_size=2, concurrency=2)
+    result = asyncio.run(corrector.fix_text(SENTENCES[:4], [], journal=journal, on_progress=lambda done, total: progress.append((done, total))))
+
+    assert result == ["已矫正0", "句子1", "改句子2", "改句子3"]
+    assert len(handler.prompts) == 1
+    assert progress == [(1, 2), (2, 2)]
+    assert journal.load()["2:2"] == [[2, "改句子2"], [3, "改句子3"]]
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+from packages.artifacts import BatchJournal
+from packages.openai import ValidationFailedError
+from packages.translate import OpenAITranslator
+from packages.translation_memory import TranslationMemory
+
+
+class FakeHandler:
+    """按行返回 "译:" 前缀的假大模型接口，记录每次请求的原文"""
+    openai_url = "http://fake"
+
+    def __init__(self, model: str = "fake"):
+        self.model = model
+        self.requests = []
+
+    async def request(self, messages, validator_callback=None, temp=0.7, validation_retries=None, **kwargs):
+        lines = messages[1]["content"].split("\n")
+        self.requests.append(lines)
+        content = "\n".join(f"译:{line}" for line in lines)
+        if validator_callback:
+            validator_callback(content)
+        return content
+
+
+@pytest.fixture(autouse=True)
+def reset_learned_batch_sizes():
+    OpenAITranslator._learned_batch_sizes.clear()
+    yield
+    OpenAITranslator._learned_batch_sizes.clear()
+
+
+def test_resumes_from_journal_and_records_new_batches(tmp_path):
+    journal = BatchJournal(str(tmp_path / "translate.jsonl"))
+    journal.record("一", {"一": "one", "二": "two"})
+    handler = FakeHandler()
+    translator = OpenAITranslator(handler, max_batch_size=2, memory=None)
+
+    result = asyncio.run(translator.translate("中文", "英语", ["一", "二", "三", "四", "五"], journal=journal))
+
+    assert result == ["one", "two", "译:三", "译:四", "译:五"]
+    assert handler.requests == [["三", "四"], ["五"]]
+    assert translator.last_stats["resumed"] == 2
+    assert journal.load() == {"一": {"一": "one", "二": "two"}, "三": {"三": "译:三", "四": "译:四"}, "五": {"五": "译:五"}}
+
+
+def test_reports_progress_per_batch():
+    translator = OpenAITranslator(FakeHandler(), max_batch_size=2, memory=None)
+    progress = []
+    asyncio.run(translator.translate("中文", "英语", ["一", "二", "三"], on_progress=lambda done, total: progress.append((done, total))))
+    assert progress == [(1, 2), (2, 2)]
+
+
+class LimitedHandler(FakeHandler):
+    """超过 max_lines 行的批次返回行数不匹配的译文，模拟大批次时模型合并或漏掉行"""
+    def __init__(self, max_lines: int):
+        super().__init__()
+        self.max_lines = max_lines
+
+    async def request(self, messages, validator_callback=None, temp=0.7, validation_retries=None, **kwargs):
+        lines = messages[1]["content"].split("\n")
+        if len(lines) > self.max_lines:
+            self.requests.append(lines)
+            raise ValidationFailedError("翻译结果行数不匹配")
+        return await super().request(messages, validator_callback, temp, validation_retries)
+
+
+def test_mismatched_batch_is_split_and_batch_size_is_learned():
+    handler = LimitedHandler(max_lines=2)
+    translator = OpenAITranslator(handler, max_batch_size=4, memory=None)
+
+    result = asyncio.run(translator.translate("中文", "英语", ["一", "二", "三", "四"]))
+    assert result == ["译:一", "译:二", "译:三", "译:四"]
+    assert handler.requests == [["一", "二", "三", "四"], ["一", "二"], ["三", "四"]]
+    assert translator.batch_size == 2
+
+    # 同一模型的新翻译器直接使用学习到的批大小
+    handler.requests = []
+    asyncio.run(OpenAITranslator(handler, max_batch_size=4, memory=None).translate("中文", "英语", ["五", "六", "七"]))
+    assert handler.requests == [["五", "六"], ["七"]]
+
+
+def test_batch_size_grows_back_after_consecutive_successes():
+    handler = FakeHandler()
+    translator = OpenAITranslator(handler, max_batch_size=4, memory=None)
+    translator._learned_batch_sizes[translator._model_key] = 2
+    texts = [str(i) for i in range(2 * translator.grow_after)]
+    asyncio.run(translator.translate("中文", "英语", texts))
+    assert translator.batch_size == 4
+
+
+def test_single_line_validation_failure_is_raised():
+    translator = OpenAITranslator(LimitedHandler(max_lines=0), max_batch_size=4, memory=None)
+    with pytest.raises(ValidationFailedError):
+        asyncio.run(translator.translate("中文", "英语", ["一", "二"]))
+
+
+def test_duplicates_and_memory_hits_are_not_requested(tmp_path):
+    memory = TranslationMemory(str(tmp_path / "tm.db"))
+    memory.save("中文", "英语", {"你好 世界": "hello world"})
+    handler = FakeHandler()
+    translator = OpenAITranslator(handler, max_batch_size=8, memory=memory)
+
+    # 全角字符和多余空白规范化后视为同一句
+    texts = ["你好　世界", "再见", "再见 ", "ＡＢＣ", "ABC", ""]
+    result = asyncio.run(translator.translate("中文", "英语", texts))
+
+    assert result == ["hello world", "译:再见", "译:再见", "译:ＡＢＣ", "译:ＡＢＣ", ""]
+    assert handler.requests == [["再见", "ＡＢＣ"]]
+    assert translator.last_stats["unique"] == 3
+    assert translator.last_stats["memory_hits"] == 1
+    assert translator.last_stats["translated"] == 2
+    # 新译文写入翻译记忆，其他文件再次出现时直接复用
+    assert memory.lookup("中文", "英语", ["再见", "ABC"]) == {"再见": "译:再见", "ABC": "译:ＡＢＣ"}
+    assert memory.lookup("中文", "日语", ["再见"]) == {}
+
+
+def test_multiline_text_is_sent_as_one_line(tmp_path):
+    handler = FakeHandler()
+    translator = OpenAITranslator(handler, max_batch_size=8, memory=TranslationMemory(str(tmp_path / "tm.db")))
+    assert asyncio.run(translator.translate("中文", "英语", ["第一行\n第二行"])) == ["译:第一行 第二行"]
+
+
+def test_memory_is_disabled_without_path():
+    memory = TranslationMemory("")
+    memory.save("中文", "英语", {"一": "one"})
+    assert memory.lookup("中文", "英语", ["一"]) == {}
@@ -0,0 +1,134 @@
+import asyncio
+import os
+
+import pytest
+
+from packages.uploads import SpooledUpload, UploadBudget, UploadBusy, UploadTooLarge
+
+BOUNDARY = "----libersonora-test"
+# 文件内容中包含与分隔符相似的片段，不能被误判为分段结束
+AUDIO = b"RIFF" + b"\r\n--" + b"\x00\xff" * 3000 + b"\r\n----libersonora" + b"tail"
+
+
+def build_body(parts, terminate=True) -> bytes:
+    body = b""
+    for name, filename, data in parts:
+        disposition = f'form-data; name="{name}"'
+        if filename is not None:
+            disposition += f'; filename="{filename}"'
+        body += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n".encode("utf-8") + data + b"\r\n"
+    if terminate:
+        body += f"--{BOUNDARY}--\r\n".encode("latin-1")
+    return body
+
+
+class FakeStream:
+    def __init__(self, body: bytes, chunk_size: int):
+        self.chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+
+    async def read(self):
+        return self.chunks.pop(0) if self.chunks else None
+
+
+class FakeRequest:
+    def __init__(self, body: bytes, chunk_size: int = 4096, content_length: bool = True):
+        self.headers = {"content-type": f'multipart/form-data; boundary="{BOUNDARY}"'}
+        if content_length:
+            self.headers["content-length"] = str(len(body))
+        self.stream = FakeStream(body, chunk_size)
+
+
+def receive(upload: SpooledUpload):
+    asyncio.run(upload.receive())
+
+
+PARTS = [
+    ("config", None, '{"lang": "中文"}'.encode("utf-8")),
+    ("files", "第一章.wav", AUDIO),
+    ("files", "第一章.wav", b"second"),
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, len(BOUNDARY) + 4, 4096])
+def test_receive_handles_boundary_split_across_chunks(tmp_path, chunk_size):
+    body = build_body(PARTS)
+    budget = UploadBudget(0)
+    upload = SpooledUpload(FakeRequest(body, chunk_size), str(tmp_path), 0, budget)
+    receive(upload)
+
+    assert upload.fields == {"config": '{"lang": "中文"}'}
+    assert [file.name for file in upload.files] == ["第一章.wav", "第一章-1.wav"]
+    assert open(upload.files[0].path, "rb").read() == AUDIO
+    assert open(upload.files[1].path, "rb").read() == b"second"
+    assert budget.in_flight == len(body)
+    upload.release()
+    assert budget.in_flight == 0
+
+
+def test_missing_terminator_removes_files_and_releases_budget(tmp_path):
+    budget = UploadBudget(0)
+    upload = SpooledUpload(FakeRequest(build_body(PARTS, terminate=False), 100), str(tmp_path), 0, budget)
+    with pytest.raises(ValueError, match="请求体不完整"):
+        receive(upload)
+    assert os.listdir(tmp_path) == []
+    assert budget.in_flight == 0
+
+
+def test_oversize_field_is_rejected(tmp_path):
+    body = build_body([("files", "a.wav", b"audio"), ("config", None, b"x" * 200)])
+    budget = UploadBudget(0)
+    upload = SpooledUpload(FakeRequest(body, 16), str(tmp_path), 0, budget)
+    upload.max_field_bytes = 100
+    with pytest.raises(ValueError, match="字段 config 过大"):
+        receive(upload)
+    assert os.listdir(tmp_path) == []
+    assert budget.in_flight == 0
+
+
+def test_oversize_headers_are_rejected(tmp_path):
+    body = f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"config\"\r\nX-Padding: {'x' * 500}".encode("latin-1")
+    upload = SpooledUpload(FakeRequest(body, 64), str(tmp_path), 0, UploadBudget(0))
+    upload.max_header_bytes = 256
+    with pytest.raises(ValueError, match="分段头过大"):
+        receive(upload)
+
+
+def test_content_length_over_limit_is_rejected_before_reading(tmp_path):
+    body = build_body(PARTS)
+    request = FakeRequest(body)
+    budget = UploadBudget(0)
+    with pytest.raises(UploadTooLarge):
+        receive(SpooledUpload(request, str(tmp_path), len(body) - 1, budget))
+    assert request.stream.chunks  # 没有读取请求体
+    assert budget.in_flight == 0
+
+
+def test_without_content_length_reserves_incrementally(tmp_path):
+    body = build_body(PARTS)
+    budget = UploadBudget(0)
+    upload = SpooledUpload(FakeRequest(body, 1000, content_length=False), str(tmp_path), 0, budget)
+    receive(upload)
+    assert budget.in_flight == len(body)
+    upload.release()
+    assert budget.in_flight == 0
+
+
+def test_without_content_length_stops_when_budget_is_exhausted(tmp_path):
+    body = build_body(PARTS)
+    budget = UploadBudget(len(body) // 2)
+    budget.reserve(100)  # 其他请求已占用的预算保持不变
+    upload = SpooledUpload(FakeRequest(body, 1000, content_length=False), str(tmp_path), 0, budget)
+    with pytest.raises(UploadBusy):
+        receive(upload)
+    assert os.listdir(tmp_path) == []
+    assert budget.in_flight == 100
+
+
+def test_without_content_length_stops_at_request_limit(tmp_path):
+    body = build_body(PARTS)
+    budget = UploadBudget(0)
+    upload = SpooledUpload(FakeRequest(body, 1000, content_length=False), str(tmp_path), 1500, budget)
+    with pytest.raises(UploadTooLarge):
+        receive(upload)
+    assert os.listdir(tmp_path) == []
+    assert budget.in_flight == 0